@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_text(text):
+    """
+    Normalize text so trivially different renderings of the same post share a cache key.
+
+    Args:
+        text (str): The raw text
+
+    Returns:
+        str: NFKC-normalized, case-folded text with collapsed whitespace
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    return _WHITESPACE_RE.sub(" ", text).strip().casefold()
+
+class AnalysisCache:
+    """
+    Two-tier cache for sentiment analysis results.
+
+    The in-memory tier is an LRU bounded by max_size. The optional on-disk tier is a
+    SQLite table that survives restarts and is bounded by max_disk_entries. Both tiers
+    expire entries older than ttl_seconds when it is set.
+    """
+    def __init__(self, max_size=1024, ttl_seconds=None, db_path=None, max_disk_entries=100000):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS analysis_cache_created_at ON analysis_cache (created_at)")
+                self._db.commit()
+                logging.info(f"Analysis cache persisted to {db_path}")
+            except sqlite3.Error as e:
+                logging.error(f"Failed to open analysis cache database {db_path}: {e}. Using memory only.")
+                self._db = None
+
+    @staticmethod
+    def make_key(text, prompt_version, model):
+        """
+        Build a cache key from the normalized text, prompt version and model.
+
+        Returns:
+            str: A hex SHA-256 digest
+        """
+        material = f"{prompt_version}\x00{model}\x00{normalize_text(text)}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Returns:
+            tuple: The cached result, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                value = self._disk_get(key, now)
+                if value is not None:
+                    self._memory_put(key, value, now)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store a result in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._memory_put(key, value, now)
+            if self._db is not None:
+                self._disk_put(key, value, now)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit/miss counters and current memory tier size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "size": len(self._memory),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        """Close the on-disk tier."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _memory_put(self, key, value, now):
+        self._memory[key] = (value, now)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key, now):
+        try:
+            row = self._db.execute("SELECT value, created_at FROM analysis_cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"Analysis cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        if self._expired(row[1], now):
+            return None
+        return tuple(json.loads(row[0]))
+
+    def _disk_put(self, key, value, now):
+        try:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(list(value)), now)
+                )
+                if self.ttl_seconds is not None:
+                    self._db.execute("DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+                self._db.execute(
+                    "DELETE FROM analysis_cache WHERE key IN ("
+                    "SELECT key FROM analysis_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,)
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Analysis cache write failed: {e}")
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import signal
+
+from dispatcher import AsyncAlertDispatcher
+from metrics import CycleProfiler
+from processor import ANALYSIS_SECONDS, CursorTracker, StatusProcessor
+from scheduler import MultiHandleScheduler
+from sentiment_analyzer import AsyncSentimentAnalyzer
+
+class _Cycle:
+    """One poll of one handle moving through the pipeline."""
+    def __init__(self, handle, statuses, tracker, profile=None):
+        self.handle = handle
+        self.statuses = statuses
+        self.tracker = tracker
+        self.profile = profile
+        self.remaining = 0
+        self.done = asyncio.Event()
+
+class AsyncStatusProcessor(StatusProcessor):
+    """
+    StatusProcessor for the asyncio runtime (RUNTIME=async).
+
+    run() drives three stages inside one asyncio.TaskGroup:
+
+    - fetch: waits for the scheduler with asyncio sleeps, drains the truthbrush generator on
+      the worker pool (truthbrush has no async API), settles statuses that need no analysis
+      and queues analysis groups. A handle is not polled again until its previous poll has
+      finished, so a status is never fetched twice; a busy handle is deferred rather than
+      waited on, so it never holds up the other handles.
+    - analyze: max_workers tasks calling AsyncSentimentAnalyzer. Results, notified flags and
+      the cursor commit in one state transaction per group, exactly as in the sync path.
+    - notify: AsyncAlertDispatcher.run(), which coalesces alerts and fans them out to the sinks.
+
+    With a CycleProfiler, each poll is profiled from fetch to cursor commit. Coroutines
+    interleave on one thread, so a cycle's profile also holds whatever else the loop ran
+    meanwhile, and a cycle that starts while another is being profiled is not profiled.
+
+    State writes stay synchronous on the event loop; they are local WAL commits.
+    stop() (wired to SIGTERM and SIGINT) stops polling, then run() drains every queued group
+    and alert before returning.
+    """
+    def __init__(self, api_client, sentiment_analyzer: AsyncSentimentAnalyzer, notifier: AsyncAlertDispatcher, state_store, max_workers=4, prefilter=None, queue_size=100, near_duplicates=None, enricher=None, cluster=None):
+        super().__init__(api_client, sentiment_analyzer, notifier, state_store, max_workers=max_workers, prefilter=prefilter, near_duplicates=near_duplicates, enricher=enricher, cluster=cluster)
+        self.analysis_workers = max_workers
+        self.queue_size = queue_size
+        self._stop = None
+        self._analysis_queue = None
+        self._scheduler = None
+        self._last_processed_ids = None
+        self._profiler = CycleProfiler()
+
+    async def run(self, scheduler: MultiHandleScheduler, last_processed_ids, profiler=None):
+        """
+        Poll, analyze and notify until stop() is called or SIGTERM/SIGINT arrives.
+
+        Args:
+            scheduler (MultiHandleScheduler): Decides which handle to poll and when
+            last_processed_ids (dict): Handle -> cursor, updated as cycles finish
+            profiler (CycleProfiler, optional): Profiles each poll cycle
+        """
+        self._stop = asyncio.Event()
+        if profiler is not None:
+            self._profiler = profiler
+        self._analysis_queue = asyncio.Queue(maxsize=self.queue_size)
+        self._scheduler = scheduler
+        self._last_processed_ids = last_processed_ids
+
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop)
+
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                for _ in range(self.analysis_workers):
+                    task_group.create_task(self._analysis_worker())
+                task_group.create_task(self.notifier.run())
+
+                await self._fetch_stage()
+
+                logging.info("Draining queued analysis and notifications...")
+                await self._analysis_queue.join()
+                for _ in range(self.analysis_workers):
+                    await self._analysis_queue.put(None)
+                self.notifier.stop()
+        finally:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(signum)
+
+    def stop(self):
+        """Stop polling; run() returns once in-flight work has drained."""
+        if self._stop is not None and not self._stop.is_set():
+            logging.info("Shutdown signal received. Waiting for in-flight work...")
+            self._stop.set()
+
+    async def _fetch_stage(self):
+        cycles = {}
+        while not self._stop.is_set():
+            handle = await self._scheduler.wait_for_next_poll_async(self._stop)
+            if handle is None:
+                return
+
+            if self.cluster is not None and not self.cluster.should_poll(handle):
+                self._scheduler.record_poll(handle, 0)
+                continue
+
+            previous = cycles.get(handle)
+            if previous is not None and not previous.done.is_set():
+                # Its cycle reschedules it when it finishes; meanwhile the other handles are polled
+                logging.debug(f"Previous poll of @{handle} is still being processed. Deferring it.")
+                self._scheduler.defer(handle)
+                continue
+
+            try:
+                cycles[handle] = await self._start_cycle(handle)
+            except Exception as e:
+                logging.error(f"An error occurred polling @{handle}: {e}", exc_info=True)
+                self._scheduler.record_poll(handle, 0)
+
+    async def _start_cycle(self, handle):
+        """Fetch one handle, settle what needs no analysis and queue the rest."""
+        profile = self._profiler.start(handle)
+        try:
+            cursor = self._last_processed_ids.get(handle)
+            if self.cluster is not None:
+                cursor = self.cluster.cursor_for(handle, cursor)
+            loop = asyncio.get_running_loop()
+            statuses = await loop.run_in_executor(self.executor, self._collect_new_statuses, cursor, handle)
+            self.last_batch_size = len(statuses)
+
+            cycle = _Cycle(handle, statuses, CursorTracker(cursor, list(statuses)), profile)
+            texts = self._triage(handle, statuses, cycle.tracker)
+            groups = self._plan_groups(texts)
+            cycle.remaining = len(groups)
+            if not groups:
+                self._finish_cycle(cycle)
+
+            for group in groups:
+                # Blocks when the analysis stage is saturated, which holds back further polls
+                await self._analysis_queue.put((cycle, group, [texts[status_id] for status_id in group]))
+        except BaseException:
+            # Finishing twice is harmless, so this is safe even after the cycle finished
+            self._profiler.finish(profile)
+            raise
+        return cycle
+
+    async def _analysis_worker(self):
+        while True:
+            item = await self._analysis_queue.get()
+            if item is None:
+                self._analysis_queue.task_done()
+                return
+
+            cycle, group, texts = item
+            try:
+                if len(texts) == 1:
+                    with ANALYSIS_SECONDS.time(kind="single"):
+                        results = [await self.sentiment_analyzer.analyze(texts[0])]
+                else:
+                    with ANALYSIS_SECONDS.time(kind="batch"):
+                        results = await self.sentiment_analyzer.analyze_batch(texts)
+            except Exception as e:
+                self._fail_group(cycle.handle, cycle.tracker, group, e)
+            else:
+                try:
+                    self._record_results(cycle.handle, cycle.statuses, cycle.tracker, group, results)
+                except Exception as e:
+                    self._fail_group(cycle.handle, cycle.tracker, group, e)
+            finally:
+                cycle.remaining -= 1
+                if cycle.remaining == 0:
+                    self._finish_cycle(cycle)
+                self._analysis_queue.task_done()
+
+    def _finish_cycle(self, cycle):
+        """Publish the cycle's cursor and schedule the handle's next poll."""
+        try:
+            cursor = self._finish_batch(cycle.handle, cycle.statuses, cycle.tracker)
+            if cursor != self._last_processed_ids.get(cycle.handle):
+                logging.info(f"Updating last processed ID for @{cycle.handle} to: {cursor}")
+                self._last_processed_ids[cycle.handle] = cursor
+            if self.cluster is not None:
+                self.cluster.publish_cursor(cycle.handle, cursor)
+            self._scheduler.record_poll(cycle.handle, len(cycle.statuses), **self.api_client.rate_limit_status())
+        finally:
+            self._profiler.finish(cycle.profile)
+            cycle.done.set()
@@ -0,0 +1,212 @@
+"""
+Historical backfill and replay.
+
+Classifies past statuses with the current prompt and writes one JSON line per status
+to a results file. Notifications are never sent. Statuses already present in the
+results file are skipped, so an interrupted run resumes where it stopped. Statuses that
+could not be analyzed (e.g. during an OpenAI outage) are left out of the file, so the
+next run retries them.
+
+Examples:
+    python backfill.py --handle realDonaldTrump --limit 2000
+    python backfill.py --archive truths.jsonl --output rescored.jsonl --workers 8
+"""
+import argparse
+import datetime
+import json
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from analysis_cache import AnalysisCache
+from config import Config
+from clients.token_store import TokenStore
+from clients.truth_social import TruthSocialClient
+from prefilter import PreFilter
+from processor import extract_status_text, status_id_key
+from rate_limiter import TokenBucket
+from sentiment_analyzer import PROMPT_VERSION, AnalysisFailedError, SentimentAnalyzer
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backfill or replay sentiment analysis over historical statuses.")
+    parser.add_argument("--handle", help="Account to page through (defaults to TARGET_HANDLE)")
+    parser.add_argument("--archive", help="Read statuses from a saved JSONL archive instead of the API")
+    parser.add_argument("--output", default="backfill_results.jsonl", help="JSONL results file; also the resume checkpoint")
+    parser.add_argument("--since-id", help="Only statuses newer than this ID")
+    parser.add_argument("--created-after", help="Only statuses created after this ISO date (e.g. 2025-01-20)")
+    parser.add_argument("--limit", type=int, help="Stop after this many statuses")
+    parser.add_argument("--workers", type=int, help="Parallel analysis workers (defaults to ANALYSIS_WORKERS)")
+    parser.add_argument("--requests-per-minute", type=float, default=60, help="OpenAI request rate limit")
+    parser.add_argument("--model", help="OpenAI model to classify with (defaults to OPENAI_MODEL)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore ANALYSIS_CACHE_FILE and always call OpenAI")
+    return parser.parse_args()
+
+def load_checkpoint(path):
+    """
+    Read the IDs already present in the results file.
+
+    Returns:
+        set: Status IDs that were already classified
+    """
+    done = set()
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    done.add(str(json.loads(line)["id"]))
+                except (ValueError, KeyError, AttributeError):
+                    continue  # tolerate a line truncated by a crash
+    except FileNotFoundError:
+        pass
+    return done
+
+def read_archive(path):
+    """Yield statuses from a JSONL archive, one status object per line."""
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def iter_statuses(args, config, handle):
+    """Yield statuses from the archive or by paging through the account's history."""
+    if args.archive:
+        yield from read_archive(args.archive)
+        return
+
+    # Same token handling as the monitor: the saved token is reused and a rejected one refreshed
+    client = TruthSocialClient(
+        config.truthsocial_username,
+        config.truthsocial_password,
+        handle,
+        token_store=TokenStore(
+            config.truthsocial_token_file,
+            max_age_seconds=config.truthsocial_token_max_age_hours * 3600
+        ) if config.truthsocial_token_file else None
+    )
+    client.initialize()
+    created_after = None
+    if args.created_after:
+        created_after = datetime.datetime.fromisoformat(args.created_after).replace(tzinfo=datetime.timezone.utc)
+    yield from client.pull_statuses(handle, since_id=args.since_id, created_after=created_after)
+
+def classify_chunk(analyzer, prefilter, chunk):
+    """
+    Classify a chunk of statuses. Runs on a worker thread.
+
+    Returns:
+        list: Result rows, one per status
+
+    Raises:
+        AnalysisFailedError: If any status could not be analyzed; no row of the chunk is
+            written, and results that did come back are cached for the retry
+    """
+    texts = [extract_status_text(status) for status in chunk]
+    results = analyzer.analyze_batch(texts)
+    rows = []
+    for status, text, result in zip(chunk, texts, results):
+        decision = prefilter.evaluate(text)
+        rows.append({
+            "id": str(status.get("id")),
+            "created_at": status.get("created_at"),
+            "account": (status.get("account") or {}).get("username"),
+            "text": text,
+            "sentiment": result.sentiment,
+            "significant": result.significant,
+            "reasoning": result.reasoning,
+            "prefilter_skip": decision.skip,
+            "prefilter_score": decision.score,
+            "prefilter_reason": decision.reason,
+            "model": analyzer.model,
+            "prompt_version": PROMPT_VERSION,
+        })
+    return rows
+
+def main():
+    args = parse_args()
+    config = Config()
+    handle = args.handle or config.target_handle
+    workers = args.workers or config.analysis_workers
+
+    cache = AnalysisCache(
+        max_size=config.analysis_cache_size,
+        ttl_seconds=config.analysis_cache_ttl_seconds,
+        db_path=None if args.no_cache else config.analysis_cache_file
+    )
+    analyzer = SentimentAnalyzer(
+        config.openai_api_key,
+        cache=cache,
+        model=args.model or config.openai_model,
+        output_mode=config.openai_output_mode,
+        max_batch_size=config.analysis_batch_size,
+        batch_token_budget=config.analysis_batch_token_budget,
+        rate_limiter=TokenBucket(args.requests_per_minute / 60)
+    )
+    # Decisions are recorded for every status regardless of mode so recall can be measured
+    prefilter = PreFilter(mode="shadow", min_score=config.prefilter_min_score, min_words=config.prefilter_min_words)
+
+    done = load_checkpoint(args.output)
+    logging.info(f"Backfilling {'archive ' + args.archive if args.archive else '@' + handle} into {args.output} ({len(done)} already done, {workers} workers).")
+
+    started = time.monotonic()
+    seen = 0
+    written = 0
+    failed = 0
+    in_flight = set()
+    in_flight_sizes = {}
+    chunk = []
+
+    with open(args.output, "a") as output, ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as executor:
+        def drain(block_until):
+            nonlocal written, failed, in_flight
+            while len(in_flight) > block_until:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    chunk_size = in_flight_sizes.pop(future)
+                    try:
+                        rows = future.result()
+                    except AnalysisFailedError as e:
+                        # Never write a failed call as a verdict; leaving it out makes the next run retry it
+                        logging.error(f"Could not classify a chunk of {chunk_size} statuses: {e}")
+                        failed += chunk_size
+                        continue
+                    for row in rows:
+                        output.write(json.dumps(row, ensure_ascii=False) + "\n")
+                        written += 1
+                output.flush()
+            logging.info(f"Progress: {written} classified, {failed} failed, {seen} read, {time.monotonic() - started:.0f}s elapsed.")
+
+        def submit(chunk):
+            future = executor.submit(classify_chunk, analyzer, prefilter, chunk)
+            in_flight_sizes[future] = len(chunk)
+            in_flight.add(future)
+
+        for status in iter_statuses(args, config, handle):
+            if args.limit is not None and seen >= args.limit:
+                break
+            seen += 1
+            status_id = str(status.get("id"))
+            if status_id in done:
+                continue
+            if args.since_id and status_id_key(status_id) <= status_id_key(str(args.since_id)):
+                continue
+
+            chunk.append(status)
+            if len(chunk) >= analyzer.max_batch_size:
+                submit(chunk)
+                chunk = []
+                # Bound memory: never hold more than two chunks per worker in flight
+                if len(in_flight) >= workers * 2:
+                    drain(workers)
+
+        if chunk:
+            submit(chunk)
+        drain(0)
+
+    logging.info(f"Backfill complete: {written} statuses classified in {time.monotonic() - started:.1f}s. Cache stats: {cache.stats()}")
+    if failed:
+        logging.warning(f"{failed} statuses could not be classified and were left out of {args.output}. Run the backfill again to retry them.")
+    cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Local stand-ins for Truth Social (polling and streaming), OpenAI and ntfy used by the
+benchmarks and tests.
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SIGNIFICANT_MARKER = "tariff"
+POST_ID_RE = re.compile(r"post-(\d+)")
+
+_FILLER = (
+    "The radical left has been destroying our great country, but we are winning like never before. "
+    "Thank you to the great people of Pennsylvania for an incredible rally last night!"
+)
+_SIGNIFICANT = (
+    "I have just signed an executive order imposing a 50% tariff on all imports from China, effective immediately."
+)
+
+class FakeTruthSocialClient:
+    """
+    Yields synthetic statuses in bursts: each call to get_new_statuses returns the next
+    burst. A fraction of posts carries SIGNIFICANT_MARKER so the fake OpenAI server marks
+    them significant. posted_at records when each post "appeared", for latency measurement.
+    """
+    def __init__(self, target_handle="benchmark", bursts=None, significant_ratio=0.2, seed=1):
+        self.target_handle = target_handle
+        self.bursts = list(bursts or [])
+        self.significant_ratio = significant_ratio
+        self.random = random.Random(seed)
+        self.next_id = 100000000000000000
+        self.posted_at = {}
+        self.fetches = 0
+
+    def get_new_statuses(self, last_known_id=None, handle=None):
+        self.fetches += 1
+        if not self.bursts:
+            return []
+        burst_size = self.bursts.pop(0)
+        now = time.time()
+        statuses = []
+        for _ in range(burst_size):
+            self.next_id += 1
+            status_id = str(self.next_id)
+            text = _SIGNIFICANT if self.random.random() < self.significant_ratio else _FILLER
+            self.posted_at[status_id] = now
+            statuses.append({
+                "id": status_id,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(now)),
+                "account": {"username": handle or self.target_handle},
+                "content": f"<p>{text} post-{status_id}</p>",
+            })
+        # pull_statuses yields newest first
+        return iter(reversed(statuses))
+
+    def rate_limit_status(self):
+        return {"rate_limit_remaining": None, "rate_limit_reset": None}
+
+class _StandInServer:
+    """Runs a ThreadingHTTPServer on a free localhost port in a daemon thread."""
+    def __init__(self, handler):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.server.stand_in = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+    def _reply(self, code, body=b"", content_type="application/json"):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class _OpenAIHandler(_QuietHandler):
+    def do_POST(self):
+        stand_in = self.server.stand_in
+        request = json.loads(self._read_body() or b"{}")
+        with stand_in.lock:
+            stand_in.requests += 1
+            fail = stand_in.random.random() < stand_in.error_rate
+
+        time.sleep(stand_in.latency_seconds)
+        if fail:
+            self._reply(500, json.dumps({"error": {"message": "injected failure", "type": "server_error"}}).encode())
+            return
+
+        user = request["messages"][-1]["content"]
+        with stand_in.lock:
+            content = stand_in.replies.pop(0) if stand_in.replies else stand_in.completion_for(user)
+        prompt_tokens = sum(len(message["content"]) for message in request["messages"]) // 4
+        completion_tokens = len(content) // 4
+        with stand_in.lock:
+            stand_in.prompt_tokens += prompt_tokens
+            stand_in.completion_tokens += completion_tokens
+
+        body = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        }
+        self._reply(200, json.dumps(body).encode())
+
+class FakeOpenAIServer(_StandInServer):
+    """
+    Minimal /v1/chat/completions stand-in with configurable latency and error rate.
+    Marks a post significant when it contains SIGNIFICANT_MARKER. Understands the
+    batched JSON-array request format. The first completions are answered with the
+    message contents in replies (e.g. ["not json"]), the rest are classified.
+    """
+    def __init__(self, latency_seconds=0.3, error_rate=0.0, seed=1, replies=None):
+        super().__init__(_OpenAIHandler)
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.replies = list(replies or [])
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def base_url(self):
+        return f"{self.url}/v1"
+
+    def completion_for(self, user):
+        try:
+            items = json.loads(user)
+        except ValueError:
+            items = None
+        if isinstance(items, list):
+            return json.dumps({"results": [dict(self._classify(item["text"]), id=item["id"]) for item in items]})
+        return json.dumps(self._classify(user))
+
+    def _classify(self, text):
+        significant = SIGNIFICANT_MARKER in text
+        return {
+            "sentiment": "negative" if significant else "neutral",
+            "significant": significant,
+            "confidence": 0.95 if significant else 0.9,
+            "reasoning": "Synthetic benchmark answer.",
+        }
+
+class _NtfyHandler(_QuietHandler):
+    def do_POST(self):
+        stand_in = self.server.stand_in
+        body = self._read_body().decode("utf-8", errors="replace")
+        received_at = time.time()
+        with stand_in.lock:
+            stand_in.requests += 1
+            code = stand_in.fail_with.pop(0) if stand_in.fail_with else 200
+            if code == 200:
+                stand_in.messages += 1
+                stand_in.bodies.append(body)
+                for status_id in POST_ID_RE.findall(body):
+                    stand_in.received_at.setdefault(status_id, received_at)
+        self._reply(code, b"{}")
+
+    def do_GET(self):
+        if self.path == "/v1/health":
+            self._reply(200, b'{"healthy":true}')
+        else:
+            self._reply(404)
+
+class FakeNtfyServer(_StandInServer):
+    """
+    ntfy stand-in that records when each post's alert arrived. The first requests are
+    answered with the status codes in fail_with (e.g. [503, 429]), the rest with 200.
+    """
+    def __init__(self, fail_with=None):
+        super().__init__(_NtfyHandler)
+        self.lock = threading.Lock()
+        self.fail_with = list(fail_with or [])
+        self.requests = 0
+        self.messages = 0
+        self.bodies = []
+        self.received_at = {}
+
+class _StreamHandler(_QuietHandler):
+    def do_GET(self):
+        stand_in = self.server.stand_in
+        with stand_in.lock:
+            index = len(stand_in.requests)
+            stand_in.requests.append(dict(self.headers))
+            connection = stand_in.connections[index] if index < len(stand_in.connections) else {"events": [], "hold": True}
+
+        code = connection.get("status", 200)
+        if code != 200:
+            self._reply(code, b'{"error":"The access token is invalid"}')
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(b":thump\n\n")
+        for event, payload in connection.get("events", []):
+            data = payload if isinstance(payload, str) else json.dumps(payload)
+            self.wfile.write(f"event: {event}\ndata: {data}\n\n".encode("utf-8"))
+        self.wfile.flush()
+        if connection.get("hold"):
+            stand_in.released.wait()
+        self.close_connection = True
+
+class FakeStreamServer(_StandInServer):
+    """
+    Streaming API stand-in serving server-sent events. connections scripts one response
+    per connection attempt: {"events": [(event, payload), ...]} is sent and the connection
+    closed (add "hold": True to keep it open until stop()), {"status": 401} rejects it.
+    Attempts past the script are held open with no events. requests records the headers of
+    every attempt.
+    """
+    def __init__(self, connections=None):
+        super().__init__(_StreamHandler)
+        self.lock = threading.Lock()
+        self.connections = list(connections or [])
+        self.requests = []
+        self.released = threading.Event()
+
+    def stop(self):
+        self.released.set()
+        super().stop()
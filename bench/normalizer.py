@@ -0,0 +1,191 @@
+"""
+Micro-benchmark of the HTML normalization and fingerprinting stage.
+
+Builds a corpus of posts shaped like real Truth Social markup (mentions, hashtags,
+cashtags, Mastodon link spans, entities, quote reposts, re-renderings of the same
+text) and reports per-post normalization and SimHash cost, the text size sent to
+OpenAI before and after normalization, and how many re-renderings the near-duplicate
+filter catches, as JSON.
+
+Example:
+    python -m bench.normalizer --posts 5000
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import time
+
+from bench.pipeline import git_commit, percentile
+from normalizer import NearDuplicateFilter, normalize_html, simhash
+
+SUBJECTS = ["China", "Mexico", "Canada", "The European Union", "The Fed", "Our great farmers", "The Fake News Media", "Sleepy Joe", "Congress", "The Stock Market", "OPEC", "Our Military"]
+PREDICATES = [
+    "will face tariffs of {n}% starting {when}",
+    "has agreed to a historic trade deal, signing {when}",
+    "must cut interest rates by {n} points {when}",
+    "refuses to report the record numbers we announced {when}",
+    "is doing better than ever before, up {n}% since {when}",
+    "will be hit with sanctions {when} unless they stop",
+    "held an incredible rally with {n},000 great patriots {when}",
+    "is treating us very unfairly, a total disgrace, {when}",
+]
+WHENS = ["tomorrow", "on Monday", "next week", "tonight", "in January", "immediately", "this morning", "last year"]
+HANDLES = ["WhiteHouse", "elonmusk", "DonaldJTrumpJr", "POTUS", "VP"]
+HASHTAGS = ["MAGA", "AmericaFirst", "Trade", "Energy"]
+CASHTAGS = ["TSLA", "DJT", "SPY", "XOM", "BRK.B"]
+DOMAINS = ["foxnews.com", "breitbart.com", "truthsocial.com", "youtube.com", "nypost.com"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark status HTML normalization and fingerprinting.")
+    parser.add_argument("--posts", type=int, default=2000, help="Posts in the synthetic corpus")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.2, help="Fraction of posts that re-render an earlier post")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--label", default="", help="Free-form label stored with the results")
+    parser.add_argument("--output", help="Results file (defaults to bench_results/normalizer-<commit>.json)")
+    return parser.parse_args()
+
+def link_html(rng, domain):
+    path = f"/{rng.choice(['politics', 'news', 'watch', 'story'])}/{rng.randrange(10**6, 10**7)}"
+    query = f"?utm_source=truth&utm_medium=social&id={rng.randrange(10**5)}" if rng.random() < 0.5 else ""
+    url = f"https://www.{domain}{path}{query}"
+    return (
+        f'<a href="{url}" rel="nofollow noopener noreferrer" target="_blank">'
+        f'<span class="invisible">https://www.</span><span class="ellipsis">{(domain + path)[:24]}</span>'
+        f'<span class="invisible">{(domain + path + query)[24:]}</span></a>'
+    )
+
+def post_html(rng, sentences):
+    """Render sentences as one post, with the decorations real posts carry."""
+    paragraphs = []
+    for sentence in sentences:
+        sentence = sentence.replace("&", "&amp;")
+        if rng.random() < 0.3:
+            handle = rng.choice(HANDLES)
+            sentence += f' <span class="h-card"><a href="https://truthsocial.com/@{handle}" class="u-url mention">@<span>{handle}</span></a></span>'
+        if rng.random() < 0.2:
+            sentence = sentence.replace(" ", " &quot;", 1) + "&quot;"
+        paragraphs.append(sentence + "!")
+
+    body = "<br>".join(paragraphs) if rng.random() < 0.5 else "</p><p>".join(paragraphs)
+    if rng.random() < 0.4:
+        tag = rng.choice(HASHTAGS)
+        body += f' <a href="https://truthsocial.com/tags/{tag}" class="mention hashtag" rel="tag">#<span>{tag}</span></a>'
+    if rng.random() < 0.5:
+        body += " " + link_html(rng, rng.choice(DOMAINS))
+    if rng.random() < 0.1:
+        body += f'<span class="quote-inline"><br>RT: {link_html(rng, "truthsocial.com")}</span>'
+    return f"<p>{body}</p>"
+
+def build_corpus(args):
+    """
+    Returns:
+        tuple: (posts, is_duplicate) where is_duplicate[i] is True when post i re-renders an earlier post's sentences
+    """
+    rng = random.Random(args.seed)
+    posts = []
+    texts = []
+    seen = set()
+    is_duplicate = []
+    for _ in range(args.posts):
+        if texts and rng.random() < args.duplicate_ratio:
+            # Same statement, new decorations: different link, tracking params, mentions
+            sentences = rng.choice(texts)
+        else:
+            sentences = [
+                f"{rng.choice(SUBJECTS)} " + rng.choice(PREDICATES).format(n=rng.randint(2, 60), when=rng.choice(WHENS))
+                + (f" ${rng.choice(CASHTAGS)}" if rng.random() < 0.3 else "")
+                for _ in range(rng.randint(1, 4))
+            ]
+            texts.append(sentences)
+        is_duplicate.append(tuple(sentences) in seen)
+        seen.add(tuple(sentences))
+        posts.append(post_html(rng, sentences))
+    return posts, is_duplicate
+
+def run(args):
+    """
+    Run one benchmark.
+
+    Returns:
+        dict: Parameters and results
+    """
+    posts, is_duplicate = build_corpus(args)
+
+    normalize_seconds = []
+    normalized = []
+    for post in posts:
+        started = time.perf_counter()
+        normalized.append(normalize_html(post))
+        normalize_seconds.append(time.perf_counter() - started)
+
+    simhash_seconds = []
+    for result in normalized:
+        started = time.perf_counter()
+        simhash(result.text)
+        simhash_seconds.append(time.perf_counter() - started)
+
+    near_duplicates = NearDuplicateFilter(mode="shadow")
+    flagged = []
+    dedup_seconds = 0.0
+    for index, result in enumerate(normalized):
+        before = near_duplicates.stats().get("unique", 0)
+        started = time.perf_counter()
+        if near_duplicates.should_analyze(result, str(index)):
+            near_duplicates.remember(result, str(index))
+        dedup_seconds += time.perf_counter() - started
+        flagged.append(near_duplicates.stats().get("unique", 0) == before)
+
+    # What StatusProcessor used to send: the content with one outer <p> pair stripped
+    raw_chars = sum(len(post[3:-4]) for post in posts)
+    normalized_chars = sum(len(result.text) for result in normalized)
+    duplicates = sum(is_duplicate)
+    caught = sum(1 for duplicate, hit in zip(is_duplicate, flagged) if duplicate and hit)
+    false_positives = sum(1 for duplicate, hit in zip(is_duplicate, flagged) if hit and not duplicate)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "label": args.label,
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": {
+            "posts": len(posts),
+            "normalize_microseconds": {
+                "p50": percentile(normalize_seconds, 0.50) * 1e6,
+                "p99": percentile(normalize_seconds, 0.99) * 1e6,
+            },
+            "simhash_microseconds": {
+                "p50": percentile(simhash_seconds, 0.50) * 1e6,
+                "p99": percentile(simhash_seconds, 0.99) * 1e6,
+            },
+            "normalize_posts_per_second": len(posts) / sum(normalize_seconds),
+            "dedup_microseconds_per_post": dedup_seconds / len(posts) * 1e6,
+            "chars_per_post_before": raw_chars / len(posts),
+            "chars_per_post_after": normalized_chars / len(posts),
+            "char_reduction": 1 - normalized_chars / raw_chars if raw_chars else None,
+            "rerendered_posts": duplicates,
+            "rerendered_posts_caught": caught,
+            "near_duplicate_recall": caught / duplicates if duplicates else None,
+            "near_duplicate_false_positives": false_positives,
+            "near_duplicate_stats": near_duplicates.stats(),
+        },
+    }
+
+def main():
+    args = parse_args()
+    # Per-post shadow-mode log lines would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    report = run(args)
+
+    output = args.output or os.path.join("bench_results", f"normalizer-{report['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report["results"], indent=2))
+    print(f"Saved to {output}")
+
+if __name__ == "__main__":
+    main()
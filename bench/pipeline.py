@@ -0,0 +1,169 @@
+"""
+End-to-end benchmark of the poll -> analyze -> notify path.
+
+Drives StatusProcessor with a synthetic burst stream, a local OpenAI stand-in with
+configurable latency/error rate and a local ntfy stand-in, then reports post-to-alert
+latency percentiles, throughput, memory and API calls per status as JSON.
+
+Example:
+    python -m bench.pipeline --bursts 5 --burst-size 20 --openai-latency-ms 400 --workers 8
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from analysis_cache import AnalysisCache
+from cascade import CascadeAnalyzer
+from bench.fakes import FakeNtfyServer, FakeOpenAIServer, FakeTruthSocialClient
+from clients.notifier import Notifier
+from clients.state_store import create_state_store
+from dispatcher import AlertDispatcher
+from prefilter import PreFilter
+from processor import StatusProcessor
+from sentiment_analyzer import SentimentAnalyzer
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the poll -> analyze -> notify path against local stand-ins.")
+    parser.add_argument("--bursts", type=int, default=5, help="Number of polls that return new statuses")
+    parser.add_argument("--burst-size", type=int, default=10, help="New statuses per poll")
+    parser.add_argument("--significant-ratio", type=float, default=0.2, help="Fraction of posts that should alert")
+    parser.add_argument("--openai-latency-ms", type=float, default=300, help="Fake OpenAI response latency")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="Fraction of fake OpenAI requests that fail with 500")
+    parser.add_argument("--workers", type=int, default=4, help="Analysis workers")
+    parser.add_argument("--batch-size", type=int, default=8, help="Max statuses per batched OpenAI request")
+    parser.add_argument("--prefilter-mode", default="off", choices=["off", "shadow", "enforce"])
+    parser.add_argument("--cascade-tier2-model", help="Escalate low-confidence/significant posts to this model (enables the cascade)")
+    parser.add_argument("--coalesce-seconds", type=float, default=0.0, help="Alert dispatcher coalescing window")
+    parser.add_argument("--cache", action="store_true", help="Enable the in-memory analysis cache")
+    parser.add_argument("--state-backend", default="sqlite", choices=["sqlite", "file"])
+    parser.add_argument("--label", default="", help="Free-form label stored with the results")
+    parser.add_argument("--output", help="Results file (defaults to bench_results/pipeline-<commit>.json)")
+    return parser.parse_args()
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run(args):
+    """
+    Run one benchmark.
+
+    Returns:
+        dict: Parameters and results
+    """
+    openai_server = FakeOpenAIServer(latency_seconds=args.openai_latency_ms / 1000, error_rate=args.openai_error_rate).start()
+    ntfy_server = FakeNtfyServer().start()
+    client = FakeTruthSocialClient(bursts=[args.burst_size] * args.bursts, significant_ratio=args.significant_ratio)
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        state_store = create_state_store(os.path.join(state_dir, "state"), args.state_backend)
+        analyzer = SentimentAnalyzer(
+            "benchmark",
+            cache=AnalysisCache() if args.cache else None,
+            max_batch_size=args.batch_size,
+            base_url=openai_server.base_url
+        )
+        if args.cascade_tier2_model:
+            analyzer = CascadeAnalyzer(analyzer, analyzer.model, args.cascade_tier2_model)
+        notifier = AlertDispatcher(
+            [Notifier("benchmark", server_url=ntfy_server.url)],
+            state_store=state_store,
+            coalesce_seconds=args.coalesce_seconds
+        )
+        processor = StatusProcessor(
+            client,
+            analyzer,
+            notifier,
+            state_store,
+            max_workers=args.workers,
+            prefilter=PreFilter(mode=args.prefilter_mode) if args.prefilter_mode != "off" else None
+        )
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        cycle_seconds = []
+        cursor = None
+        for _ in range(args.bursts):
+            cycle_started = time.perf_counter()
+            cursor = processor.process_statuses(cursor)
+            cycle_seconds.append(time.perf_counter() - cycle_started)
+        processing_seconds = time.perf_counter() - started
+        notifier.close()
+        total_seconds = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        processor.close()
+        state_store.close()
+
+    openai_server.stop()
+    ntfy_server.stop()
+
+    statuses = args.bursts * args.burst_size
+    latencies = [
+        received_at - client.posted_at[status_id]
+        for status_id, received_at in ntfy_server.received_at.items()
+        if status_id in client.posted_at
+    ]
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "label": args.label,
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": {
+            "statuses": statuses,
+            "alerts": len(latencies),
+            "post_to_alert_latency_seconds": {
+                "p50": percentile(latencies, 0.50),
+                "p90": percentile(latencies, 0.90),
+                "p99": percentile(latencies, 0.99),
+                "max": max(latencies) if latencies else None,
+            },
+            "cycle_seconds": {
+                "p50": percentile(cycle_seconds, 0.50),
+                "max": max(cycle_seconds) if cycle_seconds else None,
+            },
+            "throughput_statuses_per_second": statuses / processing_seconds if processing_seconds else None,
+            "total_seconds": total_seconds,
+            "peak_memory_bytes": peak_memory,
+            "memory_bytes_per_status": peak_memory / statuses if statuses else None,
+            "openai_requests": openai_server.requests,
+            "openai_requests_per_status": openai_server.requests / statuses if statuses else None,
+            "openai_prompt_tokens_per_status": openai_server.prompt_tokens / statuses if statuses else None,
+            "ntfy_requests": ntfy_server.messages,
+            "final_cursor": cursor,
+        },
+    }
+
+def main():
+    args = parse_args()
+    # Per-status INFO logging would dominate the measurement
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s")
+    logging.getLogger().setLevel(logging.WARNING)
+    report = run(args)
+
+    output = args.output or os.path.join("bench_results", f"pipeline-{report['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report["results"], indent=2))
+    print(f"Saved to {output}")
+
+if __name__ == "__main__":
+    main()
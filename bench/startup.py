@@ -0,0 +1,135 @@
+"""
+Startup benchmark: time from process launch to the end of the first poll.
+
+Each run starts a fresh interpreter that imports the application, initializes the
+Truth Social client and polls once. Truth Social's login is replaced by a stand-in with
+configurable latency (--login-ms) and the poll returns nothing, so the numbers isolate
+startup cost. Three scenarios are measured:
+
+    eager        openai and httpx imported up front and a login on every start (the
+                 previous startup path)
+    cold         lazy imports, no saved token yet (first start after install)
+    warm         lazy imports, reusing the saved token (restart after a deploy or crash)
+
+Example:
+    python -m bench.startup --runs 5 --login-ms 1500
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = ("eager", "cold", "warm")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark time from process start to the first poll.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per scenario")
+    parser.add_argument("--login-ms", type=float, default=1500, help="Stand-in Truth Social login latency")
+    parser.add_argument("--label", default="", help="Free-form label stored with the results")
+    parser.add_argument("--output", help="Results file (defaults to bench_results/startup-<commit>.json)")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--token-file", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def child(args):
+    """One startup, run in a fresh interpreter; prints phase timings as JSON."""
+    started = time.time()
+    if args.child == "eager":
+        import httpx  # noqa: F401
+        import openai  # noqa: F401
+    import main  # noqa: F401
+    from clients.token_store import TokenStore
+    from clients.truth_social import TruthSocialClient
+    import truthbrush.api
+    imported = time.time()
+
+    def login(api, username, password):
+        time.sleep(args.login_ms / 1000)
+        return "benchmark-token"
+
+    truthbrush.api.Api.get_auth_id = login
+    truthbrush.api.Api.pull_statuses = lambda api, **kwargs: iter(())
+
+    token_store = None if args.child == "eager" else TokenStore(args.token_file)
+    client = TruthSocialClient("benchmark", "benchmark", "benchmark", token_store=token_store)
+    client.initialize()
+    initialized = time.time()
+    list(client.get_new_statuses())
+    polled = time.time()
+
+    print(json.dumps({
+        "started_at": started,
+        "import_seconds": imported - started,
+        "initialize_seconds": initialized - imported,
+        "first_poll_seconds": polled - initialized,
+        "first_poll_at": polled,
+    }))
+
+def run_once(scenario, token_file, login_ms):
+    launched_at = time.time()
+    completed = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--child", scenario, "--token-file", token_file, "--login-ms", str(login_ms)],
+        capture_output=True, text=True, check=True
+    )
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    timings["interpreter_seconds"] = timings.pop("started_at") - launched_at
+    timings["time_to_first_poll_seconds"] = timings.pop("first_poll_at") - launched_at
+    return timings
+
+def run(args):
+    """
+    Run every scenario.
+
+    Returns:
+        dict: Parameters and per-scenario median/max timings
+    """
+    # Imported here so a child's measured imports start from a bare interpreter
+    from bench.pipeline import git_commit, percentile
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        token_file = os.path.join(directory, "token.json")
+        for scenario in SCENARIOS:
+            runs = []
+            for _ in range(args.runs):
+                if scenario != "warm" and os.path.exists(token_file):
+                    os.unlink(token_file)
+                runs.append(run_once(scenario, token_file, args.login_ms))
+            results[scenario] = {
+                key: {"p50": percentile([run[key] for run in runs], 0.50), "max": max(run[key] for run in runs)}
+                for key in runs[0]
+            }
+
+    eager = results["eager"]["time_to_first_poll_seconds"]["p50"]
+    warm = results["warm"]["time_to_first_poll_seconds"]["p50"]
+    results["warm_restart_speedup"] = eager / warm if warm else None
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "label": args.label,
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "child", "token_file")},
+        "results": results,
+    }
+
+def main():
+    args = parse_args()
+    if args.child:
+        child(args)
+        return
+    report = run(args)
+
+    output = args.output or os.path.join("bench_results", f"startup-{report['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report["results"], indent=2))
+    print(f"Saved to {output}")
+
+if __name__ == "__main__":
+    main()
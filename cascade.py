@@ -0,0 +1,203 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import threading
+
+from metrics import REGISTRY
+from sentiment_analyzer import AnalysisFailedError, SentimentAnalyzer
+
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+
+CASCADE_DECISIONS = REGISTRY.counter("stonk_cascade_decisions_total", "Cascade routing decisions", ("decision", "reason"))
+CASCADE_TIER1_CONFIDENCE = REGISTRY.histogram("stonk_cascade_tier1_confidence", "Tier-1 confidence of routed statuses", buckets=CONFIDENCE_BUCKETS)
+CASCADE_TIER2_AGREEMENT = REGISTRY.counter("stonk_cascade_tier2_agreement_total", "Escalations by whether tier 2 agreed with tier 1", ("agreed",))
+
+class CascadeAnalyzer:
+    """
+    Two-tier model cascade on top of a SentimentAnalyzer.
+
+    Tier 1 (a cheap, fast model) answers every status and reports a confidence. Statuses
+    whose confidence is below confidence_threshold, or that tier 1 marks significant when
+    escalate_significant is set, are re-analyzed by tier 2 (a stronger model) and tier 2's
+    answer wins. If the batched tier-2 call fails, each escalated status is retried on its
+    own, and only those that still fail keep their tier-1 answer; if tier 1 fails, the
+    AnalysisFailedError propagates so the statuses are retried. The keyword pre-filter
+    still runs in front of tier 1, as a free tier 0.
+
+    Offers the same analyze/analyze_batch/plan_batches interface as SentimentAnalyzer, so
+    StatusProcessor can use it unchanged. Every routing decision is logged, counted in
+    metrics and, when decision_log_path is set, appended there as a JSON line for
+    threshold tuning.
+    """
+    def __init__(self, analyzer: SentimentAnalyzer, tier1_model, tier2_model, confidence_threshold=0.8, escalate_significant=True, decision_log_path=None):
+        self.analyzer = analyzer
+        self.tier1_model = tier1_model
+        self.tier2_model = tier2_model
+        self.confidence_threshold = confidence_threshold
+        self.escalate_significant = escalate_significant
+        self.decision_log_path = decision_log_path
+        self._log_lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self.tier1_model
+
+    @property
+    def max_batch_size(self):
+        return self.analyzer.max_batch_size
+
+    def analyze(self, status_text_html, model=None):
+        """
+        Args:
+            status_text_html (str): The status text
+            model (str, optional): Answer with this model alone, bypassing the cascade
+
+        Returns:
+            AnalysisResult: The answer of the tier that decided
+        """
+        return self.analyze_batch([status_text_html], model)[0]
+
+    def analyze_batch(self, texts, model=None):
+        """
+        Run tier 1 over every text, then tier 2 over the escalated ones.
+
+        Args:
+            texts (list): Status texts to analyze
+            model (str, optional): Answer with this model alone, bypassing the cascade
+
+        Returns:
+            list: One AnalysisResult per input text, in input order
+        """
+        if model is not None:
+            return self.analyzer.analyze_batch(texts, model)
+        tier1 = self.analyzer.analyze_batch(texts, self.tier1_model)
+        escalations = self._route(texts, tier1)
+        escalated = [texts[index] for index, _ in escalations]
+        try:
+            tier2 = self.analyzer.analyze_batch(escalated, self.tier2_model) if escalated else []
+        except AnalysisFailedError as e:
+            self._log_tier2_failure(e)
+            tier2 = [self._tier2_single(text) for text in escalated]
+        return self._merge(texts, tier1, escalations, tier2)
+
+    def plan_batches(self, texts):
+        return self.analyzer.plan_batches(texts)
+
+    def _tier2_single(self, text):
+        """
+        Returns:
+            AnalysisResult: Tier 2's answer for one text, or None if it failed again
+        """
+        try:
+            return self.analyzer.analyze(text, self.tier2_model)
+        except AnalysisFailedError as e:
+            logging.error(f"Cascade tier 2 ({self.tier2_model}) failed again for a single status: {e}")
+            return None
+
+    def _log_tier2_failure(self, error):
+        logging.error(f"Cascade tier 2 ({self.tier2_model}) batch failed: {error}. Retrying each escalated status on its own.")
+
+    def _route(self, texts, tier1):
+        """
+        Decide which tier-1 answers go to tier 2.
+
+        Returns:
+            list: (index, reason) for every escalated text
+        """
+        escalations = []
+        for index, (text, result) in enumerate(zip(texts, tier1)):
+            if not text or not text.strip():
+                continue
+            CASCADE_TIER1_CONFIDENCE.observe(result.confidence)
+            if result.confidence < self.confidence_threshold:
+                escalations.append((index, "low_confidence"))
+            elif self.escalate_significant and result.significant:
+                escalations.append((index, "significant"))
+        return escalations
+
+    def _merge(self, texts, tier1, escalations, tier2):
+        """Combine both tiers' answers and record every routing decision."""
+        results = list(tier1)
+        escalated = {index: (reason, result) for (index, reason), result in zip(escalations, tier2)}
+        decisions = []
+
+        for index, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+
+            if index not in escalated:
+                CASCADE_DECISIONS.inc(decision="tier1", reason="confident")
+                decisions.append(self._decision(text, tier1[index]))
+                continue
+
+            reason, tier2_result = escalated[index]
+            if tier2_result is None:
+                logging.warning(f"Cascade tier 2 ({self.tier2_model}) failed; keeping the tier-1 answer.")
+                CASCADE_DECISIONS.inc(decision="tier2_failed", reason=reason)
+            else:
+                agreed = tier2_result[:2] == tier1[index][:2]
+                CASCADE_DECISIONS.inc(decision="tier2", reason=reason)
+                CASCADE_TIER2_AGREEMENT.inc(agreed=str(agreed).lower())
+                logging.info(
+                    f"Cascade escalated ({reason}): {self.tier1_model} said {tier1[index].sentiment}/{tier1[index].significant} "
+                    f"at {tier1[index].confidence:.2f}, {self.tier2_model} said {tier2_result.sentiment}/{tier2_result.significant} at {tier2_result.confidence:.2f}."
+                )
+                results[index] = tier2_result
+            decisions.append(self._decision(text, tier1[index], reason, tier2_result))
+
+        self._write_decisions(decisions)
+        return results
+
+    def _decision(self, text, tier1_result, reason=None, tier2_result=None):
+        decision = {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "text_sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            "tier1_model": self.tier1_model,
+            "tier1": tier1_result._asdict(),
+            "escalated": reason is not None,
+            "reason": reason,
+        }
+        if tier2_result is not None:
+            decision["tier2_model"] = self.tier2_model
+            decision["tier2"] = tier2_result._asdict()
+        return decision
+
+    def _write_decisions(self, decisions):
+        if not self.decision_log_path or not decisions:
+            return
+        try:
+            with self._log_lock, open(self.decision_log_path, "a") as f:
+                for decision in decisions:
+                    f.write(json.dumps(decision, ensure_ascii=False) + "\n")
+        except (IOError, OSError) as e:
+            logging.error(f"Error writing cascade decisions to {self.decision_log_path}: {e}")
+
+class AsyncCascadeAnalyzer(CascadeAnalyzer):
+    """CascadeAnalyzer over an AsyncSentimentAnalyzer, for the asyncio runtime."""
+    async def analyze(self, status_text_html, model=None):
+        return (await self.analyze_batch([status_text_html], model))[0]
+
+    async def analyze_batch(self, texts, model=None):
+        if model is not None:
+            return await self.analyzer.analyze_batch(texts, model)
+        tier1 = await self.analyzer.analyze_batch(texts, self.tier1_model)
+        escalations = self._route(texts, tier1)
+        escalated = [texts[index] for index, _ in escalations]
+        try:
+            tier2 = await self.analyzer.analyze_batch(escalated, self.tier2_model) if escalated else []
+        except AnalysisFailedError as e:
+            self._log_tier2_failure(e)
+            tier2 = await asyncio.gather(*(self._tier2_single(text) for text in escalated))
+        return self._merge(texts, tier1, escalations, tier2)
+
+    async def _tier2_single(self, text):
+        try:
+            return await self.analyzer.analyze(text, self.tier2_model)
+        except AnalysisFailedError as e:
+            logging.error(f"Cascade tier 2 ({self.tier2_model}) failed again for a single status: {e}")
+            return None
+
+    async def close(self):
+        await self.analyzer.close()
@@ -0,0 +1,264 @@
+import contextlib
+import logging
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+POSTGRES_SCHEMES = ("postgres", "postgresql")
+
+class SQLClusterStore:
+    """
+    Shared coordination state for cluster mode: node heartbeats, per-handle leases, shared
+    cursors and cluster-wide notification claims.
+
+    The logic is plain SQL shared by both backends; subclasses provide the connection,
+    transactions (which must make every read-then-write atomic across nodes) and the clock
+    leases are measured against.
+    """
+    def heartbeat(self, node_id, now=None):
+        """Record that a node is alive."""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO nodes (node_id, heartbeat_at) VALUES (?, ?) "
+                "ON CONFLICT(node_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (node_id, self._now(conn, now))
+            )
+
+    def live_nodes(self, max_age_seconds, now=None):
+        """
+        Returns:
+            list: IDs of nodes whose last heartbeat is at most max_age_seconds old
+        """
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT node_id FROM nodes WHERE heartbeat_at >= ?", (self._now(conn, now) - max_age_seconds,)).fetchall()
+        return sorted(row[0] for row in rows)
+
+    def remove_node(self, node_id):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM nodes WHERE node_id = ?", (node_id,))
+
+    def get_lease(self, name):
+        """
+        Returns:
+            dict: owner, expires_at and term of the lease, or None if it was never taken
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, expires_at, term FROM leases WHERE name = ?", (name,)).fetchone()
+        return {"owner": row[0], "expires_at": row[1], "term": row[2]} if row else None
+
+    def try_acquire_lease(self, name, owner, ttl_seconds, min_expired_seconds=0.0, now=None):
+        """
+        Take or renew a lease. A lease held by another owner can only be taken once it has
+        been expired for at least min_expired_seconds.
+
+        Returns:
+            int: The lease term (incremented on every change of owner), or None if another owner holds it
+        """
+        with self._transaction() as conn:
+            now = self._now(conn, now)
+            row = conn.execute("SELECT owner, expires_at, term FROM leases WHERE name = ?" + self._FOR_UPDATE, (name,)).fetchone()
+            if row is None:
+                term = 1
+            elif row[0] == owner:
+                term = row[2]
+            elif row[1] + min_expired_seconds <= now:
+                term = row[2] + 1
+            else:
+                return None
+            # The condition is checked again on conflict, for a row another node inserted after the select
+            written = conn.execute(
+                "INSERT INTO leases (name, owner, expires_at, term) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at, term = excluded.term "
+                "WHERE leases.term = ? AND (leases.owner = excluded.owner OR leases.expires_at + ? <= ?)",
+                (name, owner, now + ttl_seconds, term, row[2] if row else 0, min_expired_seconds, now)
+            ).rowcount
+        return term if written else None
+
+    def release_lease(self, name, owner):
+        """Expire a lease right away if owner still holds it, so another node can take over."""
+        with self._transaction() as conn:
+            conn.execute("UPDATE leases SET expires_at = 0 WHERE name = ? AND owner = ?", (name, owner))
+
+    def get_cursor(self, handle):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT status_id FROM cursors WHERE handle = ?", (handle,)).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, handle, status_id, node_id, lease=None, term=None, now=None):
+        """
+        Publish a handle's cursor. With lease and term the write is fenced: it only happens
+        while node_id still holds that lease in that term and the lease has not expired, so a
+        leader that lost its lease (e.g. after a long pause) never overwrites its successor's
+        cursor.
+
+        Returns:
+            bool: True if the cursor was written
+        """
+        if not status_id:
+            return False
+        with self._transaction() as conn:
+            now = self._now(conn, now)
+            if lease is not None:
+                row = conn.execute("SELECT owner, expires_at, term FROM leases WHERE name = ?" + self._FOR_UPDATE, (lease,)).fetchone()
+                if row is None or row[0] != node_id or row[2] != term or row[1] <= now:
+                    return False
+            conn.execute(
+                "INSERT INTO cursors (handle, status_id, node_id, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(handle) DO UPDATE SET status_id = excluded.status_id, node_id = excluded.node_id, updated_at = excluded.updated_at",
+                (handle, status_id, node_id, now)
+            )
+        return True
+
+    def claim_notification(self, status_id, node_id, ttl_seconds, now=None):
+        """
+        Claim the right to send a status's notification. An undelivered claim held by
+        another node can be taken over once it is ttl_seconds old, so a node that crashed
+        after claiming does not block the alert forever.
+
+        Returns:
+            bool: True if this node now holds the claim
+        """
+        with self._transaction() as conn:
+            now = self._now(conn, now)
+            row = conn.execute("SELECT node_id, claimed_at, delivered FROM notifications WHERE status_id = ?" + self._FOR_UPDATE, (status_id,)).fetchone()
+            if row is not None and (row[2] or (row[0] != node_id and row[1] + ttl_seconds > now)):
+                return False
+            written = conn.execute(
+                "INSERT INTO notifications (status_id, node_id, claimed_at, delivered) VALUES (?, ?, ?, 0) "
+                "ON CONFLICT(status_id) DO UPDATE SET node_id = excluded.node_id, claimed_at = excluded.claimed_at "
+                "WHERE notifications.delivered = 0 AND (notifications.node_id = excluded.node_id OR notifications.claimed_at + ? <= excluded.claimed_at)",
+                (status_id, node_id, now, ttl_seconds)
+            ).rowcount
+        return written == 1
+
+    def release_notification(self, status_id, node_id):
+        """Drop an undelivered claim held by node_id, so the alert can be claimed again."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM notifications WHERE status_id = ? AND node_id = ? AND delivered = 0", (status_id, node_id))
+
+    def confirm_notification(self, status_id, node_id):
+        """Mark a claimed notification delivered; it can never be claimed again."""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO notifications (status_id, node_id, claimed_at, delivered) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT(status_id) DO UPDATE SET delivered = 1",
+                (status_id, node_id, self._now(conn, None))
+            )
+
+    # Row lock for read-then-write transactions; SQLite already locks the whole database
+    _FOR_UPDATE = ""
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, heartbeat_at {real} NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at {real} NOT NULL, term INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS cursors (handle TEXT PRIMARY KEY, status_id TEXT NOT NULL, node_id TEXT NOT NULL, updated_at {real} NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS notifications (status_id TEXT PRIMARY KEY, node_id TEXT NOT NULL, claimed_at {real} NOT NULL, delivered INTEGER NOT NULL DEFAULT 0)",
+    )
+
+class SQLiteClusterStore(SQLClusterStore):
+    """
+    Cluster store on a SQLite file. Every node opens the same file, so this only works for
+    nodes on one host (or a shared volume with working file locks) and serves as the
+    stand-in for tests; use PostgresClusterStore across hosts or regions. All writes run in
+    BEGIN IMMEDIATE transactions, so lease checks and takeovers are atomic across processes.
+    Leases are measured against each node's clock.
+    """
+    def __init__(self, path, busy_timeout_seconds=5.0):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout_seconds, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in self._SCHEMA:
+            self._conn.execute(statement.format(real="REAL"))
+        logging.info(f"Cluster store opened at {path}")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+
+    def _now(self, conn, now):
+        return time.time() if now is None else now
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class PostgresClusterStore(SQLClusterStore):
+    """
+    Cluster store on PostgreSQL, for nodes on different hosts or regions. Read-then-write
+    transactions lock the rows they decide on (SELECT ... FOR UPDATE), and leases, claims
+    and heartbeats are measured against the database clock, so clock skew between nodes
+    can never make two of them hold the same lease. A dropped connection is reopened on the
+    next call. Needs psycopg (version 3).
+    """
+    def __init__(self, url, connect_timeout_seconds=5):
+        # Only cluster mode on Postgres needs the driver, so it is not in requirements.txt
+        try:
+            import psycopg
+        except ImportError as e:
+            raise ImportError('A PostgreSQL CLUSTER_STORE needs psycopg: pip install "psycopg[binary]"') from e
+
+        self.url = url
+        self._psycopg = psycopg
+        self._connect_timeout_seconds = connect_timeout_seconds
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        with self._transaction() as conn:
+            for statement in self._SCHEMA:
+                conn.execute(statement.format(real="DOUBLE PRECISION"))
+        parts = urlsplit(url)
+        logging.info(f"Cluster store opened at {parts.scheme}://{parts.hostname}{':' + str(parts.port) if parts.port else ''}{parts.path}")
+
+    _FOR_UPDATE = " FOR UPDATE"
+
+    def _connect(self):
+        return self._psycopg.connect(self.url, autocommit=True, connect_timeout=self._connect_timeout_seconds)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            if self._conn.closed or self._conn.broken:
+                logging.warning("Cluster store connection lost. Reconnecting.")
+                self._conn = self._connect()
+            with self._conn.transaction():
+                yield _QmarkConnection(self._conn)
+
+    def _now(self, conn, now):
+        if now is not None:
+            return now
+        return float(conn.execute("SELECT EXTRACT(EPOCH FROM clock_timestamp())").fetchone()[0])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class _QmarkConnection:
+    """Runs the shared ?-placeholder SQL on a psycopg connection, which expects %s."""
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, query, params=()):
+        return self._conn.execute(query.replace("?", "%s"), params)
+
+def create_cluster_store(location):
+    """
+    Open the cluster store named by CLUSTER_STORE.
+
+    Args:
+        location (str): A postgresql:// URL, or the path of a SQLite file shared by every node
+
+    Returns:
+        SQLClusterStore: The store
+    """
+    if urlsplit(location).scheme in POSTGRES_SCHEMES:
+        return PostgresClusterStore(location)
+    return SQLiteClusterStore(location)
@@ -1,54 +1,258 @@
+import asyncio
 import logging
+import threading
+import time
+from collections import deque
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import REGISTRY
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+NOTIFICATIONS = REGISTRY.counter("stonk_notifications_total", "Notifications by outcome (sent, failed)", ("outcome",))
+NOTIFICATION_REQUEST_SECONDS = REGISTRY.histogram("stonk_notification_request_seconds", "ntfy request latency including retries", ("outcome",))
 
 class Notifier:
-    def __init__(self, ntfy_topic):
+    def __init__(self, ntfy_topic, server_url="https://ntfy.sh", timeout_seconds=10, max_retries=3, backoff_factor=0.5):
         self.ntfy_topic = ntfy_topic
-        
+        self.server_url = server_url.rstrip("/")
+        # (connect, read) timeouts so a slow ntfy server can never stall the caller indefinitely
+        self.timeout = (min(3.05, timeout_seconds), timeout_seconds)
+
+        # Pooled keep-alive session; urllib3 retries 429/5xx with exponential backoff and honours Retry-After
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Delivery metrics
+        self._metrics_lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self._request_latencies = deque(maxlen=1000)
+
     def send_notification(self, title, message, priority="default", tags=None):
         """
         Sends a notification using ntfy.sh.
-        
+
         Args:
             title (str): The notification title
             message (str): The notification message
             priority (str, optional): Priority level (default, low, high, urgent). Defaults to "default".
             tags (list, optional): List of tag strings for the notification. Defaults to None.
+
+        Returns:
+            bool: True if ntfy.sh accepted the notification
         """
         logging.info(f"Preparing to send notification: {title}")
-        
+
         if not self.ntfy_topic:
             logging.warning("NTFY_TOPIC not configured. Notification not sent.")
-            return
-            
-        # Use query parameters for title and tags instead of headers to avoid encoding issues
-        params = {}
-        
-        # Add title as a query parameter
-        if title:
-            params['title'] = title
-            
-        # Add tags as query parameters
-        if tags:
-            params['tags'] = ','.join(str(tag) for tag in tags)
-            
-        # Only use headers for priority which shouldn't contain Unicode
-        headers = {
-            "Priority": str(priority)
-        }
-            
+            return False
+
+        params, headers = _ntfy_request_options(title, priority, tags)
+
+        started = time.monotonic()
+        success = False
         try:
-            response = requests.post(
-                f"https://ntfy.sh/{self.ntfy_topic}",
+            response = self.session.post(
+                f"{self.server_url}/{self.ntfy_topic}",
                 data=message.encode(encoding='utf-8'),
                 headers=headers,
-                params=params
+                params=params,
+                timeout=self.timeout
             )
-            
+
+            if response.status_code == 200:
+                logging.info(f"Notification sent to {self.server_url}/{self.ntfy_topic}")
+                success = True
+            else:
+                logging.error(f"Failed to send notification. Status code: {response.status_code}")
+
+        except Exception as e:
+            logging.error(f"Failed to send notification to {self.server_url}: {e}")
+
+        elapsed = time.monotonic() - started
+        outcome = "sent" if success else "failed"
+        NOTIFICATIONS.inc(outcome=outcome)
+        NOTIFICATION_REQUEST_SECONDS.observe(elapsed, outcome=outcome)
+        with self._metrics_lock:
+            if success:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._request_latencies.append(elapsed)
+
+        return success
+
+    def warm_up(self):
+        """
+        Open a pooled keep-alive connection to the ntfy server without publishing anything.
+
+        Returns:
+            bool: True if the server reports itself healthy
+        """
+        response = self.session.get(f"{self.server_url}/v1/health", timeout=self.timeout)
+        return response.status_code == 200
+
+    def close(self):
+        """Close the HTTP session."""
+        self.session.close()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Delivery counters plus request latency percentiles in seconds
+        """
+        with self._metrics_lock:
+            stats = {"sent": self.sent, "failed": self.failed}
+            stats.update(_percentiles("request", self._request_latencies))
+        return stats
+
+class AsyncNotifier:
+    """
+    ntfy client for the asyncio runtime, on a pooled httpx.AsyncClient.
+
+    Connection errors are retried by the transport; 429/5xx responses are retried here with
+    exponential backoff, honouring Retry-After. Queueing is left to the caller's pipeline.
+    """
+    def __init__(self, ntfy_topic, server_url="https://ntfy.sh", timeout_seconds=10, max_retries=3, backoff_factor=0.5):
+        self.ntfy_topic = ntfy_topic
+        self.server_url = server_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        # Only the async runtime needs httpx, so the threaded runtime never pays for importing it
+        import httpx
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout_seconds, connect=min(3.05, timeout_seconds)),
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+            transport=httpx.AsyncHTTPTransport(retries=max_retries)
+        )
+        self.sent = 0
+        self.failed = 0
+        self._request_latencies = deque(maxlen=1000)
+
+    async def send_notification(self, title, message, priority="default", tags=None):
+        """
+        Sends a notification using ntfy.sh.
+
+        Args:
+            title (str): The notification title
+            message (str): The notification message
+            priority (str, optional): Priority level (default, low, high, urgent). Defaults to "default".
+            tags (list, optional): List of tag strings for the notification. Defaults to None.
+
+        Returns:
+            bool: True if ntfy.sh accepted the notification
+        """
+        logging.info(f"Preparing to send notification: {title}")
+
+        if not self.ntfy_topic:
+            logging.warning("NTFY_TOPIC not configured. Notification not sent.")
+            return False
+
+        params, headers = _ntfy_request_options(title, priority, tags)
+        started = time.monotonic()
+        success = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                response = await self.client.post(
+                    f"{self.server_url}/{self.ntfy_topic}",
+                    content=message.encode(encoding='utf-8'),
+                    headers=headers,
+                    params=params
+                )
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    break
+                delay = _retry_after_seconds(response) or self.backoff_factor * (2 ** attempt)
+                logging.warning(f"ntfy returned {response.status_code}. Retrying in {delay:.1f} seconds.")
+                await asyncio.sleep(delay)
+
             if response.status_code == 200:
-                logging.info(f"Notification sent to ntfy.sh/{self.ntfy_topic}")
+                logging.info(f"Notification sent to {self.server_url}/{self.ntfy_topic}")
+                success = True
             else:
                 logging.error(f"Failed to send notification. Status code: {response.status_code}")
-                
+
         except Exception as e:
-            logging.error(f"Failed to send notification to ntfy.sh: {e}") 
\ No newline at end of file
+            logging.error(f"Failed to send notification to {self.server_url}: {e}")
+
+        elapsed = time.monotonic() - started
+        outcome = "sent" if success else "failed"
+        NOTIFICATIONS.inc(outcome=outcome)
+        NOTIFICATION_REQUEST_SECONDS.observe(elapsed, outcome=outcome)
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self._request_latencies.append(elapsed)
+
+        return success
+
+    async def warm_up(self):
+        response = await self.client.get(f"{self.server_url}/v1/health")
+        return response.status_code == 200
+
+    async def close(self):
+        """Close the HTTP client."""
+        await self.client.aclose()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Delivery counters plus request latency percentiles in seconds
+        """
+        stats = {"sent": self.sent, "failed": self.failed}
+        stats.update(_percentiles("request", list(self._request_latencies)))
+        return stats
+
+def _ntfy_request_options(title, priority, tags):
+    """
+    Returns:
+        tuple: (query params, headers) for an ntfy publish request
+    """
+    # Use query parameters for title and tags instead of headers to avoid encoding issues
+    params = {}
+
+    # Add title as a query parameter
+    if title:
+        params['title'] = title
+
+    # Add tags as query parameters
+    if tags:
+        params['tags'] = ','.join(str(tag) for tag in tags)
+
+    # Only use headers for priority which shouldn't contain Unicode
+    headers = {
+        "Priority": str(priority)
+    }
+    return params, headers
+
+def _retry_after_seconds(response):
+    """Seconds from a numeric Retry-After header, or None."""
+    try:
+        return max(float(response.headers.get("Retry-After", "")), 0)
+    except ValueError:
+        return None
+
+def _percentiles(prefix, samples):
+    """Summarize latency samples as p50/p95/max keys with the given prefix."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        f"{prefix}_p50": ordered[len(ordered) // 2],
+        f"{prefix}_p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+        f"{prefix}_max": ordered[-1],
+    }
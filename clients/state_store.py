@@ -0,0 +1,306 @@
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from metrics import REGISTRY
+
+STATE_BACKENDS = ("sqlite", "file")
+
+_STATUS_COLUMNS = "status_id, handle, analyzed, notified, sentiment, significant, reasoning, alert"
+
+STATE_COMMIT_SECONDS = REGISTRY.histogram("stonk_state_commit_seconds", "Time to durably commit a state transaction", ("backend",))
+
+class SQLiteStateStore:
+    """
+    Crash-safe state backend on SQLite in WAL mode.
+
+    Holds per-handle cursors and one processing record per status (analyzed, notified, the
+    analysis result and, for significant statuses, the alert to send). Group related writes
+    with transaction() so they commit atomically.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        # Autocommit mode; transaction() issues BEGIN/COMMIT explicitly
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cursors ("
+            "handle TEXT PRIMARY KEY, status_id TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS statuses ("
+            "status_id TEXT PRIMARY KEY, handle TEXT, analyzed INTEGER NOT NULL DEFAULT 0, "
+            "notified INTEGER NOT NULL DEFAULT 0, sentiment TEXT, significant INTEGER, reasoning TEXT, "
+            "alert TEXT, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS statuses_handle ON statuses (handle)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS statuses_pending_alerts ON statuses (status_id) WHERE alert IS NOT NULL AND notified = 0")
+        logging.info(f"State store opened at {path} (sqlite, WAL)")
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group writes into a single atomic commit. Nested calls join the outer transaction."""
+        with self._lock:
+            if self._depth == 0:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    with STATE_COMMIT_SECONDS.time(backend="sqlite"):
+                        self._conn.execute("COMMIT")
+
+    def get_cursor(self, handle):
+        """
+        Returns:
+            str: The last processed status ID for the handle, or None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT status_id FROM cursors WHERE handle = ?", (handle,)).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, handle, status_id):
+        """Record the last processed status ID for a handle."""
+        if not status_id:
+            return
+        with self.transaction():
+            self._conn.execute(
+                "INSERT INTO cursors (handle, status_id, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(handle) DO UPDATE SET status_id = excluded.status_id, updated_at = excluded.updated_at",
+                (handle, status_id, time.time())
+            )
+        logging.debug(f"Cursor for @{handle} set to {status_id}")
+
+    def record_status(self, status_id, handle, analyzed=False, notified=False, result=None, alert=None):
+        """
+        Record that a status was handled.
+
+        Args:
+            status_id (str): The status ID
+            handle (str): The handle the status belongs to
+            analyzed (bool): Whether the status went through sentiment analysis
+            notified (bool): Whether a notification was sent for it
+            result (tuple, optional): The analysis result; its sentiment, significant and
+                reasoning are stored
+            alert (dict, optional): The alert to deliver (title, message, priority, tags,
+                account). It stays pending until mark_notified() is called.
+        """
+        sentiment, significant, reasoning = result[:3] if result else (None, None, None)
+        with self.transaction():
+            self._conn.execute(
+                "INSERT INTO statuses (status_id, handle, analyzed, notified, sentiment, significant, reasoning, alert, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(status_id) DO UPDATE SET analyzed = excluded.analyzed, "
+                "notified = MAX(statuses.notified, excluded.notified), sentiment = excluded.sentiment, "
+                "significant = excluded.significant, reasoning = excluded.reasoning, alert = excluded.alert, "
+                "updated_at = excluded.updated_at",
+                (status_id, handle, int(analyzed), int(notified), sentiment,
+                 None if significant is None else int(significant), reasoning,
+                 json.dumps(alert, ensure_ascii=False) if alert else None, time.time())
+            )
+
+    def mark_notified(self, status_id):
+        """Flag a recorded status as notified."""
+        with self.transaction():
+            self._conn.execute(
+                "UPDATE statuses SET notified = 1, updated_at = ? WHERE status_id = ?",
+                (time.time(), status_id)
+            )
+
+    def is_handled(self, status_id):
+        """
+        Returns:
+            bool: True if the status already has a processing record
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM statuses WHERE status_id = ?", (status_id,)).fetchone()
+        return row is not None
+
+    def get_status(self, status_id):
+        """
+        Returns:
+            dict: The processing record for a status, or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_STATUS_COLUMNS} FROM statuses WHERE status_id = ?",
+                (status_id,)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def pending_alerts(self):
+        """
+        Returns:
+            list: Records of statuses whose alert was recorded but never delivered, oldest first
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_STATUS_COLUMNS} FROM statuses WHERE alert IS NOT NULL AND notified = 0 "
+                "ORDER BY length(status_id), status_id"
+            ).fetchall()
+        return [self._record(row) for row in rows]
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _record(row):
+        return {
+            "status_id": row[0],
+            "handle": row[1],
+            "analyzed": bool(row[2]),
+            "notified": bool(row[3]),
+            "result": (row[4], bool(row[5]), row[6]) if row[2] else None,
+            "alert": json.loads(row[7]) if row[7] else None,
+        }
+
+class FileStateStore:
+    """
+    Fallback state backend: a JSON document replaced atomically (write to a temp file,
+    fsync, rename) on every commit, so a crash leaves either the old or the new state.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._dirty = False
+        self._state = {"cursors": {}, "statuses": {}}
+        try:
+            with open(path, "r") as f:
+                loaded = json.load(f)
+            self._state["cursors"].update(loaded.get("cursors", {}))
+            self._state["statuses"].update(loaded.get("statuses", {}))
+        except FileNotFoundError:
+            logging.info(f"{path} not found. Starting with empty state.")
+        except (IOError, ValueError) as e:
+            logging.error(f"Error reading state from {path}: {e}. Starting with empty state.")
+        logging.info(f"State store opened at {path} (file)")
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group writes into a single atomic file replace. Nested calls join the outer transaction."""
+        with self._lock:
+            snapshot = None
+            if self._depth == 0:
+                snapshot = json.loads(json.dumps(self._state))
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if snapshot is not None:
+                    self._state = snapshot
+                    self._dirty = False
+                raise
+            else:
+                self._depth -= 1
+                if self._depth == 0 and self._dirty:
+                    with STATE_COMMIT_SECONDS.time(backend="file"):
+                        self._flush()
+
+    def get_cursor(self, handle):
+        with self._lock:
+            return self._state["cursors"].get(handle)
+
+    def set_cursor(self, handle, status_id):
+        if not status_id:
+            return
+        with self.transaction():
+            self._state["cursors"][handle] = status_id
+            self._dirty = True
+
+    def record_status(self, status_id, handle, analyzed=False, notified=False, result=None, alert=None):
+        with self.transaction():
+            previous = self._state["statuses"].get(status_id, {})
+            self._state["statuses"][status_id] = {
+                "handle": handle,
+                "analyzed": analyzed,
+                "notified": notified or previous.get("notified", False),
+                "result": list(result[:3]) if result else None,
+                "alert": alert or None,
+            }
+            self._dirty = True
+
+    def mark_notified(self, status_id):
+        with self.transaction():
+            record = self._state["statuses"].get(status_id)
+            if record is not None:
+                record["notified"] = True
+                self._dirty = True
+
+    def is_handled(self, status_id):
+        with self._lock:
+            return status_id in self._state["statuses"]
+
+    def get_status(self, status_id):
+        with self._lock:
+            record = self._state["statuses"].get(status_id)
+            return self._record(status_id, record) if record is not None else None
+
+    def pending_alerts(self):
+        with self._lock:
+            pending = [
+                self._record(status_id, record) for status_id, record in self._state["statuses"].items()
+                if record.get("alert") and not record["notified"]
+            ]
+        return sorted(pending, key=lambda record: (len(record["status_id"]), record["status_id"]))
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _record(status_id, record):
+        return {
+            "status_id": status_id,
+            "handle": record["handle"],
+            "analyzed": record["analyzed"],
+            "notified": record["notified"],
+            "result": tuple(record["result"]) if record["result"] else None,
+            "alert": record.get("alert"),
+        }
+
+    def _flush(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".state-", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except (IOError, OSError) as e:
+            logging.error(f"Error writing state to {self.path}: {e}")
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+
+def create_state_store(path, backend="sqlite"):
+    """
+    Open the configured state backend.
+
+    Args:
+        path (str): Path to the state database or file
+        backend (str): "sqlite" or "file"
+    """
+    if backend == "file":
+        return FileStateStore(path)
+    if backend != "sqlite":
+        raise ValueError(f"Unknown state backend '{backend}'. Expected one of {STATE_BACKENDS}.")
+    return SQLiteStateStore(path)
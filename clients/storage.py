@@ -1,4 +1,5 @@
 import logging
+import os
 
 def read_file(path):
     """
@@ -39,4 +40,18 @@ def write_file(path, value):
             f.write(f"{value}\n")
         logging.debug(f"Wrote value '{value}' to {path}")
     except IOError as e:
-        logging.error(f"Error writing value '{value}' to {path}: {e}") 
\ No newline at end of file
+        logging.error(f"Error writing value '{value}' to {path}: {e}")
+
+def handle_storage_path(path, handle):
+    """
+    Derives a per-handle storage path from a base path.
+    
+    Args:
+        path (str): Base storage path, e.g. last_processed_id.txt
+        handle (str): Account handle
+        
+    Returns:
+        str: e.g. last_processed_id.WhiteHouse.txt
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.{handle}{ext}"
@@ -0,0 +1,73 @@
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+class TokenStore:
+    """
+    Keeps the Truth Social access token on disk so a restart reuses the session instead of
+    logging in again.
+
+    The file is only readable by its owner (0600) and is replaced atomically (temp file,
+    fsync, rename), so a crash never leaves a truncated token behind. Truth Social tokens
+    carry no expiry, so a token is treated as expiring max_age_seconds after login and is
+    refreshed refresh_margin_seconds before that.
+    """
+    def __init__(self, path, max_age_seconds=7 * 24 * 3600, refresh_margin_seconds=3600):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+
+    def load(self, username):
+        """
+        Args:
+            username (str): The account the token must belong to
+
+        Returns:
+            dict: access_token and obtained_at (epoch seconds), or None if there is no usable token
+        """
+        try:
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (IOError, OSError, ValueError) as e:
+            logging.error(f"Error reading the saved token from {self.path}: {e}")
+            return None
+
+        if not isinstance(saved, dict) or not saved.get("access_token") or saved.get("username") != username:
+            logging.info(f"Saved token in {self.path} is not for this account. A new login is needed.")
+            return None
+        if self.needs_refresh(saved.get("obtained_at", 0)):
+            logging.info("Saved token is due for refresh. A new login is needed.")
+            return None
+        return {"access_token": saved["access_token"], "obtained_at": saved["obtained_at"]}
+
+    def save(self, username, access_token, obtained_at=None):
+        """Write the token atomically with owner-only permissions."""
+        obtained_at = time.time() if obtained_at is None else obtained_at
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".token-", dir=directory)
+        try:
+            # mkstemp already creates the file as 0600; be explicit since the token is a credential
+            os.fchmod(fd, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"username": username, "access_token": access_token, "obtained_at": obtained_at}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            logging.info(f"Saved Truth Social token to {self.path}")
+        except (IOError, OSError) as e:
+            logging.error(f"Error saving token to {self.path}: {e}")
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+
+    def needs_refresh(self, obtained_at, now=None):
+        """
+        Returns:
+            bool: True once a token obtained at obtained_at is within the refresh margin of its expiry
+        """
+        now = time.time() if now is None else now
+        return now >= obtained_at + self.max_age_seconds - self.refresh_margin_seconds
@@ -1,41 +1,233 @@
+import datetime
 import logging
-from truthbrush.api import Api
+import threading
+import time
+
+from clients.token_store import TokenStore
 
 class TruthSocialClient:
-    def __init__(self, username, password, target_handle):
+    def __init__(self, username, password, target_handle, token_store: TokenStore = None):
         self.username = username
         self.password = password
         self.target_handle = target_handle
+        self.token_store = token_store
         self.api_client = None
+        self.token_obtained_at = None
+        self._auth_lock = threading.Lock()
         
     def initialize(self):
-        """Initialize the Truth Social API client."""
+        """
+        Initialize the Truth Social API client, reusing the saved token when there is one.
+        truthbrush (and curl_cffi behind it) is imported here rather than at module load.
+        """
         try:
-            self.api_client = Api(self.username, self.password)
-            logging.info("Truth Social API client initialized successfully.")
+            from truthbrush.api import Api
+
+            saved = self.token_store.load(self.username) if self.token_store else None
+            token = saved["access_token"] if saved else None
+            self.token_obtained_at = saved["obtained_at"] if saved else None
+            # Without a saved token, truthbrush falls back to TRUTHSOCIAL_TOKEN or a login on first use
+            self.api_client = Api(self.username, self.password, token=token) if token else Api(self.username, self.password)
+            logging.info(f"Truth Social API client initialized successfully{' with the saved token' if token else ''}.")
             return True
         except Exception as e:
             raise Exception(f"API initialization failed: {e}.")
             
-    def get_new_statuses(self, last_known_id=None):
+    def get_new_statuses(self, last_known_id=None, handle=None):
         """
-        Fetch new statuses for the target user since the last known ID.
+        Fetch new statuses for a user since the last known ID.
+        Uses the target handle unless another handle is given; all handles share one session.
         Returns a generator of status objects.
         """
         if not self.api_client:
             logging.error("API client not initialized. Call initialize() first.")
             return []
             
-        logging.info(f"Fetching new statuses for @{self.target_handle} since ID: {last_known_id or 'None'}...")
+        handle = handle or self.target_handle
+        logging.info(f"Fetching new statuses for @{handle} since ID: {last_known_id or 'None'}...")
         
         try:
-            # pull_statuses returns a generator, so we can iterate through it
-            return self.api_client.pull_statuses(
-                username=self.target_handle, 
-                since_id=last_known_id, 
-                replies=False, 
+            # Log in (or refresh) here, so the token is saved rather than obtained inside truthbrush
+            token = self.get_auth_token()
+            return self._pull_statuses(handle, last_known_id, token)
+        except Exception as e:
+            logging.error(f"Error fetching statuses: {e}", exc_info=True)
+            return []
+
+    def pull_statuses(self, handle=None, since_id=None, created_after=None):
+        """
+        Page through a handle's statuses newer than since_id (and created after
+        created_after), newest first, with the same token handling as get_new_statuses.
+        Unlike get_new_statuses, errors are raised rather than logged, so a caller paging
+        through history (e.g. backfill) never mistakes a failure for the end of it.
+
+        Returns:
+            generator: Status objects
+        """
+        if not self.api_client:
+            raise Exception("API client not initialized. Call initialize() first.")
+        handle = handle or self.target_handle
+        return self._pull_statuses(handle, since_id, self.get_auth_token(), created_after)
+
+    def _pull_statuses(self, handle, last_known_id, token, created_after=None):
+        """
+        Yield the handle's statuses newer than last_known_id, newest first.
+
+        pull_statuses starts with an account lookup and indexes its answer with ["id"], so a
+        rejected token surfaces as a KeyError (or TypeError for an empty body) on the first
+        item. In that case the lookup is repeated to see why: on an auth error or an answer
+        without an ID, the client logs in again and retries once.
+        """
+        for attempt in range(2):
+            statuses = self.api_client.pull_statuses(
+                username=handle,
+                since_id=last_known_id,
+                created_after=created_after,
+                replies=False,
                 verbose=False
             )
+            try:
+                first = next(statuses)
+            except StopIteration:
+                return
+            except (KeyError, TypeError) as e:
+                account = self.api_client.lookup(handle)
+                if isinstance(account, dict) and account.get("id"):
+                    if attempt == 0:
+                        continue
+                    raise Exception(f"Could not pull statuses for @{handle}: {e!r}") from e
+                if attempt > 0 or (isinstance(account, dict) and "error" in account and not _is_auth_error(account)):
+                    raise Exception(f"Could not look up @{handle}: {account}") from e
+                token = self.refresh_auth_token(token)
+                continue
+            yield first
+            yield from statuses
+            return
+
+    def get_status(self, status_id):
+        """
+        Fetch a single status, e.g. one that another status quotes.
+
+        Returns:
+            dict: The status object, or None if it could not be fetched
+        """
+        if not self.api_client:
+            logging.error("API client not initialized. Call initialize() first.")
+            return None
+
+        try:
+            status = self._api_get(f"/v1/statuses/{status_id}")
         except Exception as e:
-            logging.error(f"Error fetching statuses: {e}", exc_info=True)
-            return [] 
\ No newline at end of file
+            logging.error(f"Error fetching status {status_id}: {e}")
+            return None
+        return status if isinstance(status, dict) and status.get("id") else None
+
+    def verify_credentials(self):
+        """
+        Make one authenticated request, refreshing a rejected token once. Used by the
+        startup warmup and --check.
+
+        Returns:
+            str: The logged-in account's username
+        """
+        account = self._api_get("/v1/accounts/verify_credentials")
+        if not isinstance(account, dict) or not account.get("id"):
+            raise Exception(f"Truth Social rejected the credentials: {account}")
+        return account.get("username")
+
+    def _api_get(self, path):
+        """
+        GET an API path on the current session, logging in again once if the token is rejected.
+
+        truthbrush has no public call for arbitrary endpoints, so this is the one place that
+        uses its private Api._get(path), as of truthbrush 0.3.0: it prefixes the API base URL,
+        sends the bearer token and returns the decoded JSON, or None. Recheck it when
+        upgrading truthbrush.
+
+        Returns:
+            The decoded response
+        """
+        token = self.get_auth_token()
+        response = self.api_client._get(path)
+        if _is_auth_error(response):
+            self.refresh_auth_token(token)
+            response = self.api_client._get(path)
+        return response
+
+    def get_auth_token(self):
+        """
+        Return the session's bearer token, logging in first if there is none yet or the
+        saved token is due for refresh.
+
+        Returns:
+            str: The access token
+        """
+        if not self.api_client:
+            raise Exception("API client not initialized. Call initialize() first.")
+        with self._auth_lock:
+            if self.api_client.auth_id and self.token_store and self.token_obtained_at is not None \
+                    and self.token_store.needs_refresh(self.token_obtained_at):
+                logging.info("Truth Social token is due for refresh.")
+                self.api_client.auth_id = None
+            if not self.api_client.auth_id:
+                self._login()
+            return self.api_client.auth_id
+
+    def refresh_auth_token(self, rejected_token=None):
+        """
+        Log in again after the server rejected the token. Concurrent callers that saw the
+        same rejected token share one login.
+
+        Returns:
+            str: The new access token
+        """
+        if not self.api_client:
+            raise Exception("API client not initialized. Call initialize() first.")
+        with self._auth_lock:
+            if rejected_token is None or self.api_client.auth_id == rejected_token:
+                logging.warning("Truth Social rejected the access token. Logging in again.")
+                self._login()
+            return self.api_client.auth_id
+
+    def _login(self):
+        started = time.perf_counter()
+        self.api_client.auth_id = self.api_client.get_auth_id(self.username, self.password)
+        self.token_obtained_at = time.time()
+        logging.info(f"Logged in to Truth Social in {time.perf_counter() - started:.2f}s.")
+        if self.token_store:
+            self.token_store.save(self.username, self.api_client.auth_id, self.token_obtained_at)
+
+    def rate_limit_status(self):
+        """
+        Report the rate limit state the truthbrush client recorded from the last response headers.
+
+        Returns:
+            dict: rate_limit_remaining (int or None) and rate_limit_reset (epoch seconds or None)
+        """
+        remaining = getattr(self.api_client, "ratelimit_remaining", None)
+        reset = getattr(self.api_client, "ratelimit_reset", None)
+
+        if isinstance(reset, datetime.datetime):
+            if reset.tzinfo is None:
+                # truthbrush parses the header without a zone and treats it as UTC itself
+                reset = reset.replace(tzinfo=datetime.timezone.utc)
+            reset = reset.timestamp()
+        elif reset is not None:
+            try:
+                reset = float(reset)
+            except (TypeError, ValueError):
+                reset = None
+
+        try:
+            remaining = int(remaining) if remaining is not None else None
+        except (TypeError, ValueError):
+            remaining = None
+
+        return {"rate_limit_remaining": remaining, "rate_limit_reset": reset}
+
+def _is_auth_error(response):
+    """True for the error body Truth Social returns for a missing, expired or revoked token."""
+    if not isinstance(response, dict) or "error" not in response:
+        return False
+    error = str(response.get("error", "")).lower()
+    return "token" in error or "unauthorized" in error or "not authorized" in error
@@ -0,0 +1,165 @@
+import json
+import logging
+import random
+import threading
+
+DEFAULT_STREAM_URL = "https://truthsocial.com/api/v1/streaming/user"
+
+class TruthSocialStream:
+    """
+    Push-based ingestion over the Mastodon-style server-sent events stream.
+
+    Subscribes to the logged-in account's home timeline (so the account must follow the
+    target handles; Truth Social has no per-account stream) and forwards "update" events
+    authored by the target handles to on_status. Everything else on the home timeline is
+    dropped, and so are replies to other accounts, matching the poll path's
+    replies=False. Connections use truthbrush's curl_cffi session with its browser
+    impersonation, user agent and proxies, like every other Truth Social request.
+
+    Reconnects with exponential backoff; on_connect is called every time a connection is
+    established so the caller can fill any gap with a since_id catch-up poll.
+    """
+    def __init__(self, api_client, handles, on_status, on_connect=None, stream_url=DEFAULT_STREAM_URL,
+                 initial_backoff_seconds=1, max_backoff_seconds=300, read_timeout_seconds=90):
+        self.api_client = api_client
+        self.handles = {handle.lower(): handle for handle in handles}
+        self.on_status = on_status
+        self.on_connect = on_connect
+        self.stream_url = stream_url
+        self.initial_backoff_seconds = initial_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        # Servers send a heartbeat comment every ~15s, so a long silence means a dead connection
+        self.read_timeout_seconds = read_timeout_seconds
+        self.reconnects = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._response = None
+        self._connected = False
+        self._session = None
+
+    def start(self):
+        """Start consuming the stream on a background thread."""
+        # truthbrush's own (curl_cffi) session, so the stream looks like its other requests
+        self._session = self.api_client.api_client._make_session()
+        self._thread = threading.Thread(target=self._run, name="truth-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Close the connection and stop the background thread."""
+        self._stop.set()
+        response = self._response
+        if response is not None:
+            # curl_cffi only notices the close when the next chunk (e.g. a heartbeat) arrives
+            threading.Thread(target=response.close, name="truth-stream-close", daemon=True).start()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logging.warning(f"Status stream did not stop within {timeout} seconds.")
+                return
+        if self._session is not None:
+            self._session.close()
+
+    def _run(self):
+        backoff = self.initial_backoff_seconds
+        while not self._stop.is_set():
+            self._connected = False
+            try:
+                self._consume()
+                logging.warning("Status stream closed by server.")
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                logging.error(f"Status stream error: {e}")
+
+            if self._stop.is_set():
+                break
+            if self._connected:
+                # Only back off further while connection attempts keep failing
+                backoff = self.initial_backoff_seconds
+            delay = backoff * random.uniform(0.5, 1.0)
+            logging.info(f"Reconnecting to status stream in {delay:.1f} seconds...")
+            self._stop.wait(delay)
+            backoff = min(backoff * 2, self.max_backoff_seconds)
+            self.reconnects += 1
+
+    def _consume(self):
+        from truthbrush.api import IMPERSONATE_TARGET, USER_AGENT, proxies
+
+        token = self.api_client.get_auth_token()
+        headers = {"Authorization": f"Bearer {token}", "Accept": "text/event-stream", "User-Agent": USER_AGENT}
+
+        response = self._session.get(
+            self.stream_url,
+            headers=headers,
+            stream=True,
+            timeout=(10, self.read_timeout_seconds),
+            impersonate=IMPERSONATE_TARGET,
+            proxies=proxies
+        )
+        self._response = response
+        try:
+            if response.status_code == 401:
+                # Reconnect with a fresh login instead of retrying a revoked token
+                self.api_client.refresh_auth_token(token)
+            response.raise_for_status()
+            self._connected = True
+            logging.info(f"Connected to status stream at {self.stream_url}")
+            if self.on_connect is not None:
+                self.on_connect()
+
+            for event, data in parse_events(response.iter_lines()):
+                if self._stop.is_set():
+                    return
+                self._dispatch(event, data)
+        finally:
+            response.close()
+
+    def _dispatch(self, event, data):
+        if event != "update":
+            return
+        try:
+            status = json.loads(data)
+        except json.JSONDecodeError as e:
+            logging.error(f"Failed to decode streamed status: {e}")
+            return
+
+        account = status.get("account") or {}
+        # acct carries a domain only for remote accounts, which are never the watched handles
+        handle = account.get("acct") or account.get("username") or ""
+        if handle.lower() not in self.handles:
+            return
+        if status.get("in_reply_to_id") and status.get("in_reply_to_account_id") != account.get("id"):
+            # Like exclude_replies on the poll path: replies to others are dropped, threads are kept
+            logging.debug(f"Ignoring streamed reply {status.get('id')} from @{handle}")
+            return
+
+        logging.info(f"Received streamed status ID {status.get('id')} from @{handle}")
+        self.on_status(self.handles[handle.lower()], status)
+
+def parse_events(lines):
+    """
+    Parse a server-sent events stream.
+
+    Args:
+        lines: The response body split into lines (bytes or str), without line endings
+
+    Yields:
+        tuple: (event, data) for every complete event with data; comments (heartbeats) are skipped
+    """
+    event = None
+    data_lines = []
+    for raw_line in lines:
+        line = raw_line.decode("utf-8", errors="replace") if isinstance(raw_line, bytes) else (raw_line or "")
+        line = line.rstrip("\r")
+        if not line:
+            # Blank line dispatches the buffered event
+            if event and data_lines:
+                yield event, "\n".join(data_lines)
+            event = None
+            data_lines = []
+        elif line.startswith(":"):
+            continue  # heartbeat comment
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
@@ -0,0 +1,226 @@
+import hashlib
+import logging
+import threading
+
+from metrics import REGISTRY
+from processor import status_id_key
+
+CLUSTER_LEADERSHIP = REGISTRY.counter("stonk_cluster_leadership_changes_total", "Handle leases gained, released or lost by this node", ("handle", "change"))
+CLUSTER_NOTIFICATION_CLAIMS = REGISTRY.counter("stonk_cluster_notification_claims_total", "Cluster-wide notification claims by outcome (won, lost)", ("outcome",))
+
+def rendezvous_owner(key, nodes):
+    """
+    Highest-random-weight (rendezvous) hashing: every node computes the same owner for a
+    key, and when a node joins or leaves only the keys it gains or held move.
+
+    Returns:
+        str: The owning node ID, or None if there are no nodes
+    """
+    return max(nodes, key=lambda node: hashlib.sha256(f"{node}\x00{key}".encode("utf-8")).digest(), default=None)
+
+class ClusterCoordinator:
+    """
+    Runs one node of a cluster sharing a cluster store (see clients/cluster_store.py).
+
+    Handles are partitioned across live nodes by rendezvous hashing, so each node polls,
+    analyzes and notifies for its share of the handles. Exactly one node polls a handle,
+    enforced with a per-handle lease: the preferred node takes a free lease right away,
+    and any other node may take it over once it has been expired for a full lease period,
+    so a crashed leader fails over within about two lease periods. When a node joins, the
+    handles it now owns are released to it by their current leaders.
+
+    Cursors are published to the shared store so a new leader continues where the old one
+    stopped, and every alert is claimed cluster-wide before it is sent, so overlapping
+    polls during a failover never send the same alert twice. A claim is released when
+    delivery fails and expires after claim_seconds if its node never confirms delivery.
+    """
+    def __init__(self, store, node_id, handles, lease_seconds=30.0, claim_seconds=300.0):
+        self.store = store
+        self.node_id = node_id
+        self.handles = list(handles)
+        self.lease_seconds = lease_seconds
+        self.claim_seconds = claim_seconds
+        self._leading = {}
+        self._live_nodes = [node_id]
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Register this node and start the heartbeat thread, which renews leases and rebalances handles."""
+        self._heartbeat()
+        self._thread = threading.Thread(target=self._run, name="cluster-heartbeat", daemon=True)
+        self._thread.start()
+        logging.info(f"Cluster node {self.node_id} started; live nodes: {self._live_nodes}")
+        return self
+
+    def stop(self):
+        """Release every lease so other nodes take over immediately, then leave the cluster."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.lease_seconds)
+        with self._lock:
+            for handle in list(self._leading):
+                self._release(handle, "released")
+        try:
+            self.store.remove_node(self.node_id)
+        except Exception as e:
+            logging.error(f"Could not deregister cluster node {self.node_id}: {e}")
+        self.store.close()
+
+    def owner(self, handle):
+        """
+        Returns:
+            str: The node that should poll the handle
+        """
+        with self._lock:
+            return rendezvous_owner(handle, self._live_nodes)
+
+    def should_poll(self, handle):
+        """
+        Take or renew this node's lease on the handle.
+
+        Returns:
+            bool: True if this node is the handle's leader and should poll it now
+        """
+        with self._lock:
+            preferred = self.owner(handle) == self.node_id
+            # Non-preferred nodes only take over a lease that has been expired for a full period
+            min_expired = 0.0 if preferred else self.lease_seconds
+            try:
+                term = self.store.try_acquire_lease(self._lease_name(handle), self.node_id, self.lease_seconds, min_expired)
+            except Exception as e:
+                logging.error(f"Cluster lease check for @{handle} failed: {e}")
+                term = None
+
+            if term is None:
+                if handle in self._leading:
+                    del self._leading[handle]
+                    CLUSTER_LEADERSHIP.inc(handle=handle, change="lost")
+                    logging.warning(f"Lost the lease for @{handle}; another node is polling it now.")
+                return False
+
+            if self._leading.get(handle) != term:
+                self._leading[handle] = term
+                CLUSTER_LEADERSHIP.inc(handle=handle, change="gained")
+                logging.info(f"Node {self.node_id} is now polling @{handle} (lease term {term}{'' if preferred else ', failover'}).")
+            return True
+
+    def cursor_for(self, handle, local_cursor):
+        """
+        Returns:
+            str: The newer of this node's cursor and the cluster's cursor for the handle
+        """
+        try:
+            shared = self.store.get_cursor(handle)
+        except Exception as e:
+            logging.error(f"Could not read the cluster cursor for @{handle}: {e}")
+            return local_cursor
+        if shared is None or (local_cursor is not None and status_id_key(local_cursor) >= status_id_key(shared)):
+            return local_cursor
+        if local_cursor != shared:
+            logging.info(f"Adopting cluster cursor {shared} for @{handle} (local cursor: {local_cursor or 'None'}).")
+        return shared
+
+    def publish_cursor(self, handle, cursor):
+        """
+        Share the handle's cursor while this node leads it. The write is fenced by the lease
+        term in the store, so a leader whose lease was taken over (e.g. after a long pause
+        between renewals) cannot overwrite its successor's cursor; it steps down instead.
+        """
+        with self._lock:
+            term = self._leading.get(handle)
+        if term is None:
+            return
+        try:
+            written = self.store.set_cursor(handle, cursor, self.node_id, self._lease_name(handle), term)
+        except Exception as e:
+            logging.error(f"Could not publish the cluster cursor for @{handle}: {e}")
+            return
+        if written or not cursor:
+            return
+        with self._lock:
+            if self._leading.get(handle) == term:
+                del self._leading[handle]
+                CLUSTER_LEADERSHIP.inc(handle=handle, change="lost")
+        logging.warning(f"Lease term {term} for @{handle} is no longer current; cursor {cursor} was not published.")
+
+    def claim_notification(self, status_id):
+        """
+        Returns:
+            bool: True if no other node has sent or is sending this status's notification
+        """
+        try:
+            won = self.store.claim_notification(status_id, self.node_id, self.claim_seconds)
+        except Exception as e:
+            # Failing open risks a duplicate alert; failing closed would risk a missed one
+            logging.error(f"Cluster notification claim for status ID {status_id} failed: {e}. Sending anyway.")
+            return True
+        CLUSTER_NOTIFICATION_CLAIMS.inc(outcome="won" if won else "lost")
+        if not won:
+            logging.info(f"Status ID {status_id} was already notified by another node. Skipping alert.")
+        return won
+
+    def release_notification(self, status_id):
+        """Give up this node's claim after a failed or dropped delivery, so the alert can be sent again."""
+        try:
+            self.store.release_notification(status_id, self.node_id)
+        except Exception as e:
+            # The claim still expires after claim_seconds
+            logging.error(f"Could not release the notification claim for status ID {status_id}: {e}")
+
+    def confirm_notification(self, status_id):
+        """Record that this status's notification was delivered."""
+        try:
+            self.store.confirm_notification(status_id, self.node_id)
+        except Exception as e:
+            logging.error(f"Could not confirm the notification for status ID {status_id}: {e}")
+
+    def stats(self):
+        """
+        Returns:
+            dict: Live nodes and handles led by this node
+        """
+        with self._lock:
+            return {"live_nodes": len(self._live_nodes), "leading": len(self._leading)}
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                self._heartbeat()
+                self._rebalance()
+            except Exception as e:
+                logging.error(f"Cluster heartbeat failed: {e}", exc_info=True)
+
+    def _heartbeat(self):
+        self.store.heartbeat(self.node_id)
+        live_nodes = self.store.live_nodes(self.lease_seconds)
+        with self._lock:
+            live_nodes = sorted(set(live_nodes) | {self.node_id})
+            if live_nodes != self._live_nodes:
+                logging.info(f"Cluster membership changed: {live_nodes}")
+            self._live_nodes = live_nodes
+
+    def _rebalance(self):
+        """Renew held leases, hand off handles now owned by another live node and pick up our own."""
+        for handle in self.handles:
+            with self._lock:
+                leading = handle in self._leading
+                preferred = self.owner(handle) == self.node_id
+                if leading and not preferred:
+                    self._release(handle, "released")
+                elif leading or preferred:
+                    self.should_poll(handle)
+
+    def _release(self, handle, change):
+        try:
+            self.store.release_lease(self._lease_name(handle), self.node_id)
+        except Exception as e:
+            logging.error(f"Could not release the lease for @{handle}: {e}")
+        self._leading.pop(handle, None)
+        CLUSTER_LEADERSHIP.inc(handle=handle, change=change)
+        logging.info(f"Node {self.node_id} released the lease for @{handle}.")
+
+    @staticmethod
+    def _lease_name(handle):
+        return f"poll:{handle}"
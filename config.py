@@ -1,8 +1,26 @@
 import os
 import logging
+import socket
 import pytz
 from dotenv import load_dotenv
 
+def parse_handle_map(value, cast):
+    """
+    Parse a comma-separated list of handle:value overrides, e.g. "WhiteHouse:600,realDonaldTrump:60".
+    Invalid entries are logged and skipped.
+    """
+    overrides = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            handle, raw = part.rsplit(":", 1)
+            overrides[handle.strip().lstrip("@")] = cast(raw)
+        except ValueError:
+            logging.error(f"Ignoring invalid handle override '{part}'.")
+    return overrides
+
 class Config:
     def __init__(self):
         # Load environment variables
@@ -32,11 +50,36 @@ class Config:
         self.truthsocial_username = os.getenv("TRUTHSOCIAL_USERNAME")
         self.truthsocial_password = os.getenv("TRUTHSOCIAL_PASSWORD")
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
+
+        # Saved Truth Social session token (empty TRUTHSOCIAL_TOKEN_FILE disables saving)
+        self.truthsocial_token_file = os.getenv("TRUTHSOCIAL_TOKEN_FILE", "truthsocial_token.json")
+        try:
+            self.truthsocial_token_max_age_hours = float(os.getenv("TRUTHSOCIAL_TOKEN_MAX_AGE_HOURS", 168))
+        except ValueError:
+            logging.error("Invalid numeric value for TRUTHSOCIAL_TOKEN_MAX_AGE_HOURS. Using default.")
+            self.truthsocial_token_max_age_hours = 168.0
+        # Preconnect to Truth Social, OpenAI and ntfy in the background while the first poll starts
+        self.startup_warmup = os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
         
         # Application settings
         self.target_handle = os.getenv("TARGET_HANDLE")
+        self.target_handles = [
+            handle.strip().lstrip("@")
+            for handle in os.getenv("TARGET_HANDLES", self.target_handle or "").split(",")
+            if handle.strip()
+        ]
+        if self.target_handles and not self.target_handle:
+            self.target_handle = self.target_handles[0]
         self.ntfy_topic = os.getenv("NTFY_TOPIC")
+        # Comma-separated list; every alert goes to each topic
+        self.ntfy_topics = [topic.strip() for topic in (self.ntfy_topic or "").split(",") if topic.strip()]
+        self.ntfy_server = os.getenv("NTFY_SERVER", "https://ntfy.sh")
         self.storage_file = os.getenv("STORAGE_FILE")
+        self.state_backend = os.getenv("STATE_BACKEND", "sqlite").lower()
+        if self.state_backend not in ("sqlite", "file"):
+            logging.error(f"Invalid STATE_BACKEND '{self.state_backend}'. Using 'sqlite'.")
+            self.state_backend = "sqlite"
+        self.state_file = os.getenv("STATE_FILE", "state.db" if self.state_backend == "sqlite" else "state.json")
         self.timezone = os.getenv("TIMEZONE")
         
         # Polling configuration
@@ -54,6 +97,193 @@ class Config:
             self.poll_start_hour = 7
             self.poll_end_hour = 23
             self.poll_interval_seconds = 300
+
+        # Analysis configuration
+        try:
+            self.analysis_workers = max(int(os.getenv("ANALYSIS_WORKERS", 4)), 1)
+            self.analysis_batch_size = max(int(os.getenv("ANALYSIS_BATCH_SIZE", 8)), 1)
+            self.analysis_batch_token_budget = int(os.getenv("ANALYSIS_BATCH_TOKEN_BUDGET", 2000))
+        except ValueError:
+            logging.error("Invalid non-integer value for ANALYSIS_WORKERS, ANALYSIS_BATCH_SIZE, or ANALYSIS_BATCH_TOKEN_BUDGET. Using defaults.")
+            self.analysis_workers = 4
+            self.analysis_batch_size = 8
+            self.analysis_batch_token_budget = 2000
+
+        # Scheduling policy configuration
+        self.scheduler_policy = os.getenv("SCHEDULER_POLICY", "fixed").lower()
+        if self.scheduler_policy not in ("fixed", "adaptive"):
+            logging.error(f"Invalid SCHEDULER_POLICY '{self.scheduler_policy}'. Using 'fixed'.")
+            self.scheduler_policy = "fixed"
+        self.market_windows = os.getenv("MARKET_WINDOWS", "08:00-10:00,15:45-16:15")
+        try:
+            self.poll_min_interval_seconds = int(os.getenv("POLL_MIN_INTERVAL_SECONDS", 30))
+            self.poll_max_interval_seconds = int(os.getenv("POLL_MAX_INTERVAL_SECONDS", 900))
+            self.burst_interval_seconds = int(os.getenv("BURST_INTERVAL_SECONDS", 30))
+            self.burst_duration_seconds = int(os.getenv("BURST_DURATION_SECONDS", 900))
+            self.market_interval_seconds = int(os.getenv("MARKET_INTERVAL_SECONDS", 60))
+            self.poll_backoff_factor = float(os.getenv("POLL_BACKOFF_FACTOR", 1.5))
+            self.poll_jitter_ratio = float(os.getenv("POLL_JITTER_RATIO", 0.1))
+        except ValueError:
+            logging.error("Invalid numeric value in adaptive scheduling configuration. Using defaults.")
+            self.poll_min_interval_seconds = 30
+            self.poll_max_interval_seconds = 900
+            self.burst_interval_seconds = 30
+            self.burst_duration_seconds = 900
+            self.market_interval_seconds = 60
+            self.poll_backoff_factor = 1.5
+            self.poll_jitter_ratio = 0.1
+
+        # Ingestion configuration
+        self.ingestion_mode = os.getenv("INGESTION_MODE", "poll").lower()
+        if self.ingestion_mode not in ("poll", "stream"):
+            logging.error(f"Invalid INGESTION_MODE '{self.ingestion_mode}'. Using 'poll'.")
+            self.ingestion_mode = "poll"
+        self.stream_url = os.getenv("STREAM_URL", "https://truthsocial.com/api/v1/streaming/user")
+        try:
+            self.stream_max_backoff_seconds = int(os.getenv("STREAM_MAX_BACKOFF_SECONDS", 300))
+        except ValueError:
+            logging.error("Invalid non-integer value for STREAM_MAX_BACKOFF_SECONDS. Using default.")
+            self.stream_max_backoff_seconds = 300
+
+        # Runtime: the threaded sync loop or the asyncio pipeline
+        self.runtime = os.getenv("RUNTIME", "sync").lower()
+        if self.runtime not in ("sync", "async"):
+            logging.error(f"Invalid RUNTIME '{self.runtime}'. Using 'sync'.")
+            self.runtime = "sync"
+        if self.runtime == "async" and self.ingestion_mode == "stream":
+            logging.error("INGESTION_MODE=stream is not supported with RUNTIME=async. Using 'poll'.")
+            self.ingestion_mode = "poll"
+        try:
+            self.async_queue_size = int(os.getenv("ASYNC_QUEUE_SIZE", 100))
+        except ValueError:
+            logging.error("Invalid non-integer value for ASYNC_QUEUE_SIZE. Using default.")
+            self.async_queue_size = 100
+
+        # Per-handle overrides for multi-account monitoring
+        self.handle_poll_intervals = parse_handle_map(os.getenv("HANDLE_POLL_INTERVALS"), int)
+        self.handle_priorities = parse_handle_map(os.getenv("HANDLE_PRIORITIES"), int)
+
+        # Notification delivery configuration
+        try:
+            self.ntfy_timeout_seconds = float(os.getenv("NTFY_TIMEOUT_SECONDS", 10))
+            self.ntfy_max_retries = int(os.getenv("NTFY_MAX_RETRIES", 3))
+        except ValueError:
+            logging.error("Invalid numeric value for NTFY_TIMEOUT_SECONDS or NTFY_MAX_RETRIES. Using defaults.")
+            self.ntfy_timeout_seconds = 10
+            self.ntfy_max_retries = 3
+
+        # Alert dispatcher: per-account coalescing window, pending alert cap and outbound ntfy rate limit (unset = unlimited)
+        try:
+            self.alert_coalesce_seconds = float(os.getenv("ALERT_COALESCE_SECONDS", 2))
+            ntfy_rpm = os.getenv("NTFY_REQUESTS_PER_MINUTE")
+            self.ntfy_requests_per_minute = float(ntfy_rpm) if ntfy_rpm else None
+            self.ntfy_burst = int(os.getenv("NTFY_BURST", 5))
+            self.alert_redelivery_seconds = float(os.getenv("ALERT_REDELIVERY_SECONDS", 60))
+            self.alert_max_pending = int(os.getenv("ALERT_MAX_PENDING", 100))
+        except ValueError:
+            logging.error("Invalid numeric value for ALERT_COALESCE_SECONDS, NTFY_REQUESTS_PER_MINUTE, NTFY_BURST, ALERT_REDELIVERY_SECONDS, or ALERT_MAX_PENDING. Using defaults.")
+            self.alert_coalesce_seconds = 2
+            self.ntfy_requests_per_minute = None
+            self.ntfy_burst = 5
+            self.alert_redelivery_seconds = 60
+            self.alert_max_pending = 100
+
+        # Pre-filter configuration
+        self.prefilter_mode = os.getenv("PREFILTER_MODE", "shadow").lower()
+        if self.prefilter_mode not in ("off", "shadow", "enforce"):
+            logging.error(f"Invalid PREFILTER_MODE '{self.prefilter_mode}'. Using 'shadow'.")
+            self.prefilter_mode = "shadow"
+        try:
+            self.prefilter_min_score = float(os.getenv("PREFILTER_MIN_SCORE", 1.0))
+            self.prefilter_min_words = int(os.getenv("PREFILTER_MIN_WORDS", 3))
+        except ValueError:
+            logging.error("Invalid numeric value for PREFILTER_MIN_SCORE or PREFILTER_MIN_WORDS. Using defaults.")
+            self.prefilter_min_score = 1.0
+            self.prefilter_min_words = 3
+
+        # Enrichment: quoted statuses and link cards fetched for new posts (ENRICHMENT_WORKERS=0 disables fetching)
+        try:
+            self.enrichment_workers = int(os.getenv("ENRICHMENT_WORKERS", 4))
+            self.enrichment_time_budget_seconds = float(os.getenv("ENRICHMENT_TIME_BUDGET_SECONDS", 2))
+            self.enrichment_cache_size = int(os.getenv("ENRICHMENT_CACHE_SIZE", 1024))
+        except ValueError:
+            logging.error("Invalid numeric value for ENRICHMENT_WORKERS, ENRICHMENT_TIME_BUDGET_SECONDS, or ENRICHMENT_CACHE_SIZE. Using defaults.")
+            self.enrichment_workers = 4
+            self.enrichment_time_budget_seconds = 2
+            self.enrichment_cache_size = 1024
+
+        # Near-duplicate filter (exact fingerprint or SimHash within NEAR_DUPLICATE_MAX_DISTANCE bits)
+        self.near_duplicate_mode = os.getenv("NEAR_DUPLICATE_MODE", "shadow").lower()
+        if self.near_duplicate_mode not in ("off", "shadow", "enforce"):
+            logging.error(f"Invalid NEAR_DUPLICATE_MODE '{self.near_duplicate_mode}'. Using 'shadow'.")
+            self.near_duplicate_mode = "shadow"
+        try:
+            self.near_duplicate_max_distance = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", 3))
+        except ValueError:
+            logging.error("Invalid numeric value for NEAR_DUPLICATE_MAX_DISTANCE. Using default.")
+            self.near_duplicate_max_distance = 3
+
+        # OpenAI model and response format ("json_schema" strict structured outputs, or "json_object")
+        self.openai_model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.openai_output_mode = os.getenv("OPENAI_OUTPUT_MODE", "json_schema").lower()
+        if self.openai_output_mode not in ("json_schema", "json_object"):
+            logging.error(f"Invalid OPENAI_OUTPUT_MODE '{self.openai_output_mode}'. Using 'json_schema'.")
+            self.openai_output_mode = "json_schema"
+
+        # Optional two-tier cascade: OPENAI_MODEL is tier 1, CASCADE_TIER2_MODEL (unset = off) is tier 2
+        self.cascade_tier2_model = os.getenv("CASCADE_TIER2_MODEL")
+        self.cascade_escalate_significant = os.getenv("CASCADE_ESCALATE_SIGNIFICANT", "true").lower() in ("1", "true", "yes")
+        self.cascade_log_file = os.getenv("CASCADE_LOG_FILE")
+        try:
+            self.cascade_confidence_threshold = float(os.getenv("CASCADE_CONFIDENCE_THRESHOLD", 0.8))
+        except ValueError:
+            logging.error("Invalid numeric value for CASCADE_CONFIDENCE_THRESHOLD. Using default.")
+            self.cascade_confidence_threshold = 0.8
+
+        # Optional client-side OpenAI request rate limit (requests per minute, unset = unlimited)
+        try:
+            openai_rpm = os.getenv("OPENAI_REQUESTS_PER_MINUTE")
+            self.openai_requests_per_minute = float(openai_rpm) if openai_rpm else None
+        except ValueError:
+            logging.error("Invalid numeric value for OPENAI_REQUESTS_PER_MINUTE. Disabling the limit.")
+            self.openai_requests_per_minute = None
+
+        # Analysis cache configuration
+        self.analysis_cache_file = os.getenv("ANALYSIS_CACHE_FILE")
+        try:
+            self.analysis_cache_size = int(os.getenv("ANALYSIS_CACHE_SIZE", 1024))
+            cache_ttl = os.getenv("ANALYSIS_CACHE_TTL_SECONDS")
+            self.analysis_cache_ttl_seconds = int(cache_ttl) if cache_ttl else None
+        except ValueError:
+            logging.error("Invalid non-integer value for ANALYSIS_CACHE_SIZE or ANALYSIS_CACHE_TTL_SECONDS. Using defaults.")
+            self.analysis_cache_size = 1024
+            self.analysis_cache_ttl_seconds = None
+
+        # Metrics and profiling (all disabled when unset)
+        self.metrics_host = os.getenv("METRICS_HOST", "127.0.0.1")
+        self.profile_dir = os.getenv("PROFILE_DIR")
+        try:
+            metrics_port = os.getenv("METRICS_PORT")
+            self.metrics_port = int(metrics_port) if metrics_port else None
+            self.metrics_log_interval_seconds = int(os.getenv("METRICS_LOG_INTERVAL_SECONDS", 0))
+            self.profile_min_cycle_seconds = float(os.getenv("PROFILE_MIN_CYCLE_SECONDS", 0))
+        except ValueError:
+            logging.error("Invalid numeric value for METRICS_PORT, METRICS_LOG_INTERVAL_SECONDS, or PROFILE_MIN_CYCLE_SECONDS. Using defaults.")
+            self.metrics_port = None
+            self.metrics_log_interval_seconds = 0
+            self.profile_min_cycle_seconds = 0.0
+
+        # Cluster mode (disabled when CLUSTER_STORE is unset): nodes sharing the store split handles and alerts.
+        # A postgresql:// URL coordinates nodes across hosts; a SQLite path only nodes on one host
+        self.cluster_store = os.getenv("CLUSTER_STORE")
+        self.cluster_node_id = os.getenv("CLUSTER_NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+        try:
+            self.cluster_lease_seconds = float(os.getenv("CLUSTER_LEASE_SECONDS", 30))
+            self.cluster_claim_seconds = float(os.getenv("CLUSTER_CLAIM_SECONDS", 300))
+        except ValueError:
+            logging.error("Invalid numeric value for CLUSTER_LEASE_SECONDS or CLUSTER_CLAIM_SECONDS. Using defaults.")
+            self.cluster_lease_seconds = 30.0
+            self.cluster_claim_seconds = 300.0
             
     def validate(self):
         """Validate critical configuration settings"""
@@ -61,8 +291,8 @@ class Config:
             "TRUTHSOCIAL_USERNAME": self.truthsocial_username,
             "TRUTHSOCIAL_PASSWORD": self.truthsocial_password,
             "OPENAI_API_KEY": self.openai_api_key,
-            "TARGET_HANDLE": self.target_handle,
-            "NTFY_TOPIC": self.ntfy_topic,
+            "TARGET_HANDLE or TARGET_HANDLES": self.target_handles,
+            "NTFY_TOPIC": self.ntfy_topics,
             "TIMEZONE": self.timezone
         }
         
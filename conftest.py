@@ -0,0 +1 @@
+# Lets tests import the top-level modules and bench.fakes when run as `python -m pytest` or `pytest`
@@ -0,0 +1,439 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import REGISTRY
+
+# ntfy priorities, most urgent first
+PRIORITY_RANK = {"urgent": 0, "max": 0, "high": 1, "default": 2, "low": 3, "min": 4}
+
+Alert = namedtuple("Alert", ["status_ids", "account", "title", "message", "priority", "tags", "created_at"])
+
+ALERTS = REGISTRY.counter("stonk_alerts_total", "Alerts handed to the dispatcher by outcome (accepted, duplicate, dropped)", ("outcome",))
+ALERT_DIGESTS = REGISTRY.counter("stonk_alert_digests_total", "Alerts sent, by how many statuses they carried", ("kind",))
+ALERT_DISPATCH_SECONDS = REGISTRY.histogram("stonk_alert_dispatch_seconds", "Time from the first alert in a digest to its delivery", ("outcome",))
+
+def _rank(priority):
+    return PRIORITY_RANK.get(str(priority), PRIORITY_RANK["default"])
+
+def make_digest(account, alerts):
+    """
+    Merge alerts for one account into a single notification.
+
+    Returns:
+        Alert: The alert itself if there is only one, otherwise a digest carrying every status ID
+    """
+    if len(alerts) == 1:
+        return alerts[0]
+
+    alerts = sorted(alerts, key=lambda alert: (_rank(alert.priority), alert.created_at))
+    tags = []
+    for alert in alerts:
+        for tag in alert.tags or []:
+            if tag not in tags:
+                tags.append(tag)
+
+    return Alert(
+        status_ids=tuple(status_id for alert in alerts for status_id in alert.status_ids),
+        account=account,
+        title=f"🚨 {len(alerts)} market-impact posts from @{account}",
+        message="\n\n".join(f"[{position}] {alert.title}\n{alert.message}" for position, alert in enumerate(alerts, 1)),
+        priority=alerts[0].priority,
+        tags=tags,
+        created_at=min(alert.created_at for alert in alerts)
+    )
+
+class AlertBuffer:
+    """
+    Coalescing buffer shared by both dispatchers. Not thread-safe; callers hold a lock.
+
+    The first alert for an account opens a coalesce_seconds window; every alert for that
+    account arriving inside the window joins the same digest. Ready digests come out most
+    urgent first. When max_pending alerts are waiting, a new alert evicts a less urgent
+    one or is dropped. Evicted alerts are collected in evicted for the caller.
+    """
+    def __init__(self, coalesce_seconds=0.0, max_pending=100, seen_size=10000):
+        self.coalesce_seconds = coalesce_seconds
+        self.max_pending = max_pending
+        self.pending = 0
+        self.evicted = []
+        self._groups = {}
+        # Status IDs queued or delivered in this process, so the same post never alerts twice
+        self._seen = OrderedDict()
+        self._seen_size = seen_size
+
+    def is_queued(self, status_id):
+        """
+        Returns:
+            bool: True if the status's alert is waiting, being delivered or was delivered by this process
+        """
+        return status_id in self._seen
+
+    def forget(self, status_ids):
+        """Allow alerts for these statuses to be queued again, e.g. after a failed delivery."""
+        for status_id in status_ids:
+            self._seen.pop(status_id, None)
+
+    def add(self, alert, now):
+        """
+        Returns:
+            str: "accepted", "duplicate" or "dropped"
+        """
+        if any(status_id in self._seen for status_id in alert.status_ids if status_id):
+            return "duplicate"
+
+        if self.pending >= self.max_pending and not self._evict_below(_rank(alert.priority)):
+            return "dropped"
+
+        for status_id in alert.status_ids:
+            if status_id:
+                self._seen[status_id] = True
+        while len(self._seen) > self._seen_size:
+            self._seen.popitem(last=False)
+
+        group = self._groups.get(alert.account)
+        if group is None:
+            group = self._groups[alert.account] = {"deadline": now + self.coalesce_seconds, "alerts": []}
+        group["alerts"].append(alert)
+        self.pending += 1
+        return "accepted"
+
+    def pop_ready(self, now, flush_all=False):
+        """
+        Remove and return the digests whose window has closed (or all of them).
+
+        Returns:
+            list: Digest Alerts, most urgent first
+        """
+        ready = [account for account, group in self._groups.items() if flush_all or group["deadline"] <= now]
+        digests = []
+        for account in ready:
+            alerts = self._groups.pop(account)["alerts"]
+            self.pending -= len(alerts)
+            digests.append(make_digest(account, alerts))
+        return sorted(digests, key=lambda digest: (_rank(digest.priority), digest.created_at))
+
+    def next_deadline(self):
+        """
+        Returns:
+            float: The earliest window close time, or None if nothing is pending
+        """
+        return min((group["deadline"] for group in self._groups.values()), default=None)
+
+    def _evict_below(self, rank):
+        """Drop the newest, least urgent pending alert if it is less urgent than rank."""
+        victim = None
+        for account, group in self._groups.items():
+            for alert in group["alerts"]:
+                if _rank(alert.priority) > rank and (victim is None or (_rank(alert.priority), alert.created_at) > (_rank(victim[1].priority), victim[1].created_at)):
+                    victim = (account, alert)
+        if victim is None:
+            return False
+
+        account, alert = victim
+        logging.error(f"Alert queue full. Dropping lower-priority alert: {alert.title}")
+        ALERTS.inc(outcome="dropped")
+        self._groups[account]["alerts"].remove(alert)
+        if not self._groups[account]["alerts"]:
+            del self._groups[account]
+        self.pending -= 1
+        self.forget(alert.status_ids)
+        self.evicted.append(alert)
+        return True
+
+class AlertDispatcher:
+    """
+    Stage between StatusProcessor and the notification sinks.
+
+    enqueue() only buffers the alert, so the polling loop never waits on delivery. A
+    background worker coalesces alerts per account (see AlertBuffer), waits on the
+    shared token bucket before every outbound request, sends each digest to all sinks
+    concurrently and marks its statuses notified in the state store once any sink accepts
+    it. Statuses the state store already marks notified are skipped, so alerts are
+    deduplicated across restarts. In cluster mode every alert is also claimed in the
+    cluster store first, so only one node ever sends it.
+
+    The processor records every alert in the state store before queueing it, so an alert
+    that was lost (crash before sending, queue full, every sink failed) stays pending
+    there. resend_pending() queues those again; call it at startup. The worker also calls
+    it every redelivery_seconds, so failed deliveries are retried on that interval.
+    """
+    def __init__(self, sinks, state_store=None, coalesce_seconds=0.0, rate_limiter=None, max_pending=100, cluster=None, redelivery_seconds=60.0):
+        if not sinks:
+            raise ValueError("At least one notification sink is required.")
+        self.sinks = list(sinks)
+        self.state_store = state_store
+        self.rate_limiter = rate_limiter
+        self.cluster = cluster
+        self.redelivery_seconds = redelivery_seconds
+        self._buffer = AlertBuffer(coalesce_seconds, max_pending)
+        self._cond = threading.Condition()
+        self._closing = False
+        self._worker = None
+        self._fanout = ThreadPoolExecutor(max_workers=len(self.sinks), thread_name_prefix="dispatch")
+
+        self.accepted = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.digests = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.resent = 0
+
+    def enqueue(self, title, message, priority="default", tags=None, status_id=None, account=None):
+        """
+        Buffer an alert for delivery and return immediately.
+
+        Args:
+            title (str): The notification title
+            message (str): The notification message
+            priority (str, optional): ntfy priority; more urgent alerts are sent first. Defaults to "default".
+            tags (list, optional): List of tag strings. Defaults to None.
+            status_id (str, optional): Used for deduplication and the notified flag
+            account (str, optional): Alerts for the same account are coalesced
+
+        Returns:
+            bool: True if the alert was accepted, False if it was a duplicate or dropped
+        """
+        if status_id and self._already_notified(status_id):
+            logging.info(f"Status ID {status_id} was already notified. Skipping alert.")
+            outcome = "duplicate"
+        elif status_id and self.cluster is not None and not self.cluster.claim_notification(status_id):
+            outcome = "duplicate"
+        else:
+            alert = Alert((status_id,), account or "", title, message, priority, list(tags or []), time.monotonic())
+            with self._cond:
+                outcome = self._buffer.add(alert, alert.created_at)
+                evicted, self._buffer.evicted = self._buffer.evicted, []
+                self._cond.notify()
+            self._ensure_worker()
+            for victim in evicted:
+                self._release_claims(victim.status_ids)
+            if outcome == "dropped":
+                self._release_claims(alert.status_ids)
+
+        ALERTS.inc(outcome=outcome)
+        if outcome == "accepted":
+            self.accepted += 1
+        elif outcome == "duplicate":
+            self.duplicates += 1
+        else:
+            self.dropped += 1
+            logging.error(f"Alert queue full. Dropping alert: {title}")
+        return outcome == "accepted"
+
+    def resend_pending(self):
+        """
+        Queue again every alert the state store holds as recorded but not delivered, except
+        those already queued or being delivered by this process.
+
+        Returns:
+            int: The number of alerts queued
+        """
+        if self.state_store is None:
+            return 0
+        try:
+            pending = self.state_store.pending_alerts()
+        except Exception as e:
+            logging.error(f"Could not read undelivered alerts: {e}", exc_info=True)
+            return 0
+
+        resent = 0
+        for record in pending:
+            with self._cond:
+                if self._buffer.is_queued(record["status_id"]):
+                    continue
+            alert = record["alert"]
+            logging.info(f"Alert for status ID {record['status_id']} was never delivered. Queueing it again.")
+            if self.enqueue(alert["title"], alert["message"], alert.get("priority", "default"), alert.get("tags"), record["status_id"], alert.get("account")):
+                resent += 1
+        self.resent += resent
+        return resent
+
+    def close(self, timeout=30):
+        """Deliver everything still buffered, stop the worker and close the sinks."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+            worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+            if worker.is_alive():
+                logging.warning(f"Alert dispatcher did not drain within {timeout} seconds.")
+        self._fanout.shutdown(wait=True)
+        for sink in self.sinks:
+            sink.close()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Dispatcher counters
+        """
+        with self._cond:
+            pending = self._buffer.pending
+        return {
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped,
+            "digests": self.digests,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "resent": self.resent,
+            "pending": pending,
+        }
+
+    def _already_notified(self, status_id):
+        if self.state_store is None:
+            return False
+        record = self.state_store.get_status(status_id)
+        return bool(record and record["notified"])
+
+    def _ensure_worker(self):
+        with self._cond:
+            if self._worker is None and not self._closing:
+                self._worker = threading.Thread(target=self._run, name="dispatcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        next_redelivery = time.monotonic() + self.redelivery_seconds
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    digests = self._buffer.pop_ready(now, flush_all=self._closing)
+                    if digests or self._closing or now >= next_redelivery:
+                        break
+                    deadline = self._buffer.next_deadline()
+                    deadline = next_redelivery if deadline is None else min(deadline, next_redelivery)
+                    self._cond.wait(max(deadline - now, 0))
+                closing = self._closing
+
+            for digest in digests:
+                self._deliver(digest)
+            if closing and not digests:
+                return
+            if not closing and time.monotonic() >= next_redelivery:
+                # Failed or dropped alerts are still pending in the state store
+                self.resend_pending()
+                next_redelivery = time.monotonic() + self.redelivery_seconds
+
+    def _deliver(self, digest):
+        results = list(self._fanout.map(lambda sink: self._send(sink, digest), self.sinks))
+        self._record_delivery(digest, any(results))
+
+    def _send(self, sink, digest):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        try:
+            return sink.send_notification(digest.title, digest.message, priority=digest.priority, tags=digest.tags)
+        except Exception as e:
+            logging.error(f"Notification sink failed: {e}", exc_info=True)
+            return False
+
+    def _record_delivery(self, digest, success):
+        ALERT_DISPATCH_SECONDS.observe(time.monotonic() - digest.created_at, outcome="sent" if success else "failed")
+        ALERT_DIGESTS.inc(kind="digest" if len(digest.status_ids) > 1 else "single")
+        self.digests += 1
+        if len(digest.status_ids) > 1:
+            self.coalesced += len(digest.status_ids)
+            logging.info(f"Sent a digest of {len(digest.status_ids)} alerts for @{digest.account}.")
+
+        if not success:
+            self.failed += 1
+            logging.error(
+                f"Every sink failed to deliver the alert for status IDs {list(digest.status_ids)}. "
+                f"Retrying in {self.redelivery_seconds:.0f} seconds."
+            )
+            with self._cond:
+                self._buffer.forget(digest.status_ids)
+            self._release_claims(digest.status_ids)
+            return
+        if self.state_store is not None:
+            try:
+                with self.state_store.transaction():
+                    for status_id in digest.status_ids:
+                        if status_id:
+                            self.state_store.mark_notified(status_id)
+            except Exception as e:
+                logging.error(f"Could not mark status IDs {list(digest.status_ids)} notified: {e}", exc_info=True)
+        if self.cluster is not None:
+            for status_id in digest.status_ids:
+                if status_id:
+                    self.cluster.confirm_notification(status_id)
+
+    def _release_claims(self, status_ids):
+        if self.cluster is None:
+            return
+        for status_id in status_ids:
+            if status_id:
+                self.cluster.release_notification(status_id)
+
+class AsyncAlertDispatcher(AlertDispatcher):
+    """
+    AlertDispatcher for the asyncio runtime. enqueue() is unchanged; delivery runs in the
+    run() coroutine, which fans out to AsyncNotifier sinks with asyncio.gather. stop()
+    makes run() deliver everything buffered and return.
+    """
+    def __init__(self, sinks, state_store=None, coalesce_seconds=0.0, rate_limiter=None, max_pending=100, cluster=None, redelivery_seconds=60.0):
+        super().__init__(sinks, state_store, coalesce_seconds, rate_limiter, max_pending, cluster, redelivery_seconds)
+        self._fanout.shutdown(wait=False)
+        self._fanout = None
+        self._wakeup = asyncio.Event()
+
+    async def run(self):
+        """Deliver alerts as their coalescing windows close, until stop() is called and the buffer is empty."""
+        next_redelivery = time.monotonic() + self.redelivery_seconds
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                digests = self._buffer.pop_ready(now, flush_all=self._closing)
+                closing = self._closing
+                deadline = self._buffer.next_deadline()
+                deadline = next_redelivery if deadline is None else min(deadline, next_redelivery)
+                self._wakeup.clear()
+
+            for digest in digests:
+                await self._deliver(digest)
+            if digests:
+                continue
+            if closing:
+                return
+            if now >= next_redelivery:
+                self.resend_pending()
+                next_redelivery = time.monotonic() + self.redelivery_seconds
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(deadline - now, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        """Flush and finish run()."""
+        with self._cond:
+            self._closing = True
+        self._wakeup.set()
+
+    async def close(self):
+        """Close the sinks. Call after run() has returned."""
+        for sink in self.sinks:
+            await sink.close()
+
+    def _ensure_worker(self):
+        self._wakeup.set()
+
+    async def _deliver(self, digest):
+        results = await asyncio.gather(*(self._send(sink, digest) for sink in self.sinks))
+        self._record_delivery(digest, any(results))
+
+    async def _send(self, sink, digest):
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async()
+        try:
+            return await sink.send_notification(digest.title, digest.message, priority=digest.priority, tags=digest.tags)
+        except Exception as e:
+            logging.error(f"Notification sink failed: {e}", exc_info=True)
+            return False
@@ -0,0 +1,192 @@
+import html
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from metrics import REGISTRY
+
+ENRICHMENT_FETCHES = REGISTRY.counter("stonk_enrichment_fetches_total", "Quoted/refreshed status lookups by outcome (cached, fetched, failed, timeout)", ("outcome",))
+ENRICHMENT_FETCH_SECONDS = REGISTRY.histogram("stonk_enrichment_fetch_seconds", "Time to fetch one quoted or refreshed status")
+ENRICHMENT_WAIT_SECONDS = REGISTRY.histogram("stonk_enrichment_wait_seconds", "Time a batch waited for its enrichment fetches")
+
+# A link other than a mention or hashtag, i.e. something that should get a preview card
+_LINK_RE = re.compile(r"<a\s(?![^>]*class=\"[^\"]*(?:mention|hashtag))[^>]*href=", re.IGNORECASE)
+
+def status_html(status, _depth=0):
+    """
+    Build the HTML to analyze for a status: its own content plus the reposted or quoted
+    status, the link preview card and media descriptions from the payload. Nothing is
+    fetched here; StatusEnricher fills in pieces the payload is missing beforehand.
+
+    Args:
+        status (dict): The status data
+
+    Returns:
+        str: HTML for normalize_html, or an empty string if there is no text anywhere
+    """
+    parts = [status.get("content") or ""]
+
+    # Only one level deep: a quote of a quote adds cost, not context
+    if _depth == 0:
+        for key, label in (("reblog", "Reposted"), ("quote", "Quoting")):
+            inner = status.get(key)
+            if isinstance(inner, dict):
+                inner_html = status_html(inner, _depth + 1)
+                if inner_html:
+                    username = (inner.get("account") or {}).get("username", "unknown")
+                    parts.append(f"<p>{label} @{html.escape(username)}:</p>{inner_html}")
+
+    card = status.get("card")
+    if isinstance(card, dict):
+        card_text = " - ".join(piece.strip() for piece in (card.get("title"), card.get("description")) if piece and piece.strip())
+        if card_text:
+            parts.append(f"<p>Link: {html.escape(card_text)}</p>")
+
+    descriptions = [
+        f"[{media.get('type') or 'media'}] {media['description'].strip()}"
+        for media in status.get("media_attachments") or []
+        if isinstance(media, dict) and (media.get("description") or "").strip()
+    ]
+    if descriptions:
+        parts.append(f"<p>Media: {html.escape('; '.join(descriptions))}</p>")
+
+    return "".join(part for part in parts if part)
+
+class StatusEnricher:
+    """
+    Fetches the pieces of a status payload that are referenced but missing: a quoted
+    status that only comes with quote_id, and the preview card of a fresh post with a
+    link (cards are generated after posting, so the status is re-fetched).
+
+    Fetches for a batch run concurrently on a bounded pool, and the batch waits at most
+    time_budget_seconds for them; late fetches finish in the background and land in the
+    cache for the next poll. A fetched status with a link but still no card is not cached,
+    so the card is looked up again next time. Text-only posts reference nothing, so they cost no fetch or
+    wait at all.
+    """
+    def __init__(self, fetch_status, max_workers=4, time_budget_seconds=2.0, cache_size=1024):
+        """
+        Args:
+            fetch_status (callable): Status ID -> status dict, or None if it cannot be fetched
+            max_workers (int): Concurrent fetches
+            time_budget_seconds (float): Longest a batch waits for its fetches
+            cache_size (int): Fetched statuses kept in the LRU cache
+        """
+        self.fetch_status = fetch_status
+        self.time_budget_seconds = time_budget_seconds
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="enrich")
+
+    def enrich(self, statuses):
+        """
+        Fill in missing quoted statuses and cards in place.
+
+        Args:
+            statuses (list): Status dicts to enrich
+        """
+        needed = {}
+        for status in statuses:
+            for target in (status, status.get("reblog")):
+                if isinstance(target, dict):
+                    for status_id, apply in self._missing(target):
+                        needed.setdefault(status_id, []).append(apply)
+        if not needed:
+            return
+
+        started = time.perf_counter()
+        futures = {status_id: self._lookup(status_id) for status_id in needed}
+        pending = [future for future in futures.values() if not future.done()]
+        if pending:
+            _, not_done = wait(pending, timeout=self.time_budget_seconds)
+            if not_done:
+                ENRICHMENT_FETCHES.inc(len(not_done), outcome="timeout")
+                logging.warning(f"Enrichment time budget ({self.time_budget_seconds}s) ran out with {len(not_done)} fetches pending.")
+        ENRICHMENT_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+        for status_id, future in futures.items():
+            if not future.done() or future.exception() is not None:
+                continue
+            fetched = future.result()
+            if fetched is not None:
+                for apply in needed[status_id]:
+                    apply(fetched)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Cache size and fetches in flight
+        """
+        with self._lock:
+            return {"cached": len(self._cache), "in_flight": len(self._in_flight)}
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _missing(self, status):
+        """
+        Returns:
+            list: (status ID to fetch, callback taking the fetched status) per missing piece
+        """
+        missing = []
+        quote_id = status.get("quote_id")
+        if quote_id and not isinstance(status.get("quote"), dict):
+            missing.append((str(quote_id), lambda fetched: status.__setitem__("quote", fetched)))
+        if status.get("id") and _awaiting_card(status):
+            missing.append((str(status["id"]), lambda fetched: status.__setitem__("card", fetched.get("card"))))
+        return missing
+
+    def _lookup(self, status_id):
+        """
+        Returns:
+            Future: Resolves to the cached or fetched status; shared with any fetch already in flight
+        """
+        with self._lock:
+            if status_id in self._cache:
+                self._cache.move_to_end(status_id)
+                ENRICHMENT_FETCHES.inc(outcome="cached")
+                future = _done_future(self._cache[status_id])
+            elif status_id in self._in_flight:
+                future = self._in_flight[status_id]
+            else:
+                future = self._in_flight[status_id] = self.executor.submit(self._fetch, status_id)
+        return future
+
+    def _fetch(self, status_id):
+        started = time.perf_counter()
+        try:
+            fetched = self.fetch_status(status_id)
+        except Exception as e:
+            logging.error(f"Failed to fetch status {status_id} for enrichment: {e}")
+            fetched = None
+        ENRICHMENT_FETCH_SECONDS.observe(time.perf_counter() - started)
+
+        with self._lock:
+            self._in_flight.pop(status_id, None)
+            if isinstance(fetched, dict):
+                ENRICHMENT_FETCHES.inc(outcome="fetched")
+                if _awaiting_card(fetched):
+                    # The card may not have been generated yet, so a later lookup fetches it again
+                    return fetched
+                self._cache[status_id] = fetched
+                self._cache.move_to_end(status_id)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            else:
+                ENRICHMENT_FETCHES.inc(outcome="failed")
+                fetched = None
+        return fetched
+
+def _awaiting_card(status):
+    """True for a status with a link but no preview card (yet)."""
+    return status.get("card") is None and bool(_LINK_RE.search(status.get("content") or ""))
+
+def _done_future(value):
+    future = Future()
+    future.set_result(value)
+    return future
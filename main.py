@@ -1,16 +1,37 @@
+import argparse
+import asyncio
 import logging
+import queue
+import threading
 import time
 
+from analysis_cache import AnalysisCache
 from config import Config
-from clients.storage import read_file, write_file
+from clients.state_store import create_state_store
+from clients.storage import handle_storage_path, read_file
+from clients.token_store import TokenStore
 from clients.truth_social import TruthSocialClient
-from sentiment_analyzer import SentimentAnalyzer
-from clients.notifier import Notifier
-from scheduler import Scheduler
+from sentiment_analyzer import AsyncSentimentAnalyzer, SentimentAnalyzer
+from clients.notifier import AsyncNotifier, Notifier
+from dispatcher import AlertDispatcher, AsyncAlertDispatcher
+from enricher import StatusEnricher
+from metrics import REGISTRY, CycleProfiler, MetricsServer, SummaryLogger
+from normalizer import NearDuplicateFilter
+from prefilter import PreFilter
+from rate_limiter import TokenBucket
+from scheduler import MultiHandleScheduler, Scheduler, parse_market_windows
 from processor import StatusProcessor
+from warmup import warm_up, warm_up_async
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Watch Truth Social accounts and alert on market-moving posts.")
+    parser.add_argument("--check", action="store_true", help="Connect to Truth Social, OpenAI and ntfy in parallel, report and exit")
+    return parser.parse_args()
 
 def main():
     """Main application entry point."""
+    args = parse_args()
+
     # Initialize configuration
     try:
         config = Config()
@@ -23,52 +44,400 @@ def main():
     truth_social_client = TruthSocialClient(
         username=config.truthsocial_username,
         password=config.truthsocial_password,
-        target_handle=config.target_handle
+        target_handle=config.target_handle,
+        token_store=TokenStore(
+            config.truthsocial_token_file,
+            max_age_seconds=config.truthsocial_token_max_age_hours * 3600
+        ) if config.truthsocial_token_file else None
     )
     
     truth_social_client.initialize()
+
+    if args.check:
+        raise SystemExit(run_check(config, truth_social_client))
     
-    sentiment_analyzer = SentimentAnalyzer(config.openai_api_key)
-    notifier = Notifier(config.ntfy_topic)
-    scheduler = Scheduler(
-        poll_start_hour=config.poll_start_hour,
-        poll_end_hour=config.poll_end_hour,
-        poll_interval_seconds=config.poll_interval_seconds,
-        timezone=config.timezone
+    analysis_cache = AnalysisCache(
+        max_size=config.analysis_cache_size,
+        ttl_seconds=config.analysis_cache_ttl_seconds,
+        db_path=config.analysis_cache_file
+    )
+    analyzer_class = AsyncSentimentAnalyzer if config.runtime == "async" else SentimentAnalyzer
+    sentiment_analyzer = analyzer_class(
+        config.openai_api_key,
+        cache=analysis_cache,
+        model=config.openai_model,
+        output_mode=config.openai_output_mode,
+        max_batch_size=config.analysis_batch_size,
+        batch_token_budget=config.analysis_batch_token_budget,
+        rate_limiter=TokenBucket(config.openai_requests_per_minute / 60) if config.openai_requests_per_minute else None
+    )
+    openai_analyzer = sentiment_analyzer
+    if config.cascade_tier2_model:
+        from cascade import AsyncCascadeAnalyzer, CascadeAnalyzer
+        cascade_class = AsyncCascadeAnalyzer if config.runtime == "async" else CascadeAnalyzer
+        sentiment_analyzer = cascade_class(
+            sentiment_analyzer,
+            tier1_model=config.openai_model,
+            tier2_model=config.cascade_tier2_model,
+            confidence_threshold=config.cascade_confidence_threshold,
+            escalate_significant=config.cascade_escalate_significant,
+            decision_log_path=config.cascade_log_file
+        )
+    prefilter = PreFilter(
+        mode=config.prefilter_mode,
+        min_score=config.prefilter_min_score,
+        min_words=config.prefilter_min_words
+    )
+    near_duplicates = NearDuplicateFilter(
+        mode=config.near_duplicate_mode,
+        max_distance=config.near_duplicate_max_distance
+    )
+    enricher = None
+    if config.enrichment_workers > 0:
+        enricher = StatusEnricher(
+            truth_social_client.get_status,
+            max_workers=config.enrichment_workers,
+            time_budget_seconds=config.enrichment_time_budget_seconds,
+            cache_size=config.enrichment_cache_size
+        )
+    sink_class = AsyncNotifier if config.runtime == "async" else Notifier
+    sinks = [
+        sink_class(
+            topic,
+            server_url=config.ntfy_server,
+            timeout_seconds=config.ntfy_timeout_seconds,
+            max_retries=config.ntfy_max_retries
+        )
+        for topic in config.ntfy_topics
+    ]
+    scheduler = MultiHandleScheduler(
+        config.target_handles,
+        lambda handle: build_scheduler(config, handle),
+        priorities=config.handle_priorities
     )
     
-    # Load last processed ID
-    last_processed_id = read_file(config.storage_file)
+    state_store = create_state_store(config.state_file, config.state_backend)
+    import_legacy_cursors(state_store, config)
+
+    cluster = None
+    if config.cluster_store:
+        from cluster import ClusterCoordinator
+        from clients.cluster_store import create_cluster_store
+        cluster = ClusterCoordinator(
+            create_cluster_store(config.cluster_store),
+            config.cluster_node_id,
+            config.target_handles,
+            lease_seconds=config.cluster_lease_seconds,
+            claim_seconds=config.cluster_claim_seconds
+        ).start()
+
+    dispatcher_class = AsyncAlertDispatcher if config.runtime == "async" else AlertDispatcher
+    notifier = dispatcher_class(
+        sinks,
+        state_store=state_store,
+        coalesce_seconds=config.alert_coalesce_seconds,
+        rate_limiter=TokenBucket(config.ntfy_requests_per_minute / 60, capacity=config.ntfy_burst) if config.ntfy_requests_per_minute else None,
+        max_pending=config.alert_max_pending,
+        cluster=cluster,
+        redelivery_seconds=config.alert_redelivery_seconds
+    )
+    # Alerts recorded before a crash or a failed delivery are still pending in the state store
+    resent = notifier.resend_pending()
+    if resent:
+        logging.info(f"Queued {resent} undelivered alerts from the previous run.")
     
     # Create status processor with all dependencies
-    processor = StatusProcessor(truth_social_client, sentiment_analyzer, notifier, config.storage_file)
+    if config.runtime == "async":
+        from async_processor import AsyncStatusProcessor
+        processor = AsyncStatusProcessor(
+            truth_social_client,
+            sentiment_analyzer,
+            notifier,
+            state_store,
+            max_workers=config.analysis_workers,
+            prefilter=prefilter,
+            queue_size=config.async_queue_size,
+            near_duplicates=near_duplicates,
+            enricher=enricher,
+            cluster=cluster
+        )
+    else:
+        processor = StatusProcessor(
+            truth_social_client,
+            sentiment_analyzer,
+            notifier,
+            state_store,
+            max_workers=config.analysis_workers,
+            prefilter=prefilter,
+            near_duplicates=near_duplicates,
+            enricher=enricher,
+            cluster=cluster
+        )
+
+    metrics_server, summary_logger = start_metrics(config, analysis_cache, prefilter, near_duplicates, enricher, cluster, notifier, scheduler)
+    profiler = CycleProfiler(config.profile_dir, config.profile_min_cycle_seconds)
+
+    # Load last processed ID for each handle
+    last_processed_ids = {
+        handle: state_store.get_cursor(handle)
+        for handle in config.target_handles
+    }
 
     # Log startup information
-    logging.info(f"Starting polling loop for @{config.target_handle}.")
+    logging.info(f"Starting {config.ingestion_mode} loop ({config.runtime} runtime) for {', '.join('@' + handle for handle in config.target_handles)}.")
     logging.info(f"Polling window: {config.poll_start_hour}:00 - {config.poll_end_hour}:00 {config.timezone}.")
-    logging.info(f"Polling interval: {config.poll_interval_seconds} seconds.")
-    logging.info(f"Starting with last processed ID: {last_processed_id or 'None'}")
-    logging.info(f"Notifications will be sent to: {'ntfy.sh/' + config.ntfy_topic if config.ntfy_topic else 'DISABLED - NTFY_TOPIC not set'}")
-
-    try:
-        while True:
-            if scheduler.is_within_polling_hours():
-                newest_message_id = processor.process_statuses(last_processed_id)
+    logging.info(f"Polling interval: {config.poll_interval_seconds} seconds ({config.scheduler_policy} policy).")
+    if config.handle_poll_intervals or config.handle_priorities:
+        logging.info(f"Per-handle poll intervals: {config.handle_poll_intervals}, priorities: {config.handle_priorities}")
+    logging.info(f"Analysis workers: {config.analysis_workers}")
+    logging.info(f"Pre-filter mode: {config.prefilter_mode}")
+    logging.info(f"Near-duplicate filter mode: {config.near_duplicate_mode}")
+    if config.cascade_tier2_model:
+        logging.info(f"Model cascade: {config.openai_model} -> {config.cascade_tier2_model} below confidence {config.cascade_confidence_threshold}{' or when significant' if config.cascade_escalate_significant else ''}")
+    else:
+        logging.info(f"Model: {config.openai_model}")
+    if cluster is not None:
+        logging.info(f"Cluster mode: node {config.cluster_node_id}, lease {config.cluster_lease_seconds}s")
+    for handle, last_processed_id in last_processed_ids.items():
+        logging.info(f"Starting @{handle} with last processed ID: {last_processed_id or 'None'}")
+    logging.info(f"Notifications will be sent to: {config.ntfy_server + '/' + config.ntfy_topic if config.ntfy_topic else 'DISABLED - NTFY_TOPIC not set'}")
 
-                if newest_message_id != last_processed_id:
-                    logging.info(f"Updating last processed ID to: {newest_message_id}")
-                    last_processed_id = newest_message_id
+    checks = warmup_checks(truth_social_client, openai_analyzer, sinks) if config.startup_warmup else None
+    if checks and config.runtime != "async":
+        # Overlaps with the first poll instead of delaying it
+        threading.Thread(target=warm_up, args=(checks,), name="warmup", daemon=True).start()
 
-            scheduler.sleep_until_next_run()
+    stream = None
+    try:
+        if config.runtime == "async":
+            # SIGTERM and SIGINT are handled inside the runtime, which drains in-flight work before returning
+            asyncio.run(run_async(processor, scheduler, last_processed_ids, profiler, checks))
+        elif config.ingestion_mode == "stream":
+            from clients.truth_stream import TruthSocialStream
+            events = queue.Queue()
+            stream = TruthSocialStream(
+                truth_social_client,
+                config.target_handles,
+                on_status=lambda handle, status: events.put((handle, status)),
+                on_connect=lambda: events.put(CATCH_UP),
+                stream_url=config.stream_url,
+                max_backoff_seconds=config.stream_max_backoff_seconds
+            )
+            stream.start()
+            run_stream_loop(config, processor, scheduler, events, last_processed_ids, profiler)
+        else:
+            run_poll_loop(truth_social_client, processor, scheduler, last_processed_ids, profiler)
 
     except KeyboardInterrupt:
-        logging.info("Shutdown signal received. Saving final state...")
-        write_file(config.storage_file, last_processed_id)
-        logging.info("Exiting.")
+        logging.info("Shutdown signal received. Waiting for in-flight work...")
     except Exception as e:
         logging.critical(f"An unexpected critical error occurred in the main loop: {e}", exc_info=True)
-        write_file(config.storage_file, last_processed_id)
+        shutdown(stream, processor, notifier, cluster, analysis_cache, state_store, metrics_server, summary_logger)
         logging.critical("Exiting due to critical error.")
+        return
+
+    shutdown(stream, processor, notifier, cluster, analysis_cache, state_store, metrics_server, summary_logger, log_stats={
+        "Alert dispatcher": notifier.stats,
+        "Analysis cache": analysis_cache.stats,
+        "Pre-filter": prefilter.stats,
+        "Near-duplicate filter": near_duplicates.stats,
+        "Scheduler": scheduler.stats,
+    })
+    logging.info("Exiting.")
+
+def shutdown(stream, processor, notifier, cluster, analysis_cache, state_store, metrics_server, summary_logger, log_stats=None):
+    """Stop ingestion, drain in-flight work, log final stats and close every resource."""
+    if stream is not None:
+        stream.stop()
+    processor.close()
+    # The async dispatcher is closed by run_async on the event loop
+    if not isinstance(notifier, AsyncAlertDispatcher):
+        notifier.close()
+    # After the last alert is claimed; hands this node's handles to the others right away
+    if cluster is not None:
+        cluster.stop()
+    for name, stats in (log_stats or {}).items():
+        logging.info(f"{name} stats: {stats()}")
+    if log_stats:
+        logging.info(f"Metrics summary: {REGISTRY.summary()}")
+    stop_metrics(metrics_server, summary_logger)
+    analysis_cache.close()
+    state_store.close()
+
+async def run_async(processor, scheduler, last_processed_ids, profiler, warmup_checks=None):
+    """Run the asyncio pipeline until SIGTERM/SIGINT, then close the async clients."""
+    # Warm up on this loop so the async clients keep the connections it opens
+    warmup = asyncio.create_task(warm_up_async(warmup_checks)) if warmup_checks else None
+    try:
+        await processor.run(scheduler, last_processed_ids, profiler)
+    finally:
+        if warmup is not None and not warmup.done():
+            warmup.cancel()
+        await processor.sentiment_analyzer.close()
+        await processor.notifier.close()
+
+def warmup_checks(truth_social_client, sentiment_analyzer, sinks):
+    """
+    Returns:
+        dict: Service name -> warm_up callable, for warm_up or warm_up_async
+    """
+    checks = {
+        "Truth Social": truth_social_client.verify_credentials,
+        "OpenAI": sentiment_analyzer.warm_up,
+    }
+    for sink in sinks:
+        checks[f"ntfy {sink.ntfy_topic}"] = sink.warm_up
+    return checks
+
+def run_check(config, truth_social_client):
+    """
+    Connect to every service in parallel with the threaded clients and report.
+
+    Returns:
+        int: Exit status, 0 if every service is reachable
+    """
+    sentiment_analyzer = SentimentAnalyzer(config.openai_api_key, model=config.openai_model)
+    sinks = [
+        Notifier(topic, server_url=config.ntfy_server, timeout_seconds=config.ntfy_timeout_seconds, max_retries=0)
+        for topic in config.ntfy_topics
+    ]
+    started = time.perf_counter()
+    results = warm_up(warmup_checks(truth_social_client, sentiment_analyzer, sinks))
+    failed = [name for name, ok in results.items() if not ok]
+    logging.info(f"Startup check finished in {time.perf_counter() - started:.2f}s: {len(results) - len(failed)}/{len(results)} services reachable.")
+    if failed:
+        logging.error(f"Unreachable: {', '.join(failed)}")
+    return 1 if failed else 0
+
+# Queue marker asking the stream loop for a since_id catch-up poll of every handle
+CATCH_UP = object()
+
+def run_poll_loop(truth_social_client, processor, scheduler, last_processed_ids, profiler):
+    """Poll each handle whenever the scheduler says it is due."""
+    while True:
+        handle = scheduler.wait_for_next_poll()
+        with profiler.profile_cycle(handle):
+            poll_handle(processor, handle, last_processed_ids)
+        scheduler.record_poll(handle, processor.last_batch_size, **truth_social_client.rate_limit_status())
+
+def run_stream_loop(config, processor, scheduler, events, last_processed_ids, profiler):
+    """
+    Process statuses pushed by the stream as they arrive.
+
+    Every (re)connect, the start of each polling window and every
+    POLL_INTERVAL_SECONDS trigger a catch-up poll through the regular poll path, so
+    statuses missed while disconnected are never skipped. Pushed statuses are analyzed
+    and alerted right away but only the catch-up poll moves the cursor, so a failed
+    catch-up can never be skipped over by a newer pushed status. Pushed statuses outside
+    polling hours are left for the catch-up when the window opens.
+    """
+    within_hours = False
+    next_catch_up = time.monotonic() + config.poll_interval_seconds
+    while True:
+        try:
+            item = events.get(timeout=max(next_catch_up - time.monotonic(), 0))
+        except queue.Empty:
+            item = CATCH_UP
+
+        now_within_hours = scheduler.primary.is_within_polling_hours()
+        if now_within_hours and not within_hours:
+            item = CATCH_UP
+        within_hours = now_within_hours
+        if item is CATCH_UP:
+            next_catch_up = time.monotonic() + config.poll_interval_seconds
+        if not within_hours:
+            continue
+
+        if item is CATCH_UP:
+            logging.info("Running catch-up poll for all handles.")
+            with profiler.profile_cycle("catch-up"):
+                for handle in config.target_handles:
+                    poll_handle(processor, handle, last_processed_ids)
+        else:
+            handle, status = item
+            with profiler.profile_cycle(handle):
+                poll_handle(processor, handle, last_processed_ids, statuses=[status])
+
+def poll_handle(processor, handle, last_processed_ids, statuses=None):
+    """Process new statuses for one handle and track its cursor."""
+    last_processed_id = last_processed_ids[handle]
+    newest_message_id = processor.process_statuses(last_processed_id, handle, statuses)
+
+    if newest_message_id != last_processed_id:
+        logging.info(f"Updating last processed ID for @{handle} to: {newest_message_id}")
+        last_processed_ids[handle] = newest_message_id
+
+def start_metrics(config, analysis_cache, prefilter, near_duplicates, enricher, cluster, notifier, scheduler):
+    """
+    Expose component stats as metrics and start the optional /metrics endpoint and summary log.
+
+    Returns:
+        tuple: (MetricsServer or None, SummaryLogger or None)
+    """
+    REGISTRY.register_collector("stonk_analysis_cache", analysis_cache.stats)
+    REGISTRY.register_collector("stonk_prefilter", prefilter.stats)
+    REGISTRY.register_collector("stonk_near_duplicates", near_duplicates.stats)
+    if enricher is not None:
+        REGISTRY.register_collector("stonk_enrichment", enricher.stats)
+    if cluster is not None:
+        REGISTRY.register_collector("stonk_cluster", cluster.stats)
+    REGISTRY.register_collector("stonk_dispatcher", notifier.stats)
+    for sink in notifier.sinks:
+        REGISTRY.register_collector("stonk_notifier", sink.stats, labels={"topic": sink.ntfy_topic})
+    for handle, handle_scheduler in scheduler.schedulers.items():
+        REGISTRY.register_collector("stonk_scheduler", handle_scheduler.stats, labels={"handle": handle})
+
+    metrics_server = None
+    if config.metrics_port:
+        try:
+            metrics_server = MetricsServer(config.metrics_host, config.metrics_port).start()
+        except OSError as e:
+            logging.error(f"Could not start metrics endpoint on {config.metrics_host}:{config.metrics_port}: {e}")
+
+    summary_logger = None
+    if config.metrics_log_interval_seconds > 0:
+        summary_logger = SummaryLogger(config.metrics_log_interval_seconds).start()
+
+    return metrics_server, summary_logger
+
+def stop_metrics(metrics_server, summary_logger):
+    if summary_logger is not None:
+        summary_logger.stop()
+    if metrics_server is not None:
+        metrics_server.stop()
+
+def build_scheduler(config, handle):
+    """Build the Scheduler for one handle, applying its poll interval override if any."""
+    return Scheduler(
+        poll_start_hour=config.poll_start_hour,
+        poll_end_hour=config.poll_end_hour,
+        poll_interval_seconds=config.handle_poll_intervals.get(handle, config.poll_interval_seconds),
+        timezone=config.timezone,
+        policy=config.scheduler_policy,
+        min_interval_seconds=config.poll_min_interval_seconds,
+        max_interval_seconds=config.poll_max_interval_seconds,
+        burst_interval_seconds=config.burst_interval_seconds,
+        burst_duration_seconds=config.burst_duration_seconds,
+        backoff_factor=config.poll_backoff_factor,
+        jitter_ratio=config.poll_jitter_ratio,
+        market_windows=parse_market_windows(config.market_windows),
+        market_interval_seconds=config.market_interval_seconds
+    )
+
+def import_legacy_cursors(state_store, config):
+    """
+    Seed the state store from the old single-line STORAGE_FILE cursors, for handles it has no cursor for yet.
+    """
+    if not config.storage_file:
+        return
+    for position, handle in enumerate(config.target_handles):
+        if state_store.get_cursor(handle):
+            continue
+        path = config.storage_file if position == 0 else handle_storage_path(config.storage_file, handle)
+        legacy_id = read_file(path)
+        if legacy_id:
+            logging.info(f"Importing legacy cursor {legacy_id} for @{handle} from {path}")
+            state_store.set_cursor(handle, legacy_id)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
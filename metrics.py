@@ -0,0 +1,315 @@
+import contextlib
+import cProfile
+import logging
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _label_key(label_names, labels):
+    if set(labels) != set(label_names):
+        raise ValueError(f"Expected labels {label_names}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in label_names)
+
+def _format_labels(label_names, key, extra=None):
+    pairs = list(zip(label_names, key)) + list(extra or [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class Counter:
+    """Monotonically increasing value, optionally split by labels."""
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.label_names, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(self.label_names, key), value) for key, value in self._values.items()]
+
+    def summary(self):
+        with self._lock:
+            return sum(self._values.values())
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def summary(self):
+        with self._lock:
+            if not self._values:
+                return None
+            return max(self._values.values())
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", _format_labels(self.label_names, key, [("le", _format_value(bound))]), cumulative))
+                samples.append((f"{self.name}_sum", _format_labels(self.label_names, key), series["sum"]))
+                samples.append((f"{self.name}_count", _format_labels(self.label_names, key), series["count"]))
+        return samples
+
+    def summary(self):
+        with self._lock:
+            count = sum(series["count"] for series in self._series.values())
+            total = sum(series["sum"] for series in self._series.values())
+        return {"count": count, "mean": total / count if count else None}
+
+class MetricsRegistry:
+    """
+    Holds every metric and renders them in the Prometheus text exposition format.
+
+    Collectors are callables returning a flat dict of numbers; they are rendered as
+    gauges named <prefix>_<key> so existing stats() methods can be exposed as-is.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._get_or_create(Gauge, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def register_collector(self, prefix, collect, labels=None):
+        """
+        Expose the numeric values of collect() as gauges.
+
+        Args:
+            prefix (str): Metric name prefix, e.g. "stonk_analysis_cache"
+            collect (callable): Returns a dict of name -> number
+            labels (dict, optional): Constant labels added to every sample
+        """
+        with self._lock:
+            self._collectors.append((prefix, collect, tuple((labels or {}).items())))
+
+    def render(self):
+        """
+        Returns:
+            str: All metrics in the Prometheus text format
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+
+        for prefix, collect, labels in collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                logging.error(f"Metrics collector {prefix} failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"{prefix}_{key}{_format_labels((), (), labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        Returns:
+            dict: A compact one-value-per-metric view for log lines
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.summary() for metric in metrics}
+
+    def _get_or_create(self, cls, name, help_text, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, label_names, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+# Process-wide default registry used by all components
+REGISTRY = MetricsRegistry()
+
+class MetricsServer:
+    """Serves REGISTRY.render() at /metrics from a daemon thread."""
+    def __init__(self, host="127.0.0.1", port=9108, registry=REGISTRY):
+        # Only needed when METRICS_PORT is set, so not imported at startup
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry_ref = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry_ref.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logging.info(f"Serving metrics at http://{self.server.server_address[0]}:{self.server.server_address[1]}/metrics")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class SummaryLogger:
+    """Logs REGISTRY.summary() every interval_seconds from a daemon thread."""
+    def __init__(self, interval_seconds, registry=REGISTRY):
+        self.interval_seconds = interval_seconds
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-summary", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            logging.info(f"Metrics summary: {self.registry.summary()}")
+
+class CycleProfiler:
+    """
+    Opt-in per-cycle cProfile hook.
+
+    When a directory is configured, every cycle wrapped in profile_cycle() (or between
+    start() and finish()) is profiled and the stats are dumped to
+    <directory>/cycle-<timestamp>-<label>.prof if the cycle took at least min_seconds. Only
+    the calling thread is profiled, so time spent in analysis workers shows up as waiting in
+    as_completed. cProfile can only run one profiler per thread, so a cycle that starts
+    while another is being profiled is not profiled.
+    """
+    def __init__(self, directory=None, min_seconds=0.0):
+        self.directory = directory
+        self.min_seconds = min_seconds
+        self._active = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @contextlib.contextmanager
+    def profile_cycle(self, label="cycle"):
+        cycle = self.start(label)
+        try:
+            yield
+        finally:
+            self.finish(cycle)
+
+    def start(self, label="cycle"):
+        """
+        Start profiling a cycle that does not fit in one with block, e.g. one that moves
+        through several asyncio stages.
+
+        Returns:
+            tuple: A handle for finish(), or None if profiling is off or busy with another cycle
+        """
+        if not self.directory or self._active is not None:
+            return None
+        profiler = cProfile.Profile()
+        self._active = (profiler, label, time.perf_counter())
+        profiler.enable()
+        return self._active
+
+    def finish(self, cycle):
+        """Stop profiling a cycle started with start() and dump it if it was slow enough."""
+        if cycle is None or cycle is not self._active:
+            return
+        profiler, label, started = cycle
+        profiler.disable()
+        self._active = None
+        elapsed = time.perf_counter() - started
+        if elapsed >= self.min_seconds:
+            path = os.path.join(self.directory, f"cycle-{time.strftime('%Y%m%d-%H%M%S')}-{label}.prof")
+            profiler.dump_stats(path)
+            logging.info(f"Cycle took {elapsed:.2f}s; profile written to {path}")
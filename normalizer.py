@@ -0,0 +1,353 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import Counter, OrderedDict, namedtuple
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from analysis_cache import normalize_text
+
+NEAR_DUPLICATE_MODES = ("off", "shadow", "enforce")
+
+NormalizedStatus = namedtuple("NormalizedStatus", ["text", "mentions", "hashtags", "cashtags", "urls", "fingerprint", "simhash"])
+
+_URL_RE = re.compile(r"https?://[^\s<>\"]+|www\.[^\s<>\"]+", re.IGNORECASE)
+_MENTION_RE = re.compile(r"(?<![\w@/])@(\w{1,30})")
+_HASHTAG_RE = re.compile(r"(?<![\w#&/])#(\w*[A-Za-z_]\w*)")
+# $TSLA, $BRK.B; not $100
+_CASHTAG_RE = re.compile(r"(?<![\w$])\$([A-Za-z]{1,6}(?:\.[A-Za-z]{1,2})?)\b")
+_WORD_RE = re.compile(r"\w+")
+_DECORATION_RE = re.compile("|".join((_URL_RE.pattern, _MENTION_RE.pattern, _HASHTAG_RE.pattern, r"\bRT:")), re.IGNORECASE)
+_SPACES_RE = re.compile(r"[ \t\r\f\v ]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+_BLOCK_TAGS = {"p", "div", "blockquote", "li", "ul", "ol"}
+_SKIP_TAGS = {"script", "style"}
+
+SIMHASH_BITS = 64
+_LANE_BITS = 16
+_LANE_MASK = (1 << _LANE_BITS) - 1
+# Every bit of a byte spread into its own 16-bit lane, so summing spread digests counts
+# how often each of the 64 bits is set without a per-bit Python loop
+_BYTE_LANES = [sum(((byte >> bit) & 1) << (bit * _LANE_BITS) for bit in range(8)) for byte in range(256)]
+
+def collapse_url(url):
+    """
+    Reduce a URL to its scheme and host; paths, tracking parameters and fragments carry
+    no sentiment but cost tokens and break text-based dedup.
+
+    Returns:
+        str: e.g. "https://example.com"
+    """
+    if not url.lower().startswith(("http://", "https://")):
+        url = "https://" + url
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return f"{parts.scheme.lower()}://{host}" if host else url
+
+class StatusHTMLParser(HTMLParser):
+    """
+    Streaming HTML-to-text converter for Truth Social / Mastodon status markup.
+
+    Paragraphs become blank lines and <br> a newline. Mention and hashtag links keep their
+    text ("@user", "#tag"); other links are replaced by their collapsed href, dropping the
+    invisible/ellipsis spans Mastodon renders around URLs. Entities are unescaped by
+    HTMLParser itself. feed() can be called with arbitrary chunks; text() returns the
+    result so far.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._hrefs = []
+        self._collapsed = set()
+        self._parts = []
+        self._link = None
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "br":
+            self._emit("\n")
+        elif tag in _BLOCK_TAGS:
+            self._emit("\n\n")
+        elif tag == "a" and self._link is None:
+            attributes = dict(attrs)
+            classes = (attributes.get("class") or "").split()
+            if "mention" in classes or "hashtag" in classes:
+                return
+            self._link = {"href": attributes.get("href") or "", "text": []}
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in _SKIP_TAGS:
+            self._skip_depth -= 1
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag in _BLOCK_TAGS:
+            self._emit("\n\n")
+        elif tag == "a" and self._link is not None:
+            link, self._link = self._link, None
+            text = "".join(link["text"]).strip()
+            href = link["href"]
+            # Keep descriptive link text; replace URL-shaped text with the collapsed href
+            if href and (not text or _URL_RE.match(text) or text.startswith(("http", "www."))):
+                collapsed = collapse_url(href)
+                self._hrefs.append(href)
+                self._collapsed.add(collapsed)
+                self._emit(f" {collapsed} ")
+            else:
+                self._emit(text)
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._link is not None:
+            self._link["text"].append(data)
+        else:
+            self._emit(data)
+
+    def text(self):
+        """
+        Returns:
+            str: The plain text so far, with bare URLs collapsed and whitespace tidied
+        """
+        text = _URL_RE.sub(lambda match: collapse_url(_trim_url(match.group(0))) + match.group(0)[len(_trim_url(match.group(0))):], "".join(self._parts))
+        lines = [_SPACES_RE.sub(" ", line).strip() for line in text.split("\n")]
+        return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+    def urls(self):
+        """
+        Returns:
+            list: Original link targets and bare URLs, in order of appearance
+        """
+        bare = [_trim_url(url) for url in _URL_RE.findall("".join(self._parts))]
+        return self._hrefs + [url for url in bare if url not in self._collapsed]
+
+    def _emit(self, text):
+        self._parts.append(text)
+
+def normalize_html(content):
+    """
+    Convert status HTML to plain text and extract its structured fields.
+
+    Args:
+        content (str): The status "content" HTML
+
+    Returns:
+        NormalizedStatus: Plain text, mentions, hashtags, cashtags, original URLs, and the
+            exact fingerprint and SimHash of the text without links, mentions and hashtags
+    """
+    parser = StatusHTMLParser()
+    parser.feed(content or "")
+    parser.close()
+    text = parser.text()
+    # Fingerprint the statement itself, so a repost with another link, mention or hashtag still matches
+    core = _DECORATION_RE.sub(" ", text)
+    return NormalizedStatus(
+        text=text,
+        mentions=_unique(_MENTION_RE.findall(text)),
+        hashtags=_unique(_HASHTAG_RE.findall(text)),
+        cashtags=_unique(tag.upper() for tag in _CASHTAG_RE.findall(text)),
+        urls=_unique(parser.urls()),
+        fingerprint=text_fingerprint(core),
+        simhash=simhash(core)
+    )
+
+def text_fingerprint(text):
+    """
+    Returns:
+        str: Hex SHA-256 of the normalized text; identical for trivially different renderings
+    """
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+def simhash(text):
+    """
+    64-bit SimHash over word bigrams (single words for one-word texts). Texts that differ
+    by a few words land a few bits apart; see hamming_distance.
+
+    Returns:
+        int: The SimHash, 0 for text without words
+    """
+    words = _WORD_RE.findall(normalize_text(text))
+    features = [f"{first} {second}" for first, second in zip(words, words[1:])] or words
+    # Lane counters hold up to 65535; longer texts only use their first features
+    features = features[:_LANE_MASK]
+    if not features:
+        return 0
+
+    totals = 0
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=SIMHASH_BITS // 8).digest()
+        for index, byte in enumerate(digest):
+            totals += _BYTE_LANES[byte] << (index * 8 * _LANE_BITS)
+
+    value = 0
+    for bit in range(SIMHASH_BITS):
+        if ((totals >> (bit * _LANE_BITS)) & _LANE_MASK) * 2 > len(features):
+            value |= 1 << bit
+    return value
+
+def hamming_distance(first, second):
+    return (first ^ second).bit_count()
+
+class NearDuplicateIndex:
+    """
+    Bounded LRU index of SimHashes answering "is there a stored hash within max_distance bits?".
+
+    Hashes are split into max_distance + 1 bands; two hashes within max_distance bits agree
+    exactly on at least one band, so a lookup only compares against hashes sharing a band.
+    """
+    def __init__(self, max_distance=3, max_size=10000):
+        self.max_distance = max_distance
+        self.max_size = max_size
+        self._band_count = max_distance + 1
+        self._band_bits = -(-SIMHASH_BITS // self._band_count)
+        self._bands = [{} for _ in range(self._band_count)]
+        self._entries = OrderedDict()
+
+    def find(self, value, exclude=None):
+        """
+        Args:
+            value (int): The SimHash to look up
+            exclude (str, optional): A key to ignore, e.g. the status being checked
+
+        Returns:
+            tuple: (key, distance) of the closest stored hash within max_distance, or None
+        """
+        best = None
+        for band, table in zip(self._band_values(value), self._bands):
+            for key in table.get(band, ()):
+                if key == exclude:
+                    continue
+                distance = hamming_distance(value, self._entries[key])
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (key, distance)
+        return best
+
+    def add(self, key, value):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = value
+        for band, table in zip(self._band_values(value), self._bands):
+            table.setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        value = self._entries.pop(key)
+        for band, table in zip(self._band_values(value), self._bands):
+            keys = table.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del table[band]
+
+    def _band_values(self, value):
+        mask = (1 << self._band_bits) - 1
+        return [(value >> (index * self._band_bits)) & mask for index in range(self._band_count)]
+
+class NearDuplicateFilter:
+    """
+    Skips statuses whose text matches (exactly or within max_distance SimHash bits) a status
+    analyzed earlier in this process, e.g. the same statement reposted with a different link.
+
+    Like PreFilter, "shadow" mode only logs and counts what would have been skipped.
+
+    should_analyze() only checks; a status is added to the index by remember() once its
+    analysis has been recorded. A status whose analysis failed is therefore never matched
+    against itself when it is retried.
+    """
+    def __init__(self, mode="shadow", max_distance=3, max_size=10000):
+        if mode not in NEAR_DUPLICATE_MODES:
+            raise ValueError(f"Unknown near-duplicate mode '{mode}'. Expected one of {NEAR_DUPLICATE_MODES}.")
+        self.mode = mode
+        self.index = NearDuplicateIndex(max_distance, max_size)
+        self.counters = Counter()
+        self._fingerprints = OrderedDict()
+        self._lock = threading.Lock()
+
+    def should_analyze(self, normalized, status_id=None):
+        """
+        Check a status against the statuses analyzed earlier.
+
+        Args:
+            normalized (NormalizedStatus): The status's normalized text and fingerprints
+            status_id (str, optional): Used in log messages
+
+        Returns:
+            bool: False only for a duplicate in "enforce" mode
+        """
+        if self.mode == "off" or not normalized.text:
+            return True
+
+        with self._lock:
+            self.counters["evaluated"] += 1
+            match = None
+            # A retried status finds its own entry if it was remembered before; that is not a repost
+            fingerprint = normalized.fingerprint
+            if fingerprint in self._fingerprints and (status_id is None or self._fingerprints[fingerprint] != status_id):
+                match = ("exact", self._fingerprints[fingerprint], 0)
+            else:
+                near = self.index.find(normalized.simhash, exclude=status_id)
+                if near is not None:
+                    match = ("near", near[0], near[1])
+
+            if match is None:
+                self.counters["unique"] += 1
+                return True
+            kind, original_id, distance = match
+            prefix = "shadow_" if self.mode == "shadow" else ""
+            self.counters[f"{prefix}skipped_{kind}"] += 1
+
+        if self.mode == "shadow":
+            logging.info(f"Near-duplicate filter (shadow) would skip status ID {status_id}: {kind} match of {original_id} (distance {distance})")
+            return True
+
+        logging.info(f"Near-duplicate filter skipped status ID {status_id}: {kind} match of {original_id} (distance {distance})")
+        return False
+
+    def remember(self, normalized, status_id=None):
+        """
+        Add an analyzed status, so later reposts of it are matched.
+
+        Args:
+            normalized (NormalizedStatus): The status's normalized text and fingerprints
+            status_id (str, optional): Reported as the original in later matches
+        """
+        if self.mode == "off" or not normalized.text:
+            return
+        with self._lock:
+            self._fingerprints[normalized.fingerprint] = status_id
+            self._fingerprints.move_to_end(normalized.fingerprint)
+            while len(self._fingerprints) > self.index.max_size:
+                self._fingerprints.popitem(last=False)
+            self.index.add(status_id or normalized.fingerprint, normalized.simhash)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Snapshot of the filter counters
+        """
+        with self._lock:
+            return dict(self.counters)
+
+def _trim_url(url):
+    """Drop sentence punctuation that the URL pattern swallowed."""
+    return url.rstrip(".,;:!?)'")
+
+def _unique(values):
+    seen = set()
+    unique = []
+    for value in values:
+        if value.casefold() not in seen:
+            seen.add(value.casefold())
+            unique.append(value)
+    return unique
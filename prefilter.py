@@ -0,0 +1,120 @@
+import html
+import logging
+import re
+import threading
+from collections import Counter, namedtuple
+
+PREFILTER_MODES = ("off", "shadow", "enforce")
+
+PreFilterDecision = namedtuple("PreFilterDecision", ["skip", "score", "reason"])
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_URL_RE = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+_WORD_RE = re.compile(r"[A-Za-z0-9$%']+")
+
+# Weighted patterns for the bag-of-words score. Positive weights are terms that tend to
+# appear in market-moving announcements; negative weights are common pure-rhetoric terms.
+DEFAULT_KEYWORD_WEIGHTS = {
+    r"\btariffs?\b": 3.0,
+    r"\bexecutive orders?\b": 3.0,
+    r"\bsigned\b|\bsigning\b|\bwill sign\b": 2.0,
+    r"\bsanctions?\b|\bembargo\b": 3.0,
+    r"\bwar\b|\bmilitary strikes?\b|\binvasion\b|\bceasefire\b": 2.5,
+    r"\bfed\b|\bfederal reserve\b|\binterest rates?\b|\brate cuts?\b|\bpowell\b": 2.0,
+    r"\btrade deals?\b|\bimports?\b|\bexports?\b|\bduties\b": 2.0,
+    r"\btax(es)?\b|\bdebt ceiling\b|\bshutdown\b|\bstimulus\b": 1.5,
+    r"\bstock market\b|\bstocks?\b|\bdow\b|\bnasdaq\b|\bs&p\b|\bmarkets?\b": 1.0,
+    r"\bchina\b|\bmexico\b|\bcanada\b|\beuropean union\b|\beu\b|\boil\b|\bopec\b": 1.0,
+    r"\beffective immediately\b|\bannounce\b|\bannouncing\b|\bofficially\b": 1.5,
+    r"\$[A-Za-z]{1,5}\b": 3.0,
+    r"\bfake news\b|\brigged\b|\bwitch hunt\b|\bcrooked\b|\bradical left\b": -1.0,
+    r"\bendorsement\b|\bendorse\b|\bvote\b|\brally\b|\bmaga\b|\bcongratulations\b|\bthank you\b": -1.0,
+}
+
+class PreFilter:
+    """
+    Cheap local classifier that runs before SentimentAnalyzer.
+
+    Posts are skipped when they are empty, link-only, too short, or score below
+    min_score on the keyword model. In "shadow" mode nothing is skipped; the
+    decision is only logged and counted so recall loss can be measured first.
+    """
+    def __init__(self, mode="shadow", min_score=1.0, min_words=3, keyword_weights=None):
+        if mode not in PREFILTER_MODES:
+            raise ValueError(f"Unknown pre-filter mode '{mode}'. Expected one of {PREFILTER_MODES}.")
+        self.mode = mode
+        self.min_score = min_score
+        self.min_words = min_words
+        self.keyword_weights = [
+            (re.compile(pattern, re.IGNORECASE), weight)
+            for pattern, weight in (keyword_weights or DEFAULT_KEYWORD_WEIGHTS).items()
+        ]
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def evaluate(self, text):
+        """
+        Score a status text without side effects.
+
+        Args:
+            text (str): The status text, possibly containing HTML
+
+        Returns:
+            PreFilterDecision: (skip, score, reason)
+        """
+        plain = html.unescape(_TAG_RE.sub(" ", text or "")).strip()
+        if not plain:
+            return PreFilterDecision(True, 0.0, "empty")
+
+        without_urls = _URL_RE.sub(" ", plain)
+        words = _WORD_RE.findall(without_urls)
+        if not words:
+            return PreFilterDecision(True, 0.0, "link-only")
+
+        score = sum(weight * len(pattern.findall(without_urls)) for pattern, weight in self.keyword_weights)
+
+        if score >= self.min_score:
+            return PreFilterDecision(False, score, "keywords")
+        if len(words) < self.min_words:
+            return PreFilterDecision(True, score, "too-short")
+        return PreFilterDecision(True, score, "low-score")
+
+    def should_analyze(self, text, status_id=None):
+        """
+        Decide whether a status should go to OpenAI, honouring the configured mode.
+
+        Returns:
+            bool: False only when the status should be skipped in "enforce" mode
+        """
+        if self.mode == "off":
+            return True
+
+        decision = self.evaluate(text)
+        with self._lock:
+            self.counters["evaluated"] += 1
+            if not decision.skip:
+                self.counters["passed"] += 1
+            elif self.mode == "shadow":
+                self.counters["shadow_skipped"] += 1
+                self.counters[f"shadow_skipped_{decision.reason}"] += 1
+            else:
+                self.counters["skipped"] += 1
+                self.counters[f"skipped_{decision.reason}"] += 1
+
+        if not decision.skip:
+            return True
+
+        if self.mode == "shadow":
+            logging.info(f"Pre-filter (shadow) would skip status ID {status_id}: reason={decision.reason}, score={decision.score:.1f}")
+            return True
+
+        logging.info(f"Pre-filter skipped status ID {status_id}: reason={decision.reason}, score={decision.score:.1f}")
+        return False
+
+    def stats(self):
+        """
+        Returns:
+            dict: Snapshot of the pre-filter counters
+        """
+        with self._lock:
+            return dict(self.counters)
@@ -1,95 +1,396 @@
+import datetime
 import logging
-from clients.notifier import Notifier
-from clients.storage import write_file
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from clients.state_store import SQLiteStateStore
 from clients.truth_social import TruthSocialClient
-from sentiment_analyzer import SentimentAnalyzer
+from dispatcher import AlertDispatcher
+from enricher import StatusEnricher, status_html
+from metrics import REGISTRY
+from normalizer import NearDuplicateFilter, normalize_html
+from prefilter import PreFilter
+from sentiment_analyzer import AnalysisFailedError, SentimentAnalyzer
+
+FETCH_SECONDS = REGISTRY.histogram("stonk_fetch_seconds", "Time to fetch and drain new statuses from Truth Social", ("handle",))
+ANALYSIS_SECONDS = REGISTRY.histogram("stonk_analysis_seconds", "Time to analyze one group of statuses", ("kind",))
+STATUSES = REGISTRY.counter("stonk_statuses_total", "Statuses seen by outcome (analyzed, skipped, duplicate, near_duplicate, failed)", ("handle", "outcome"))
+CURSOR_LAG_STATUSES = REGISTRY.gauge("stonk_cursor_lag_statuses", "Fetched statuses newer than the stored cursor after a cycle", ("handle",))
+CURSOR_LAG_SECONDS = REGISTRY.gauge("stonk_cursor_lag_seconds", "Age of the oldest fetched status the cursor has not passed yet (0 when caught up)", ("handle",))
+
+def normalize_status(status):
+    """
+    Returns:
+        NormalizedStatus: The status text (including reposted/quoted text, card and media
+            descriptions) as plain text plus its extracted fields and fingerprints
+    """
+    return normalize_html(status_html(status))
+
+def extract_status_text(status):
+    """
+    Extract the text to analyze from a status.
+
+    Returns:
+        str: The status content as plain text, or an empty string if the status has no text content
+    """
+    return normalize_status(status).text
+
+def status_created_at(status):
+    """
+    Returns:
+        float: The status creation time as a Unix timestamp, or None if it is missing or unparseable
+    """
+    created_at = status.get('created_at')
+    if not created_at:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(str(created_at).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+def status_id_key(status_id):
+    """Sort key for numeric status ID strings (shorter IDs are always older)."""
+    return (len(status_id), status_id)
+
+class CursorTracker:
+    """
+    Tracks in-flight statuses for a batch and only advances the cursor across
+    a contiguous run of completed statuses, oldest first.
+    """
+    def __init__(self, cursor, status_ids):
+        self.cursor = cursor
+        self.pending = sorted(status_ids, key=status_id_key)
+        self.completed = set()
+        self.failed = None
+
+    def complete(self, status_id):
+        """
+        Mark a status as finished.
+
+        Returns:
+            str: The new cursor if it advanced, otherwise None
+        """
+        self.completed.add(status_id)
+        advanced = False
+        while self.pending and self.failed != self.pending[0] and self.pending[0] in self.completed:
+            self.cursor = self.pending.pop(0)
+            advanced = True
+        return self.cursor if advanced else None
+
+    def fail(self, status_id):
+        """Mark a status as failed. The cursor never moves past the oldest failure."""
+        if self.failed is None or status_id_key(status_id) < status_id_key(self.failed):
+            self.failed = status_id
 
 class StatusProcessor:
-    def __init__(self, api_client: TruthSocialClient, sentiment_analyzer:SentimentAnalyzer, notifier: Notifier, storage_path: str):
+    def __init__(self, api_client: TruthSocialClient, sentiment_analyzer:SentimentAnalyzer, notifier: AlertDispatcher, state_store: SQLiteStateStore, max_workers: int = 4, prefilter: PreFilter = None, near_duplicates: NearDuplicateFilter = None, enricher: StatusEnricher = None, cluster=None):
         self.api_client = api_client
         self.sentiment_analyzer = sentiment_analyzer
         self.notifier = notifier
-        self.storage_path = storage_path
-        
-    def process_statuses(self, after_message_id=None):
+        self.state_store = state_store
+        self.prefilter = prefilter
+        self.near_duplicates = near_duplicates
+        self.enricher = enricher
+        self.cluster = cluster
+        self.last_batch_size = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+
+    def process_statuses(self, after_message_id=None, handle=None, statuses=None):
         """
         Fetch, analyze, and potentially notify for new statuses since the last known ID.
+        Polls the client's target handle unless another handle is given. Pass statuses to
+        process already-received statuses (e.g. from the stream) instead of polling. Those
+        are recorded as handled but never move the cursor, since only a poll knows that no
+        older status is missing; the next poll passes them as already handled.
+
+        Statuses in a batch are packed into batched analysis requests that run
+        concurrently, and notifications are sent as results come in. The stored cursor
+        only advances once every older status in the batch has finished, so a crash
+        never skips a post. Statuses the state store already has a record for are not
+        analyzed or notified again.
+
+        In cluster mode, only the handle's leader processes it; other nodes return right away.
+
         Returns the ID of the latest status processed in this batch, or the last_known_id if none were new.
         """
+        handle = handle or self.api_client.target_handle
+        self.last_batch_size = 0
+        pushed = statuses is not None
+        if self.cluster is not None:
+            if not self.cluster.should_poll(handle):
+                return after_message_id
+            after_message_id = self.cluster.cursor_for(handle, after_message_id)
         latest_id_in_batch = after_message_id
-        new_statuses_processed = 0
-        statuses_processed_this_run = [] # Keep track of IDs processed in this specific run
-        
+
         try:
-            # Get new statuses
-            for status in self.api_client.get_new_statuses(after_message_id):
-                status_id_str = str(status.get('id'))
-                if not status_id_str:
-                    logging.warning("Found status without ID, skipping.")
-                    continue
+            statuses = self._collect_new_statuses(after_message_id, handle, statuses)
+            self.last_batch_size = len(statuses)
+
+            tracker = CursorTracker(after_message_id, [] if pushed else list(statuses))
+            texts = self._triage(handle, statuses, tracker)
+
+            futures = {
+                self.executor.submit(self._analyze_group, [texts[status_id] for status_id in group]): group
+                for group in self._plan_groups(texts)
+            }
 
-                # Double-check against last_known_id (pull_statuses should handle this, but belt-and-suspenders)
-                if after_message_id is not None and status_id_str <= after_message_id:
-                    logging.warning(f"Got status ID {status_id_str} which is not newer than {after_message_id}. Skipping.")
+            for future in as_completed(futures):
+                group = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    self._fail_group(handle, tracker, group, e)
                     continue
+                self._record_results(handle, statuses, tracker, group, results)
 
-                logging.info(f"Processing new status ID: {status_id_str}")
-                statuses_processed_this_run.append(status_id_str) # Track processed ID for this run
-                new_statuses_processed += 1
+            latest_id_in_batch = self._finish_batch(handle, statuses, tracker)
+            if self.cluster is not None and not pushed:
+                self.cluster.publish_cursor(handle, latest_id_in_batch)
+
+        except Exception as e:
+            logging.error(f"An error occurred processing statuses: {e}", exc_info=True)
+
+        # Return the latest ID found in this batch, even if it's the same as the input last_known_id
+        return latest_id_in_batch
+
+    def close(self):
+        """Wait for in-flight analysis to finish and release the worker pools."""
+        self.executor.shutdown(wait=True)
+        if self.enricher is not None:
+            self.enricher.close()
+
+    def _collect_new_statuses(self, after_message_id, handle=None, source=None):
+        """
+        Drain the status generator (or the given source) into a dict of status ID -> status, oldest first.
+        New statuses are enriched with any quoted statuses and cards their payload is missing.
+        """
+        # The status generator pages lazily, so the fetch span covers draining it
+        started = time.perf_counter() if source is None else None
+        if source is None:
+            source = self.api_client.get_new_statuses(after_message_id, handle)
+
+        statuses = {}
+        for status in source:
+            status_id_str = str(status.get('id'))
+            if not status_id_str:
+                logging.warning("Found status without ID, skipping.")
+                continue
+
+            # Double-check against last_known_id (pull_statuses should handle this, but belt-and-suspenders)
+            if after_message_id is not None and status_id_key(status_id_str) <= status_id_key(after_message_id):
+                logging.warning(f"Got status ID {status_id_str} which is not newer than {after_message_id}. Skipping.")
+                continue
+
+            statuses[status_id_str] = status
 
-                status_text_html = status.get('content', '')
+        if started is not None:
+            FETCH_SECONDS.observe(time.perf_counter() - started, handle=handle or self.api_client.target_handle)
+
+        if self.enricher is not None:
+            self.enricher.enrich([status for status_id, status in statuses.items() if not self.state_store.is_handled(status_id)])
+
+        return {status_id: statuses[status_id] for status_id in sorted(statuses, key=status_id_key)}
+
+    def _plan_groups(self, texts):
+        """
+        Split the statuses with text into analysis jobs. Several new statuses are packed
+        into batched requests; a single status is analyzed on its own.
+
+        Args:
+            texts (dict): Status ID -> text, oldest first
+
+        Returns:
+            list: Lists of status IDs, one list per job
+        """
+        status_ids = list(texts)
+        if len(status_ids) <= 1:
+            return [status_ids] if status_ids else []
+        return [
+            [status_ids[index] for index in group]
+            for group in self.sentiment_analyzer.plan_batches([texts[status_id] for status_id in status_ids])
+        ]
+
+    def _analyze_group(self, texts):
+        """
+        Analyze one job's texts. Runs on a worker thread.
 
-                if status_text_html:
-                    # Remove <p> and </p> tags if present
-                    if status_text_html.startswith('<p>') and status_text_html.endswith('</p>'):
-                        status_text = status_text_html[3:-4]
+        Returns:
+            list: One AnalysisResult per text
+        """
+        if len(texts) == 1:
+            with ANALYSIS_SECONDS.time(kind="single"):
+                return [self.sentiment_analyzer.analyze(texts[0])]
+        with ANALYSIS_SECONDS.time(kind="batch"):
+            return self.sentiment_analyzer.analyze_batch(texts)
+
+    def _triage(self, handle, statuses, tracker):
+        """
+        Settle the statuses that need no analysis (already handled, no text, skipped by the
+        pre-filter or the near-duplicate filter) in one transaction.
+
+        Returns:
+            dict: Status ID -> text for the statuses that still need analysis, oldest first
+        """
+        texts = {}
+        if not statuses:
+            return texts
+        alerts = []
+        with self.state_store.transaction():
+            for status_id_str, status in statuses.items():
+                record = self.state_store.get_status(status_id_str)
+                if record is not None:
+                    if record["alert"] and not record["notified"]:
+                        # A significant status is only done once its alert went out; resend the recorded alert
+                        logging.info(f"Status ID {status_id_str} was analyzed but its alert was never delivered. Queueing it again.")
+                        alerts.append((record["alert"], status_id_str))
                     else:
-                        status_text = status_text_html
-
-                    # Analyze sentiment
-                    sentiment, significant, reasoning = self.sentiment_analyzer.analyze(status_text)
-                    
-                    # Send notification if significant
-                    if significant and (sentiment == "positive" or sentiment == "negative"):
-                        title, message, tags = self._format_notification(status, sentiment, reasoning)
-                        
-                        # Use the notifier interface
-                        self.notifier.send_notification(
-                            title=title, 
-                            message=message,
-                            priority="high", 
-                            tags=tags
-                        )
-                else:
+                        logging.info(f"Status ID {status_id_str} was already handled. Skipping.")
+                    STATUSES.inc(handle=handle, outcome="duplicate")
+                    self._complete(tracker, status_id_str, handle)
+                    continue
+
+                logging.info(f"Processing new status ID: {status_id_str}")
+                normalized = normalize_status(status)
+                status_text = normalized.text
+                if not status_text:
                     logging.info(f"Status ID {status_id_str} has no text content.")
+                    STATUSES.inc(handle=handle, outcome="skipped")
+                    self._complete(tracker, status_id_str, handle, analyzed=False)
+                elif self.prefilter is not None and not self.prefilter.should_analyze(status_text, status_id_str):
+                    STATUSES.inc(handle=handle, outcome="skipped")
+                    self._complete(tracker, status_id_str, handle, analyzed=False)
+                elif self.near_duplicates is not None and not self.near_duplicates.should_analyze(normalized, status_id_str):
+                    STATUSES.inc(handle=handle, outcome="near_duplicate")
+                    self._complete(tracker, status_id_str, handle, analyzed=False)
+                else:
+                    texts[status_id_str] = status_text
+        self._send_alerts(alerts)
+        return texts
 
-                # Keep track of the absolute latest ID seen in this batch
-                if latest_id_in_batch is None or status_id_str > latest_id_in_batch:
-                    latest_id_in_batch = status_id_str
+    def _record_results(self, handle, statuses, tracker, group, results):
+        """Record one analysis group's results, queue its alerts and advance the cursor."""
+        alerts = []
+        # One transaction per analysis group: results, pending alerts and the cursor commit together
+        with self.state_store.transaction():
+            for status_id_str, result in zip(group, results):
+                try:
+                    alert = self._alert_for(statuses[status_id_str], result.sentiment, result.significant, result.reasoning)
+                    self.state_store.record_status(status_id_str, handle, analyzed=True, result=result, alert=alert)
+                    # Only an analyzed status may make later reposts near-duplicates
+                    if self.near_duplicates is not None:
+                        self.near_duplicates.remember(normalize_status(statuses[status_id_str]), status_id_str)
+                except Exception as e:
+                    logging.error(f"Processing failed for status ID {status_id_str}: {e}", exc_info=True)
+                    STATUSES.inc(handle=handle, outcome="failed")
+                    tracker.fail(status_id_str)
+                    continue
+                if alert is not None:
+                    alerts.append((alert, status_id_str))
+                STATUSES.inc(handle=handle, outcome="analyzed")
+                self._complete(tracker, status_id_str, handle)
+        # Queued (and claimed cluster-wide) only once recorded, so a rolled back alert is never sent
+        # and the local write lock is never held across a cluster store round trip
+        self._send_alerts(alerts)
 
-            if new_statuses_processed == 0:
-                logging.info("No new statuses found since last check (ID: {}).".format(after_message_id or 'None'))
-            else:
-                logging.info(f"Processed {new_statuses_processed} new statuses. Latest ID: {latest_id_in_batch}. Processed IDs: {statuses_processed_this_run}")
-                # Only save if we actually processed new statuses and got a new latest ID
-                if latest_id_in_batch != after_message_id:
-                    write_file(self.storage_path, latest_id_in_batch)
+    def _fail_group(self, handle, tracker, group, error):
+        """Hold the cursor before a group whose analysis raised, so it is retried next poll."""
+        # An outage is expected and already logged by the analyzer; only unexpected errors need a traceback
+        logging.error(f"Analysis failed for status IDs {group}: {error}", exc_info=not isinstance(error, AnalysisFailedError))
+        STATUSES.inc(len(group), handle=handle, outcome="failed")
+        for status_id_str in group:
+            tracker.fail(status_id_str)
+
+    def _finish_batch(self, handle, statuses, tracker):
+        """
+        Log the outcome of a batch and update the cursor lag gauges.
+
+        Returns:
+            str: The cursor after the batch
+        """
+        if not statuses:
+            logging.info("No new statuses found since last check (ID: {}).".format(tracker.cursor or 'None'))
+        else:
+            logging.info(f"Processed {len(statuses)} new statuses. Latest ID: {tracker.cursor}. Processed IDs: {sorted(statuses, key=status_id_key)}")
+            if tracker.failed:
+                logging.warning(f"Cursor held at {tracker.cursor} because status ID {tracker.failed} failed; it will be retried next poll.")
+        self._record_cursor_lag(handle, statuses, tracker)
+        return tracker.cursor
+
+    def _record_cursor_lag(self, handle, statuses, tracker):
+        """Update the cursor lag gauges from the statuses the cursor has not passed yet."""
+        behind = [
+            status_id for status_id in statuses
+            if tracker.cursor is None or status_id_key(status_id) > status_id_key(tracker.cursor)
+        ]
+        CURSOR_LAG_STATUSES.set(len(behind), handle=handle)
+        oldest_created_at = status_created_at(statuses[behind[0]]) if behind else None
+        CURSOR_LAG_SECONDS.set(max(time.time() - oldest_created_at, 0) if oldest_created_at else 0, handle=handle)
+
+    def _complete(self, tracker, status_id_str, handle, analyzed=None):
+        """
+        Mark a status finished and advance the handle's cursor. When analyzed is given,
+        the status is also recorded in the state store; pass None if it already has a record.
+        """
+        if analyzed is not None:
+            self.state_store.record_status(status_id_str, handle, analyzed=analyzed)
+        new_cursor = tracker.complete(status_id_str)
+        if new_cursor:
+            self.state_store.set_cursor(handle, new_cursor)
+
+    def _alert_for(self, status, sentiment, significant, reasoning):
+        """
+        Returns:
+            dict: The alert to record and send (title, message, priority, tags, account) if
+                the analysis result is significant, otherwise None
+        """
+        notification = self._notification_for(status, sentiment, significant, reasoning)
+        if notification is None:
+            return None
+        title, message, tags = notification
+        return {
+            "title": title,
+            "message": message,
+            "priority": "high",
+            "tags": tags,
+            "account": status.get('account', {}).get('username', 'Unknown'),
+        }
+
+    def _send_alerts(self, alerts):
+        """
+        Hand recorded alerts to the dispatcher, which coalesces, deduplicates and delivers
+        them, and marks each status notified once delivered. Call after the transaction that
+        recorded them has committed.
+
+        Args:
+            alerts (list): (alert, status ID) pairs
+        """
+        for alert, status_id in alerts:
+            self.notifier.enqueue(
+                title=alert["title"],
+                message=alert["message"],
+                priority=alert.get("priority", "default"),
+                tags=alert.get("tags"),
+                status_id=status_id,
+                account=alert.get("account")
+            )
+
+    def _notification_for(self, status, sentiment, significant, reasoning):
+        """
+        Returns:
+            tuple: (title, message, tags) if the result warrants an alert, otherwise None
+        """
+        if significant and (sentiment == "positive" or sentiment == "negative"):
+            return self._format_notification(status, sentiment, reasoning)
+        return None
 
-        except Exception as e:
-            logging.error(f"An error occurred processing statuses: {e}", exc_info=True)
-        
-        # Return the latest ID found in this batch, even if it's the same as the input last_known_id
-        return latest_id_in_batch
-        
     def _format_notification(self, status, sentiment, reasoning):
         """
         Format notification details for a status with market impact.
-        
+
         Args:
             status (dict): The status data
             sentiment (str): The sentiment analysis result ("positive" or "negative")
             reasoning (str): The reasoning for the sentiment analysis
-            
+
         Returns:
             tuple: (title, message, tags)
                 title (str): The notification title
@@ -97,18 +398,18 @@ class StatusProcessor:
                 tags (list): List of tag strings
         """
         username = status.get('account', {}).get('username', 'Unknown')
-        raw_content = status.get('content', '')
-        content_snippet = raw_content[:200] + ('...' if len(raw_content) > 200 else '')
-        
+        normalized = normalize_status(status)
+        content_snippet = normalized.text[:200] + ('...' if len(normalized.text) > 200 else '')
+
         if sentiment == "positive":
             emoji = "📈"
             impact_type = "POSITIVE"
         else:
             emoji = "📉"
             impact_type = "NEGATIVE"
-            
+
         title = f"🚨 {impact_type} IMPACT {emoji}"
         message = f"User: @{username}\nContent: {content_snippet}\n\nReasoning: {reasoning}"
-        tags = ["market", sentiment]
-        
-        return title, message, tags 
\ No newline at end of file
+        tags = ["market", sentiment] + ["$" + cashtag for cashtag in normalized.cashtags]
+
+        return title, message, tags
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Holds up to capacity tokens and refills at rate tokens per second. acquire() blocks
+    until enough tokens are available; acquire_async() waits with asyncio.sleep instead.
+    """
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens if they are available right now.
+
+        Returns:
+            bool: True if the tokens were taken
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """
+        Block until tokens are available, then take them.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            wait = self._take_or_wait(tokens)
+            if wait is None:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, tokens=1):
+        """
+        Wait without blocking the event loop until tokens are available, then take them.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            wait = self._take_or_wait(tokens)
+            if wait is None:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def _take_or_wait(self, tokens):
+        """Take tokens if available and return None, otherwise return the seconds until they will be."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return None
+            return (tokens - self._tokens) / self.rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
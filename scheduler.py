@@ -1,41 +1,338 @@
+import asyncio
 import logging
 import datetime
+import random
 import time
 
 import pytz
 
+SCHEDULER_POLICIES = ("fixed", "adaptive")
+
+# truthbrush sleeps inside the request once 50 or fewer requests remain, blocking the caller
+# until the limit resets, so polls are held until the reset a little before that point
+RATE_LIMIT_LOW_WATERMARK = 60
+
+def parse_market_windows(spec):
+    """
+    Parse a comma-separated list of HH:MM-HH:MM windows.
+
+    Args:
+        spec (str): e.g. "08:00-10:00,15:45-16:15"
+
+    Returns:
+        list: (start_minute, end_minute) tuples, minutes since midnight. Invalid entries are skipped.
+    """
+    windows = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            start, end = part.split("-")
+            start_hour, start_minute = (int(x) for x in start.split(":"))
+            end_hour, end_minute = (int(x) for x in end.split(":"))
+            window = (start_hour * 60 + start_minute, end_hour * 60 + end_minute)
+            if not (0 <= window[0] < window[1] <= 24 * 60):
+                raise ValueError("window must fall within one day and start before it ends")
+            windows.append(window)
+        except ValueError as e:
+            logging.error(f"Ignoring invalid market window '{part}': {e}")
+    return windows
+
 class Scheduler:
-    def __init__(self, poll_start_hour, poll_end_hour, poll_interval_seconds, timezone):
+    def __init__(self, poll_start_hour, poll_end_hour, poll_interval_seconds, timezone,
+                 policy="fixed", min_interval_seconds=30, max_interval_seconds=900,
+                 burst_interval_seconds=30, burst_duration_seconds=900, backoff_factor=1.5,
+                 jitter_ratio=0.1, market_windows=None, market_interval_seconds=60):
         self.poll_start_hour = poll_start_hour
         self.poll_end_hour = poll_end_hour
         self.poll_interval_seconds = poll_interval_seconds
         self.timezone = pytz.timezone(timezone)
-        
+
+        if policy not in SCHEDULER_POLICIES:
+            raise ValueError(f"Unknown scheduler policy '{policy}'. Expected one of {SCHEDULER_POLICIES}.")
+        self.policy = policy
+        self.min_interval_seconds = min_interval_seconds
+        self.max_interval_seconds = max(max_interval_seconds, poll_interval_seconds)
+        self.burst_interval_seconds = burst_interval_seconds
+        self.burst_duration_seconds = burst_duration_seconds
+        self.backoff_factor = backoff_factor
+        self.jitter_ratio = jitter_ratio
+        self.market_windows = market_windows or []
+        self.market_interval_seconds = market_interval_seconds
+
+        # Adaptive state
+        self.current_interval_seconds = poll_interval_seconds
+        self.last_new_status_at = None
+        self.rate_limited_until = None
+
+        # Observability
+        self.started_at = time.time()
+        self.polls = 0
+        self.polls_with_new_statuses = 0
+        self.rate_limited_polls = 0
+        self.interval_sum = 0.0
+        self.interval_square_sum = 0.0
+        self.intervals = 0
+
     def is_within_polling_hours(self):
         """Check if the current time is within the allowed polling hours in ET."""
         now_et = datetime.datetime.now(self.timezone)
         return self.poll_start_hour <= now_et.hour < self.poll_end_hour
-        
+
+    def is_within_market_window(self):
+        """Check if the current time falls inside one of the configured market-sensitive windows."""
+        now = datetime.datetime.now(self.timezone)
+        minute_of_day = now.hour * 60 + now.minute
+        return any(start <= minute_of_day < end for start, end in self.market_windows)
+
+    def record_poll(self, new_statuses, rate_limit_remaining=None, rate_limit_reset=None):
+        """
+        Feed the result of a poll back into the adaptive policy.
+
+        Args:
+            new_statuses (int): Number of new statuses the poll returned
+            rate_limit_remaining (int, optional): Remaining requests reported by the API
+            rate_limit_reset (float, optional): Epoch seconds when the rate limit resets
+        """
+        now = time.time()
+        self.polls += 1
+
+        if new_statuses:
+            self.polls_with_new_statuses += 1
+            self.last_new_status_at = now
+            self.current_interval_seconds = self.poll_interval_seconds
+        else:
+            self.current_interval_seconds = min(
+                self.current_interval_seconds * self.backoff_factor,
+                self.max_interval_seconds
+            )
+
+        if rate_limit_reset is not None and rate_limit_remaining is not None and rate_limit_remaining <= RATE_LIMIT_LOW_WATERMARK \
+                and rate_limit_reset > now:
+            self.rate_limited_polls += 1
+            self.rate_limited_until = rate_limit_reset
+            logging.warning(f"Rate limit nearly exhausted ({rate_limit_remaining} requests left). Holding polls until {datetime.datetime.fromtimestamp(self.rate_limited_until, self.timezone).strftime('%H:%M:%S %Z')}.")
+
+    def next_interval(self):
+        """
+        Compute the next in-window polling interval for the configured policy.
+
+        The adaptive policy polls at burst_interval_seconds for burst_duration_seconds after a
+        new status, backs off exponentially towards max_interval_seconds while quiet, never
+        exceeds market_interval_seconds inside a market window, adds +/- jitter_ratio jitter
+        and always waits out an exhausted rate limit. The fixed policy polls every
+        poll_interval_seconds but waits out the rate limit too.
+
+        Returns:
+            float: Seconds to sleep
+        """
+        now = time.time()
+        if self.policy == "fixed":
+            interval = float(self.poll_interval_seconds)
+        else:
+            if self.last_new_status_at is not None and now - self.last_new_status_at < self.burst_duration_seconds:
+                interval = self.burst_interval_seconds
+            else:
+                interval = self.current_interval_seconds
+
+            if self.is_within_market_window():
+                interval = min(interval, self.market_interval_seconds)
+
+            interval = max(interval, self.min_interval_seconds)
+            interval *= 1 + random.uniform(-self.jitter_ratio, self.jitter_ratio)
+
+        if self.rate_limited_until is not None and self.rate_limited_until > now:
+            interval = max(interval, self.rate_limited_until - now)
+
+        return interval
+
     def sleep_until_next_run(self):
         """
         Sleep until the next run time.
-        If within polling hours, sleep for the polling interval.
+        If within polling hours, sleep for the interval chosen by the scheduling policy.
         If outside polling hours, sleep until the start of the next polling window.
-        
+
         Returns:
             float: The sleep duration in seconds
         """
+        duration = self.seconds_until_next_run()
+        time.sleep(duration)
+        return duration
+
+    def seconds_until_next_run(self):
+        """
+        Compute (and record) how long to wait before the next run, without sleeping.
+        Used by sleep_until_next_run and by the asyncio runtime.
+
+        Returns:
+            float: Seconds to wait
+        """
         if self.is_within_polling_hours():
-            logging.debug(f"Check complete. Sleeping for {self.poll_interval_seconds} seconds.")
-            time.sleep(self.poll_interval_seconds)
-            return self.poll_interval_seconds
+            interval = self.next_interval()
+            self.record_interval(interval)
+            logging.debug(f"Check complete. Sleeping for {interval:.1f} seconds.")
+            return interval
         else:
             now = datetime.datetime.now(self.timezone)
             start_time_today = now.replace(hour=self.poll_start_hour, minute=0, second=0, microsecond=0)
             start_time_tomorrow = start_time_today + datetime.timedelta(days=1)
             next_run_time = start_time_today if now < start_time_today else start_time_tomorrow
             sleep_duration = max((next_run_time - now).total_seconds(), 1)
-            
+
             logging.info(f"Outside polling hours. Sleeping until ~{next_run_time.strftime('%Y-%m-%d %H:%M:%S %Z')} ({sleep_duration:.0f} seconds)...")
-            time.sleep(sleep_duration)
-            return sleep_duration 
\ No newline at end of file
+            return sleep_duration
+
+    def stats(self):
+        """
+        Summarize request volume and expected detection latency.
+
+        Expected detection latency is E[I^2] / (2 * E[I]) over the in-window intervals
+        slept so far: the mean wait between a post landing and the next poll.
+
+        Returns:
+            dict: Scheduler statistics
+        """
+        uptime_hours = max(time.time() - self.started_at, 1) / 3600
+        mean_interval = self.interval_sum / self.intervals if self.intervals else None
+        expected_latency = self.interval_square_sum / (2 * self.interval_sum) if self.interval_sum else None
+        return {
+            "policy": self.policy,
+            "polls": self.polls,
+            "polls_with_new_statuses": self.polls_with_new_statuses,
+            "rate_limited_polls": self.rate_limited_polls,
+            "polls_per_hour": self.polls / uptime_hours,
+            "mean_interval_seconds": mean_interval,
+            "expected_detection_latency_seconds": expected_latency,
+            "current_interval_seconds": self.current_interval_seconds,
+        }
+
+    def record_interval(self, interval):
+        """
+        Count an in-window wait towards stats(). Callers that pick the next poll time
+        themselves from next_interval() record it here; seconds_until_next_run() does so itself.
+
+        Args:
+            interval (float): The wait before the next poll, in seconds
+        """
+        self.intervals += 1
+        self.interval_sum += interval
+        self.interval_square_sum += interval * interval
+
+class MultiHandleScheduler:
+    """
+    Spreads polls for several handles across time instead of hitting them all at once.
+
+    Each handle gets its own Scheduler (so burst/backoff state is tracked per handle) and a
+    next-due timestamp. First polls are staggered evenly across the shortest base interval.
+    When several handles are due, the one with the highest priority is polled first.
+    """
+    def __init__(self, handles, scheduler_factory, priorities=None):
+        if not handles:
+            raise ValueError("At least one handle is required.")
+        self.handles = list(handles)
+        self.priorities = priorities or {}
+        self.schedulers = {handle: scheduler_factory(handle) for handle in self.handles}
+        self.primary = self.schedulers[self.handles[0]]
+        self.next_due = {}
+        self._stagger()
+
+    def wait_for_next_poll(self):
+        """
+        Sleep until the next handle is due, sleeping through any out-of-hours period.
+
+        Returns:
+            str: The handle to poll now
+        """
+        while True:
+            handle, wait = self.next_poll()
+            if wait > 0:
+                if handle is not None:
+                    logging.debug(f"Next poll is @{handle}. Sleeping for {wait:.1f} seconds.")
+                time.sleep(wait)
+            if handle is not None:
+                return handle
+            self._stagger()
+
+    async def wait_for_next_poll_async(self, stop_event=None):
+        """
+        asyncio version of wait_for_next_poll.
+
+        Args:
+            stop_event (asyncio.Event, optional): Cuts the wait short when set
+
+        Returns:
+            str: The handle to poll now, or None if stop_event was set while waiting
+        """
+        while True:
+            handle, wait = self.next_poll()
+            if wait > 0:
+                if handle is not None:
+                    logging.debug(f"Next poll is @{handle}. Sleeping for {wait:.1f} seconds.")
+                if stop_event is None:
+                    await asyncio.sleep(wait)
+                else:
+                    try:
+                        await asyncio.wait_for(stop_event.wait(), timeout=wait)
+                        return None
+                    except asyncio.TimeoutError:
+                        pass
+            if stop_event is not None and stop_event.is_set():
+                return None
+            if handle is not None:
+                return handle
+            self._stagger()
+
+    def next_poll(self):
+        """
+        Pick the next handle to poll without sleeping.
+
+        Returns:
+            tuple: (handle, seconds until it is due). Outside polling hours handle is None and
+                the wait runs until the window opens; ask again after waiting.
+        """
+        if not self.primary.is_within_polling_hours():
+            return None, self.primary.seconds_until_next_run()
+
+        handle = min(self.handles, key=lambda h: (self.next_due[h], -self.priorities.get(h, 0)))
+        return handle, max(self.next_due[handle] - time.time(), 0)
+
+    def record_poll(self, handle, new_statuses, rate_limit_remaining=None, rate_limit_reset=None):
+        """
+        Record a poll for a handle and schedule its next one.
+
+        The rate limit belongs to the shared session, so a nearly exhausted limit holds every handle.
+        """
+        scheduler = self.schedulers[handle]
+        scheduler.record_poll(new_statuses, rate_limit_remaining, rate_limit_reset)
+
+        interval = scheduler.next_interval()
+        scheduler.record_interval(interval)
+        self.next_due[handle] = time.time() + interval
+
+        if scheduler.rate_limited_until is not None:
+            for other_handle, other in self.schedulers.items():
+                other.rate_limited_until = max(other.rate_limited_until or 0, scheduler.rate_limited_until)
+                self.next_due[other_handle] = max(self.next_due[other_handle], scheduler.rate_limited_until)
+
+    def defer(self, handle):
+        """
+        Push a handle's next poll back by its base interval without recording a poll, e.g.
+        while its previous poll is still being processed. record_poll reschedules it as usual.
+        """
+        self.next_due[handle] = time.time() + self.schedulers[handle].poll_interval_seconds
+
+    def stats(self):
+        """
+        Returns:
+            dict: Handle -> Scheduler.stats()
+        """
+        return {handle: scheduler.stats() for handle, scheduler in self.schedulers.items()}
+
+    def _stagger(self):
+        """Spread the next poll of every handle evenly, highest priority first."""
+        now = time.time()
+        ordered = sorted(self.handles, key=lambda h: -self.priorities.get(h, 0))
+        spread = min(s.poll_interval_seconds for s in self.schedulers.values()) / len(ordered)
+        for position, handle in enumerate(ordered):
+            self.next_due[handle] = now + position * spread
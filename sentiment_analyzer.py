@@ -1,6 +1,41 @@
+import asyncio
 import json
 import logging
-import openai
+import threading
+import time
+from collections import namedtuple
+
+from analysis_cache import AnalysisCache
+from metrics import REGISTRY
+from rate_limiter import TokenBucket
+from structured_output import compile_validator
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Bump whenever SYSTEM_PROMPT changes meaning so cached results from the old prompt are not reused
+PROMPT_VERSION = "3"
+
+VALID_SENTIMENTS = ["positive", "negative", "neutral"]
+
+# "json_schema" uses strict structured outputs; "json_object" is for models/endpoints without it
+OUTPUT_MODES = ("json_schema", "json_object")
+
+# Reasoning is capped in the prompt and truncated here, which keeps responses (and max_tokens) small
+MAX_REASONING_CHARS = 200
+MAX_COMPLETION_TOKENS = 100
+
+# An invalid response is retried once before the analysis fails
+MAX_ATTEMPTS = 2
+
+# sentiment: 'positive', 'negative' or 'neutral'; significant: whether it is market-moving;
+# reasoning: a brief explanation; confidence: the model's confidence, from 0.0 to 1.0
+AnalysisResult = namedtuple("AnalysisResult", ["sentiment", "significant", "reasoning", "confidence"])
+
+# Empty text is certainly neutral
+EMPTY_RESULT = AnalysisResult("neutral", False, "", 1.0)
+
+# Rough characters-per-token ratio used to keep batches inside the token budget
+CHARS_PER_TOKEN = 4
 
 SYSTEM_PROMPT = """You are an AI assistant specialized in financial market sentiment analysis. The ONLY input you will ever receive is a tweet from Donald Trump.
 
@@ -21,72 +56,552 @@ Examples that are NOT significant (mark as false):
 - "Fake news about the economy!"
 - Any tweet that is opinion, threat, speculation, or routine commentary—even if it causes news coverage or social media discussion.
 
-Also, provide a brief reasoning (1-2 sentences) explaining why you believe this will influence the broader market.
+Also, provide a brief reasoning (1-2 sentences, at most 200 characters) explaining why you believe this will influence the broader market.
+
+Finally, rate your confidence in the sentiment and significance classification from 0.0 (a guess) to 1.0 (certain).
 
-Respond ONLY with a JSON object containing three keys:
+Respond ONLY with a JSON object containing four keys:
 - "sentiment" (string): "positive", "negative", or "neutral"
 - "significant" (boolean): true or false
 - "reasoning" (string): brief explanation of market impact
+- "confidence" (number): confidence in the classification, from 0.0 to 1.0
+
+Example (significant): {"sentiment": "negative", "significant": true, "reasoning": "A tweet confirming the immediate signing of a major tariff order will likely cause a broad market sell-off due to increased trade tensions.", "confidence": 0.95}
+Example (not significant): {"sentiment": "negative", "significant": false, "reasoning": "A critical opinion about the Federal Reserve is unlikely to have a direct, immediate impact on the broader market.", "confidence": 0.9}
+"""
 
-Example (significant): {"sentiment": "negative", "significant": true, "reasoning": "A tweet confirming the immediate signing of a major tariff order will likely cause a broad market sell-off due to increased trade tensions."}
-Example (not significant): {"sentiment": "negative", "significant": false, "reasoning": "A critical opinion about the Federal Reserve is unlikely to have a direct, immediate impact on the broader market."}
+BATCH_INSTRUCTIONS = """
+BATCH MODE: Instead of a single tweet, you will receive a JSON array of objects, each with an integer "id" and a "text" field containing one tweet. Analyze every tweet independently using the rules above.
+
+Respond ONLY with a JSON object with a single key "results" whose value is an array containing exactly one object per input tweet, each with five keys:
+- "id" (integer): the id of the tweet, copied from the input
+- "sentiment" (string): "positive", "negative", or "neutral"
+- "significant" (boolean): true or false
+- "reasoning" (string): brief explanation of market impact
+- "confidence" (number): confidence in the classification, from 0.0 to 1.0
 """
 
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT + BATCH_INSTRUCTIONS
+
+RESULT_PROPERTIES = {
+    "sentiment": {"type": "string", "enum": VALID_SENTIMENTS},
+    "significant": {"type": "boolean"},
+    "reasoning": {"type": "string"},
+    "confidence": {"type": "number"},
+}
+
+RESULT_SCHEMA = {
+    "type": "object",
+    "properties": RESULT_PROPERTIES,
+    "required": list(RESULT_PROPERTIES),
+    "additionalProperties": False,
+}
+
+BATCH_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": dict({"id": {"type": "integer"}}, **RESULT_PROPERTIES),
+    "required": ["id"] + list(RESULT_PROPERTIES),
+    "additionalProperties": False,
+}
+
+BATCH_RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {"results": {"type": "array", "items": BATCH_ITEM_SCHEMA}},
+    "required": ["results"],
+    "additionalProperties": False,
+}
+
+# Strict mode never returns extra keys; in json_object mode they are harmless, so they are ignored
+RESULT_VALIDATOR = compile_validator(RESULT_SCHEMA, allow_additional_properties=True)
+BATCH_ITEM_VALIDATOR = compile_validator(BATCH_ITEM_SCHEMA, allow_additional_properties=True)
+# Items are checked one by one so a single bad item only costs that item a retry
+BATCH_ENVELOPE_VALIDATOR = compile_validator({"type": "object", "properties": {"results": {"type": "array"}}, "required": ["results"]})
+
+OPENAI_REQUEST_SECONDS = REGISTRY.histogram("stonk_openai_request_seconds", "OpenAI chat completion latency", ("kind", "model", "outcome"))
+OPENAI_TOKENS = REGISTRY.counter("stonk_openai_tokens_total", "OpenAI tokens used", ("kind", "model", "type"))
+OPENAI_INVALID_RESPONSES = REGISTRY.counter("stonk_openai_invalid_responses_total", "OpenAI responses that failed schema validation", ("kind",))
+OPENAI_RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram("stonk_openai_rate_limit_wait_seconds", "Time spent waiting on the OpenAI rate limiter")
+
+class InvalidOutputError(ValueError):
+    """The model's response was empty, not JSON, or did not match the expected schema."""
+
+class AnalysisFailedError(Exception):
+    """
+    No valid answer could be obtained (API error, or invalid output after MAX_ATTEMPTS).
+    Callers must treat the status as not analyzed and retry it later, never as neutral.
+    """
+
 class SentimentAnalyzer:
-    def __init__(self, api_key):
+    def __init__(self, api_key, cache: AnalysisCache = None, model=DEFAULT_MODEL, max_batch_size=8, batch_token_budget=2000, rate_limiter: TokenBucket = None, base_url=None, output_mode="json_schema"):
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode '{output_mode}'. Expected one of {OUTPUT_MODES}.")
         self.api_key = api_key
-        self.open_api_client = openai.OpenAI(api_key=self.api_key)
+        self.model = model
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.max_batch_size = max(max_batch_size, 1)
+        self.batch_token_budget = batch_token_budget
+        self.output_mode = output_mode
+        self.base_url = base_url
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def open_api_client(self):
+        """The OpenAI client, created on first use; importing openai is the slowest part of startup."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._make_client(self.base_url)
+        return self._client
+
+    def warm_up(self):
+        """
+        Create the client and open a pooled connection to the API with one cheap request,
+        so the first analysis does not pay for the import, DNS and TLS handshake.
+        """
+        self.open_api_client.models.retrieve(self.model)
         
-    def analyze(self, status_text_html):
+    def analyze(self, status_text_html, model=None):
         """
         Analyzes sentiment using OpenAI for stock market impact.
+        Results are served from the analysis cache when one is configured.
+
+        Args:
+            status_text_html (str): The status text
+            model (str, optional): Model for this call. Defaults to the analyzer's model.
         
         Returns:
-            tuple: (sentiment, significant, reasoning)
+            AnalysisResult: (sentiment, significant, reasoning, confidence)
                 sentiment (str): 'positive', 'negative', or 'neutral'
                 significant (bool): True if the sentiment is significant, False otherwise
                 reasoning (str): A brief explanation of the reasoning
+                confidence (float): 0.0 to 1.0
+
+        Raises:
+            AnalysisFailedError: If OpenAI failed or kept returning invalid output
         """
-        if not status_text_html or not status_text_html.strip():
-            logging.info("Empty input text received for sentiment analysis; returning default values.")
-            return "neutral", False, ""
+        return self._analyze(status_text_html, model or self.model)
+
+    def analyze_batch(self, texts, model=None):
+        """
+        Analyzes several statuses, packing as many as fit into each OpenAI request.
+
+        Cached and empty texts are answered without a request. The rest are grouped by
+        plan_batches and sent with BATCH_SYSTEM_PROMPT. Any item that is missing or
+        malformed in a batch response falls back to a single request.
+
+        Args:
+            texts (list): Status texts to analyze
+            model (str, optional): Model for this call. Defaults to the analyzer's model.
+
+        Returns:
+            list: One AnalysisResult per input text, in input order
+
+        Raises:
+            AnalysisFailedError: If any text could not be analyzed. Results that did come
+                back are cached, so retrying the batch only pays for the failed texts.
+        """
+        return self._analyze_batch(texts, model or self.model)
+
+    def _analyze(self, status_text_html, model):
+        cache_key, early_result = self._precheck(status_text_html, model)
+        if early_result is not None:
+            return early_result
+        return self._exchange("single", model, self._single_exchange(status_text_html, cache_key))
+
+    def _analyze_batch(self, texts, model):
+        results, cache_keys, pending = self._batch_precheck(texts, model)
+
+        for group in self.plan_batches([texts[index] for index in pending]):
+            indices = [pending[position] for position in group]
+            if len(indices) > 1:
+                batch_results = self._exchange("batch", model, self._batch_exchange([texts[index] for index in indices]))
+                indices = self._apply_batch(indices, batch_results, results, cache_keys)
+            for index in indices:
+                results[index] = self._analyze(texts[index], model)
+
+        return results
+
+    def plan_batches(self, texts):
+        """
+        Group texts into batches bounded by max_batch_size and batch_token_budget.
+        A text that alone exceeds the budget gets a batch of its own.
+
+        Args:
+            texts (list): Status texts to group
+
+        Returns:
+            list: Lists of indices into texts, one list per request
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+
+        for index, text in enumerate(texts):
+            tokens = len(text) // CHARS_PER_TOKEN + 1
+            if current and (len(current) >= self.max_batch_size or current_tokens + tokens > self.batch_token_budget):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(index)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def _make_client(self, base_url):
+        import openai
+        return openai.OpenAI(api_key=self.api_key, base_url=base_url)
+
+    def _exchange(self, kind, model, exchange):
+        """
+        Drive an exchange generator: send each request it yields and hand back the
+        response, or throw in the error the request raised.
+
+        Returns:
+            The exchange's return value
+        """
+        try:
+            request = next(exchange)
+            while True:
+                try:
+                    response = self._create_completion(kind, model, **request)
+                except Exception as e:
+                    request = exchange.throw(e)
+                else:
+                    request = exchange.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+    def _single_exchange(self, text, cache_key):
+        """
+        The request, validate and retry loop for one status, shared by the sync and async
+        analyzers. Yields each request's arguments and receives its response.
+
+        Returns:
+            AnalysisResult: The validated result
+
+        Raises:
+            AnalysisFailedError: If the request failed or the output stayed invalid
+        """
+        request = self._single_request(text)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                response = yield request
+            except Exception as e:
+                logging.error(f"OpenAI API call failed: {e}")
+                raise AnalysisFailedError(f"OpenAI API call failed: {e}") from e
+            try:
+                return self._parse_single(response, cache_key)
+            except InvalidOutputError as e:
+                self._log_invalid("single", e, attempt)
+                error = e
+
+        raise AnalysisFailedError(f"Invalid response after {MAX_ATTEMPTS} attempts: {error}")
+
+    def _batch_exchange(self, texts):
+        """
+        The loop for one batched request, retried once if the response is invalid as a
+        whole. A failed request is not retried here; its items fall back to single requests.
 
-        log_text = status_text_html[:150] + ('...' if len(status_text_html) > 150 else '')
-        logging.info(f"Analyzing HTML content: '{log_text}'")
-        sentiment = "neutral"
-        significant = False
-        reasoning = ""
+        Returns:
+            dict: Position in texts -> validated AnalysisResult, for every well-formed item
+        """
+        logging.info(f"Analyzing batch of {len(texts)} statuses in one request.")
+        request = self._batch_request(texts)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                response = yield request
+            except Exception as e:
+                logging.error(f"OpenAI batch API call failed: {e}")
+                break
+            try:
+                return self._parse_batch(response, len(texts))
+            except InvalidOutputError as e:
+                self._log_invalid("batch", e, attempt)
+        return {}
+
+    def _apply_batch(self, indices, batch_results, results, cache_keys):
+        """
+        Fill results from one batch response and cache the answers.
 
+        Returns:
+            list: The indices the response had no well-formed answer for
+        """
+        missing = []
+        for position, index in enumerate(indices):
+            result = batch_results.get(position)
+            if result is None:
+                logging.warning(f"Batch response missing or malformed for item {position}; falling back to a single request.")
+                missing.append(index)
+            else:
+                self._cache_put(cache_keys.get(index), result)
+                results[index] = result
+        return missing
+
+    def _create_completion(self, kind, model, **kwargs):
+        """
+        Wait for the rate limiter, then send one chat completion request, recording
+        latency and token usage.
+
+        Args:
+            kind (str): "single" or "batch", used as a metric label
+            model (str): The model to call
+            **kwargs: Passed through to chat.completions.create
+
+        Returns:
+            The OpenAI response
+        """
+        if self.rate_limiter is not None:
+            OPENAI_RATE_LIMIT_WAIT_SECONDS.observe(self.rate_limiter.acquire())
+
+        started = time.perf_counter()
         try:
-            response = self.open_api_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": status_text_html}
-                ],
-                temperature=1.0,
-                max_tokens=150,
-                response_format={"type": "json_object"}
-            )
-            content = response.choices[0].message.content
-            logging.debug(f"OpenAI raw response: {content}")
-            result = json.loads(content)
-            sentiment = result.get("sentiment", "neutral").lower()
-            significant = result.get("significant", False)
-            reasoning = result.get("reasoning", "")
-
-            if sentiment not in ["positive", "negative", "neutral"]:
-                logging.warning(f"Received unexpected sentiment value: {sentiment}. Defaulting.")
-                sentiment = "neutral"
-            if not isinstance(significant, bool):
-                logging.warning(f"Received non-boolean significance value: {significant}. Defaulting.")
-                significant = False
-
-            logging.info(f"Analysis result: Sentiment='{sentiment}', Significant={significant}, Reasoning='{reasoning}'")
+            response = self.open_api_client.chat.completions.create(model=model, **kwargs)
+        except Exception:
+            OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - started, kind=kind, model=model, outcome="error")
+            raise
+        self._record_response(kind, model, started, response)
+        return response
+
+    def _record_response(self, kind, model, started, response):
+        OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - started, kind=kind, model=model, outcome="ok")
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            OPENAI_TOKENS.inc(usage.prompt_tokens or 0, kind=kind, model=model, type="prompt")
+            OPENAI_TOKENS.inc(usage.completion_tokens or 0, kind=kind, model=model, type="completion")
+
+    def _log_invalid(self, kind, error, attempt):
+        OPENAI_INVALID_RESPONSES.inc(kind=kind)
+        if attempt < MAX_ATTEMPTS:
+            logging.warning(f"Invalid {kind} response from OpenAI ({error}). Retrying.")
+        else:
+            logging.error(f"Invalid {kind} response from OpenAI after {attempt} attempts ({error}). Giving up.")
+
+    def _precheck(self, text, model):
+        """
+        Answer empty and cached texts without a request.
+
+        Returns:
+            tuple: (cache_key, result); result is None when the text needs a request
+        """
+        if not text or not text.strip():
+            logging.info("Empty input text received for sentiment analysis; returning default values.")
+            return None, EMPTY_RESULT
+
+        cache_key, cached = self._cache_lookup(text, model)
+        if cached is not None:
+            logging.info(f"Analysis cache hit: Sentiment='{cached.sentiment}', Significant={cached.significant}")
+            return cache_key, cached
+
+        log_text = text[:150] + ('...' if len(text) > 150 else '')
+        logging.info(f"Analyzing HTML content with {model}: '{log_text}'")
+        return cache_key, None
+
+    def _batch_precheck(self, texts, model):
+        """
+        Answer empty and cached texts of a batch without a request.
+
+        Returns:
+            tuple: (results list with None for pending texts, index -> cache key, pending indices)
+        """
+        results = [None] * len(texts)
+        cache_keys = {}
+        pending = []
+
+        for index, text in enumerate(texts):
+            if not text or not text.strip():
+                results[index] = EMPTY_RESULT
+                continue
+            cache_key, cached = self._cache_lookup(text, model)
+            if cached is not None:
+                results[index] = cached
+                continue
+            cache_keys[index] = cache_key
+            pending.append(index)
+
+        return results, cache_keys, pending
+
+    def _single_request(self, text):
+        """Build the chat.completions.create arguments for one status."""
+        return {
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": text}
+            ],
+            "temperature": 0,
+            "max_tokens": MAX_COMPLETION_TOKENS,
+            "response_format": self._response_format("sentiment_result", RESULT_SCHEMA),
+        }
+
+    def _batch_request(self, texts):
+        """Build the chat.completions.create arguments for a batch of statuses."""
+        payload = json.dumps([{"id": index, "text": text} for index, text in enumerate(texts)], ensure_ascii=False)
+        return {
+            "messages": [
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": payload}
+            ],
+            "temperature": 0,
+            "max_tokens": MAX_COMPLETION_TOKENS * len(texts),
+            "response_format": self._response_format("sentiment_batch_result", BATCH_RESULT_SCHEMA),
+        }
+
+    def _response_format(self, name, schema):
+        if self.output_mode == "json_schema":
+            return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+        return {"type": "json_object"}
 
+    def _parse_single(self, response, cache_key):
+        """
+        Validate a single-status response and cache it.
+
+        Raises:
+            InvalidOutputError: If the response does not match RESULT_SCHEMA
+        """
+        result = self._result(self._decode(response, RESULT_VALIDATOR))
+        sentiment, significant, reasoning, confidence = result
+        logging.info(f"Analysis result: Sentiment='{sentiment}', Significant={significant}, Confidence={confidence:.2f}, Reasoning='{reasoning}'")
+
+        # Only answers that actually came back from the model ever reach the cache
+        self._cache_put(cache_key, result)
+        return result
+
+    def _parse_batch(self, response, count):
+        """
+        Returns:
+            dict: Position -> validated AnalysisResult, for every well-formed item
+
+        Raises:
+            InvalidOutputError: If the response has no results array
+        """
+        results = {}
+        for item in self._decode(response, BATCH_ENVELOPE_VALIDATOR)["results"]:
+            errors = BATCH_ITEM_VALIDATOR(item)
+            if errors:
+                logging.warning(f"Skipping invalid batch item: {'; '.join(errors[:3])}")
+                continue
+            if not 0 <= item["id"] < count or item["id"] in results:
+                continue
+            results[item["id"]] = self._result(item)
+
+        logging.info(f"Batch analysis returned {len(results)}/{count} well-formed results.")
+        return results
+
+    def _decode(self, response, validator):
+        """
+        Decode and validate the response content.
+
+        Raises:
+            InvalidOutputError: If the content is missing, not JSON, or fails the validator
+        """
+        message = response.choices[0].message
+        content = message.content
+        logging.debug(f"OpenAI raw response: {content}")
+        if content is None:
+            raise InvalidOutputError(f"no content (refusal: {getattr(message, 'refusal', None)})")
+        try:
+            value = json.loads(content)
         except json.JSONDecodeError as e:
-            logging.error(f"Failed to decode JSON response from OpenAI: {e} - Response: {content}")
-        except (openai.APIError, openai.APITimeoutError, openai.RateLimitError, Exception) as e:
-            logging.error(f"OpenAI API call failed: {e}")
+            raise InvalidOutputError(f"not JSON: {e} - Response: {content}")
+        errors = validator(value)
+        if errors:
+            raise InvalidOutputError("; ".join(errors[:3]))
+        return value
+
+    def _cache_lookup(self, text, model):
+        """
+        Returns:
+            tuple: (cache_key, cached_result); both None when caching is disabled
+        """
+        if self.cache is None:
+            return None, None
+        cache_key = AnalysisCache.make_key(text, PROMPT_VERSION, model)
+        cached = self.cache.get(cache_key)
+        # The on-disk tier hands back plain tuples
+        return cache_key, AnalysisResult(*cached) if cached is not None else None
+
+    def _cache_put(self, cache_key, result):
+        if cache_key is not None:
+            self.cache.put(cache_key, result)
+
+    def _result(self, result):
+        """Turn a validated result object into an AnalysisResult."""
+        reasoning = result["reasoning"]
+        if len(reasoning) > MAX_REASONING_CHARS:
+            reasoning = reasoning[:MAX_REASONING_CHARS - 3].rstrip() + "..."
+        confidence = min(max(float(result["confidence"]), 0.0), 1.0)
+        return AnalysisResult(result["sentiment"], result["significant"], reasoning, confidence)
+
+class AsyncSentimentAnalyzer(SentimentAnalyzer):
+    """
+    SentimentAnalyzer on AsyncOpenAI for the asyncio runtime. Same prompts, cache, batching,
+    validation and retries; analyze() and analyze_batch() are coroutines, and the batches of
+    one analyze_batch() call are sent concurrently.
+    """
+    def _make_client(self, base_url):
+        import openai
+        return openai.AsyncOpenAI(api_key=self.api_key, base_url=base_url)
+
+    async def analyze(self, status_text_html, model=None):
+        return await self._analyze(status_text_html, model or self.model)
+
+    async def analyze_batch(self, texts, model=None):
+        return await self._analyze_batch(texts, model or self.model)
+
+    async def warm_up(self):
+        await self.open_api_client.models.retrieve(self.model)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
 
-        return sentiment, significant, reasoning 
\ No newline at end of file
+    async def _analyze(self, status_text_html, model):
+        cache_key, early_result = self._precheck(status_text_html, model)
+        if early_result is not None:
+            return early_result
+        return await self._exchange("single", model, self._single_exchange(status_text_html, cache_key))
+
+    async def _analyze_batch(self, texts, model):
+        results, cache_keys, pending = self._batch_precheck(texts, model)
+
+        async def run_group(indices):
+            if len(indices) > 1:
+                batch_results = await self._exchange("batch", model, self._batch_exchange([texts[index] for index in indices]))
+                indices = self._apply_batch(indices, batch_results, results, cache_keys)
+            for index in indices:
+                results[index] = await self._analyze(texts[index], model)
+
+        await asyncio.gather(*(
+            run_group([pending[position] for position in group])
+            for group in self.plan_batches([texts[index] for index in pending])
+        ))
+        return results
+
+    async def _exchange(self, kind, model, exchange):
+        try:
+            request = next(exchange)
+            while True:
+                try:
+                    response = await self._create_completion(kind, model, **request)
+                except Exception as e:
+                    request = exchange.throw(e)
+                else:
+                    request = exchange.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+    async def _create_completion(self, kind, model, **kwargs):
+        if self.rate_limiter is not None:
+            OPENAI_RATE_LIMIT_WAIT_SECONDS.observe(await self.rate_limiter.acquire_async())
+
+        started = time.perf_counter()
+        try:
+            response = await self.open_api_client.chat.completions.create(model=model, **kwargs)
+        except Exception:
+            OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - started, kind=kind, model=model, outcome="error")
+            raise
+        self._record_response(kind, model, started, response)
+        return response
@@ -0,0 +1,83 @@
+"""
+Minimal JSON Schema support for the structured-output responses.
+
+compile_validator() turns a schema into a plain Python function once, at import time,
+so each response is checked without re-walking the schema. Only the subset used by
+the analyzer's schemas is supported: object (properties, required,
+additionalProperties: false), array (items), string (enum, maxLength), boolean,
+integer and number.
+"""
+
+_TYPE_CHECKS = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "boolean": lambda value: isinstance(value, bool),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+}
+
+def compile_validator(schema, allow_additional_properties=False):
+    """
+    Compile a schema into a validator.
+
+    Args:
+        schema (dict): A JSON schema using the supported subset
+        allow_additional_properties (bool): Ignore additionalProperties: false, so unknown
+            keys are tolerated instead of rejected
+
+    Returns:
+        callable: validator(value, path="$") -> list of error strings, empty when valid
+    """
+    schema_type = schema.get("type")
+    if schema_type not in _TYPE_CHECKS:
+        raise ValueError(f"Unsupported schema type: {schema_type}")
+    type_check = _TYPE_CHECKS[schema_type]
+    checks = []
+
+    if "enum" in schema:
+        allowed = tuple(schema["enum"])
+        checks.append(lambda value, path: [] if value in allowed else [f"{path}: {value!r} is not one of {list(allowed)}"])
+
+    if "maxLength" in schema:
+        max_length = schema["maxLength"]
+        checks.append(lambda value, path: [] if len(value) <= max_length else [f"{path}: longer than {max_length} characters"])
+
+    if schema_type == "object":
+        properties = {
+            name: compile_validator(subschema, allow_additional_properties)
+            for name, subschema in schema.get("properties", {}).items()
+        }
+        required = tuple(schema.get("required", ()))
+        closed = schema.get("additionalProperties", True) is False and not allow_additional_properties
+
+        def check_object(value, path):
+            errors = [f"{path}: missing required property '{name}'" for name in required if name not in value]
+            for name, item in value.items():
+                validator = properties.get(name)
+                if validator is not None:
+                    errors.extend(validator(item, f"{path}.{name}"))
+                elif closed:
+                    errors.append(f"{path}: unexpected property '{name}'")
+            return errors
+        checks.append(check_object)
+
+    if schema_type == "array" and "items" in schema:
+        item_validator = compile_validator(schema["items"], allow_additional_properties)
+
+        def check_items(value, path):
+            errors = []
+            for index, item in enumerate(value):
+                errors.extend(item_validator(item, f"{path}[{index}]"))
+            return errors
+        checks.append(check_items)
+
+    def validate(value, path="$"):
+        if not type_check(value):
+            return [f"{path}: expected {schema_type}, got {type(value).__name__}"]
+        errors = []
+        for check in checks:
+            errors.extend(check(value, path))
+        return errors
+
+    return validate
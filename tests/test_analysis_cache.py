@@ -0,0 +1,83 @@
+"""AnalysisCache: keys, LRU eviction, TTL expiry and the on-disk tier."""
+from types import SimpleNamespace
+
+import pytest
+
+import analysis_cache
+from analysis_cache import AnalysisCache
+
+RESULT = ("negative", True, "Tariffs.", 0.9)
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable clock in place of time.time() for the cache module."""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(analysis_cache, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+def test_key_covers_text_prompt_version_and_model():
+    key = AnalysisCache.make_key("Big  NEWS\ttoday", "3", "gpt-4o-mini")
+
+    # Renderings that only differ in case and whitespace share a key
+    assert AnalysisCache.make_key(" big news today ", "3", "gpt-4o-mini") == key
+    assert AnalysisCache.make_key("Big news tomorrow", "3", "gpt-4o-mini") != key
+    assert AnalysisCache.make_key("Big news today", "4", "gpt-4o-mini") != key
+    assert AnalysisCache.make_key("Big news today", "3", "gpt-4o") != key
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = AnalysisCache(max_size=2)
+    cache.put("a", RESULT)
+    cache.put("b", RESULT)
+    assert cache.get("a") == RESULT
+    cache.put("c", RESULT)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == RESULT
+    assert cache.get("c") == RESULT
+    assert cache.stats()["evictions"] == 1
+
+def test_entries_expire_after_ttl_in_both_tiers(tmp_path, clock):
+    cache = AnalysisCache(ttl_seconds=60, db_path=str(tmp_path / "cache.db"))
+    cache.put("a", RESULT)
+
+    clock.now += 60
+    assert cache.get("a") == RESULT
+    clock.now += 1
+    assert cache.get("a") is None
+
+    # Expired rows are not served from disk after a restart either
+    cache.close()
+    reopened = AnalysisCache(ttl_seconds=60, db_path=str(tmp_path / "cache.db"))
+    assert reopened.get("a") is None
+    reopened.close()
+
+def test_disk_tier_survives_a_reopen(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = AnalysisCache(db_path=path)
+    cache.put("a", RESULT)
+    cache.close()
+
+    reopened = AnalysisCache(db_path=path)
+    assert reopened.get("a") == RESULT
+    assert reopened.stats()["disk_hits"] == 1
+    # Promoted into memory, so the second lookup does not touch the disk
+    assert reopened.get("a") == RESULT
+    assert reopened.stats()["disk_hits"] == 1
+    reopened.close()
+
+def test_disk_tier_keeps_the_newest_entries(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    cache = AnalysisCache(max_size=1, db_path=path, max_disk_entries=2)
+    for key in ("a", "b", "c"):
+        clock.now += 1
+        cache.put(key, RESULT)
+    cache.close()
+
+    reopened = AnalysisCache(db_path=path)
+    assert [reopened.get(key) is not None for key in ("a", "b", "c")] == [False, True, True]
+    reopened.close()
+
+def test_unusable_database_falls_back_to_memory(tmp_path):
+    cache = AnalysisCache(db_path=str(tmp_path))
+    cache.put("a", RESULT)
+    assert cache.get("a") == RESULT
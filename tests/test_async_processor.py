@@ -0,0 +1,74 @@
+"""Fetch stage scheduling and per-cycle profiling in the asyncio runtime."""
+import asyncio
+
+from async_processor import AsyncStatusProcessor, _Cycle
+from clients.state_store import create_state_store
+from metrics import CycleProfiler
+from processor import CursorTracker
+from scheduler import MultiHandleScheduler, Scheduler
+
+def test_busy_handle_does_not_hold_up_other_handles():
+    scheduler = MultiHandleScheduler(["slow", "fast"], lambda handle: Scheduler(0, 24, 0.05, "UTC"))
+    processor = AsyncStatusProcessor(None, None, None, None, max_workers=1)
+    started = []
+
+    async def start_cycle(handle):
+        started.append(handle)
+        cycle = _Cycle(handle, [], CursorTracker(None, []))
+        if handle == "fast":
+            cycle.done.set()
+            scheduler.record_poll(handle, 0)
+        # The slow handle's cycle stays in the analysis stage for the whole test
+        return cycle
+
+    async def run():
+        processor._stop = asyncio.Event()
+        processor._scheduler = scheduler
+        processor._start_cycle = start_cycle
+        fetching = asyncio.create_task(processor._fetch_stage())
+        await asyncio.sleep(0.5)
+        processor.stop()
+        await asyncio.wait_for(fetching, timeout=2)
+
+    asyncio.run(run())
+    processor.executor.shutdown()
+
+    assert started.count("slow") == 1
+    assert started.count("fast") >= 4
+
+class StubClient:
+    target_handle = "someone"
+
+    def get_new_statuses(self, last_known_id=None, handle=None):
+        return iter([])
+
+    def rate_limit_status(self):
+        return {"rate_limit_remaining": None, "rate_limit_reset": None}
+
+def test_each_cycle_is_profiled_from_fetch_to_finish(tmp_path):
+    state_store = create_state_store(str(tmp_path / "state"))
+    scheduler = MultiHandleScheduler(["a", "b"], lambda handle: Scheduler(0, 24, 60, "UTC"))
+    processor = AsyncStatusProcessor(StubClient(), None, None, state_store, max_workers=1)
+    profiler = CycleProfiler(str(tmp_path / "profiles"))
+    processor._profiler = profiler
+    processor._scheduler = scheduler
+    processor._last_processed_ids = {}
+
+    async def run():
+        processor._analysis_queue = asyncio.Queue()
+        return [await processor._start_cycle(handle) for handle in ("a", "b")]
+
+    cycles = asyncio.run(run())
+    processor.executor.shutdown()
+    state_store.close()
+
+    assert all(cycle.done.is_set() and cycle.profile is not None for cycle in cycles)
+    assert sorted(path.name.rsplit("-", 1)[1] for path in (tmp_path / "profiles").iterdir()) == ["a.prof", "b.prof"]
+
+def test_overlapping_cycle_is_not_profiled(tmp_path):
+    profiler = CycleProfiler(str(tmp_path))
+    first = profiler.start("a")
+    assert profiler.start("b") is None
+    profiler.finish(first)
+    profiler.finish(first)
+    assert [path.name.rsplit("-", 1)[1] for path in tmp_path.iterdir()] == ["a.prof"]
@@ -0,0 +1,99 @@
+"""Cascade routing: escalation to tier 2, and what happens when tier 2 or tier 1 fails."""
+import asyncio
+import json
+
+import pytest
+
+from cascade import AsyncCascadeAnalyzer, CascadeAnalyzer
+from sentiment_analyzer import AnalysisFailedError, AnalysisResult
+
+CONFIDENT = AnalysisResult("neutral", False, "Rally talk.", 0.95)
+UNSURE = AnalysisResult("positive", False, "Maybe a deal.", 0.5)
+SIGNIFICANT = AnalysisResult("negative", True, "Tariffs.", 0.9)
+TIER2 = AnalysisResult("negative", False, "Tier 2 says only talk.", 0.99)
+
+class StubAnalyzer:
+    """
+    Answers tier 1 from tier1_results and tier 2 with TIER2. Like SentimentAnalyzer, a batch
+    fails as a whole when any of its texts fails; failures lists (model, text) pairs, and a
+    None text fails every batch of that model.
+    """
+    max_batch_size = 8
+
+    def __init__(self, tier1_results, failures=()):
+        self.tier1_results = tier1_results
+        self.failures = set(failures)
+        self.calls = []
+
+    def _answer(self, text, model):
+        if (model, text) in self.failures:
+            raise AnalysisFailedError(f"{model} failed for {text}")
+        return self.tier1_results[text] if model == "small" else TIER2
+
+    def analyze(self, text, model=None):
+        self.calls.append(("single", model, [text]))
+        return self._answer(text, model)
+
+    def analyze_batch(self, texts, model=None):
+        self.calls.append(("batch", model, list(texts)))
+        if (model, None) in self.failures:
+            raise AnalysisFailedError(f"{model} batch failed")
+        return [self._answer(text, model) for text in texts]
+
+    def plan_batches(self, texts):
+        return [list(range(len(texts)))]
+
+class AsyncStubAnalyzer(StubAnalyzer):
+    async def analyze(self, text, model=None):
+        return StubAnalyzer.analyze(self, text, model)
+
+    async def analyze_batch(self, texts, model=None):
+        return StubAnalyzer.analyze_batch(self, texts, model)
+
+TEXTS = ["confident", "unsure", "significant"]
+TIER1 = {"confident": CONFIDENT, "unsure": UNSURE, "significant": SIGNIFICANT}
+
+def test_low_confidence_and_significant_answers_are_escalated(tmp_path):
+    log_path = tmp_path / "decisions.jsonl"
+    analyzer = StubAnalyzer(TIER1)
+    cascade = CascadeAnalyzer(analyzer, "small", "large", confidence_threshold=0.8, decision_log_path=str(log_path))
+
+    assert cascade.analyze_batch(TEXTS) == [CONFIDENT, TIER2, TIER2]
+    assert analyzer.calls == [("batch", "small", TEXTS), ("batch", "large", ["unsure", "significant"])]
+
+    decisions = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [decision["reason"] for decision in decisions] == [None, "low_confidence", "significant"]
+    assert decisions[1]["tier1"]["confidence"] == 0.5
+    assert decisions[1]["tier2"]["sentiment"] == "negative"
+
+def test_significant_answers_stay_on_tier_1_when_not_escalated():
+    cascade = CascadeAnalyzer(StubAnalyzer(TIER1), "small", "large", escalate_significant=False)
+    assert cascade.analyze_batch(TEXTS) == [CONFIDENT, TIER2, SIGNIFICANT]
+
+def test_failed_tier_2_batch_is_retried_one_status_at_a_time():
+    analyzer = StubAnalyzer(TIER1, failures={("large", None), ("large", "unsure")})
+    cascade = CascadeAnalyzer(analyzer, "small", "large")
+
+    # Only the status that failed on its own too keeps its tier-1 answer
+    assert cascade.analyze_batch(TEXTS) == [CONFIDENT, UNSURE, TIER2]
+    assert analyzer.calls[2:] == [("single", "large", ["unsure"]), ("single", "large", ["significant"])]
+
+def test_failed_tier_1_propagates():
+    cascade = CascadeAnalyzer(StubAnalyzer(TIER1, failures={("small", "unsure")}), "small", "large")
+    with pytest.raises(AnalysisFailedError):
+        cascade.analyze_batch(TEXTS)
+
+def test_explicit_model_bypasses_the_cascade():
+    analyzer = StubAnalyzer(TIER1)
+    cascade = CascadeAnalyzer(analyzer, "small", "large")
+
+    assert cascade.analyze("unsure", model="large") == TIER2
+    assert cascade.analyze("unsure") == TIER2
+    assert analyzer.calls[0] == ("batch", "large", ["unsure"])
+
+def test_async_cascade_retries_failed_tier_2_items():
+    analyzer = AsyncStubAnalyzer(TIER1, failures={("large", None), ("large", "significant")})
+    cascade = AsyncCascadeAnalyzer(analyzer, "small", "large")
+
+    assert asyncio.run(cascade.analyze_batch(TEXTS)) == [CONFIDENT, TIER2, SIGNIFICANT]
+    assert sorted(call[2][0] for call in analyzer.calls if call[0] == "single") == ["significant", "unsure"]
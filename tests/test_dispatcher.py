@@ -0,0 +1,160 @@
+"""Alert delivery against the local ntfy stand-in: retries, queue overflow and redelivery."""
+import asyncio
+import time
+
+import pytest
+
+from bench.fakes import FakeNtfyServer
+from clients.cluster_store import SQLiteClusterStore
+from clients.notifier import AsyncNotifier, Notifier
+from clients.state_store import create_state_store
+from cluster import ClusterCoordinator
+from dispatcher import AlertDispatcher
+
+ALERT = {"title": "🚨 NEGATIVE IMPACT 📉", "message": "post-101", "priority": "high", "tags": ["market"], "account": "someone"}
+
+@pytest.fixture
+def ntfy():
+    servers = []
+
+    def start(fail_with=None):
+        server = FakeNtfyServer(fail_with).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+@pytest.fixture(params=["sqlite", "file"])
+def state_store(request, tmp_path):
+    store = create_state_store(str(tmp_path / "state"), request.param)
+    yield store
+    store.close()
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.02)
+
+def record_alert(state_store, status_id, alert=ALERT):
+    state_store.record_status(status_id, "someone", analyzed=True, result=("negative", True, "Tariffs."), alert=alert)
+
+@pytest.mark.parametrize("codes", [[503], [429], [500, 502, 504]])
+def test_notifier_retries_429_and_5xx(ntfy, codes):
+    server = ntfy(fail_with=codes)
+    notifier = Notifier("alerts", server_url=server.url, max_retries=3, backoff_factor=0.01)
+
+    assert notifier.send_notification("title", "message")
+    assert server.requests == len(codes) + 1
+    assert server.messages == 1
+
+def test_notifier_gives_up_after_max_retries(ntfy):
+    server = ntfy(fail_with=[503] * 5)
+    notifier = Notifier("alerts", server_url=server.url, max_retries=2, backoff_factor=0.01)
+
+    assert not notifier.send_notification("title", "message")
+    assert server.requests == 3
+    assert notifier.stats()["failed"] == 1
+
+def test_notifier_does_not_retry_client_errors(ntfy):
+    server = ntfy(fail_with=[400])
+    notifier = Notifier("alerts", server_url=server.url, max_retries=3, backoff_factor=0.01)
+
+    assert not notifier.send_notification("title", "message")
+    assert server.requests == 1
+
+def test_async_notifier_retries_429_and_5xx(ntfy):
+    server = ntfy(fail_with=[429, 503])
+
+    async def send():
+        notifier = AsyncNotifier("alerts", server_url=server.url, max_retries=3, backoff_factor=0.01)
+        try:
+            return await notifier.send_notification("title", "message")
+        finally:
+            await notifier.close()
+
+    assert asyncio.run(send())
+    assert server.requests == 3
+
+def test_queue_overflow_evicts_less_urgent_alerts(ntfy):
+    server = ntfy()
+    # A long coalescing window keeps everything buffered until close()
+    dispatcher = AlertDispatcher([Notifier("alerts", server_url=server.url)], coalesce_seconds=60, max_pending=2)
+
+    assert dispatcher.enqueue("low 1", "post-1", priority="low", status_id="1", account="a")
+    assert dispatcher.enqueue("low 2", "post-2", priority="low", status_id="2", account="b")
+    assert dispatcher.enqueue("urgent", "post-3", priority="urgent", status_id="3", account="c")
+    assert not dispatcher.enqueue("default", "post-4", priority="min", status_id="4", account="d")
+    dispatcher.close()
+
+    assert dispatcher.stats()["dropped"] == 1
+    assert sorted(server.received_at) == ["1", "3"]
+
+def test_queue_overflow_keeps_dropped_alerts_pending(ntfy, state_store):
+    server = ntfy()
+    dispatcher = AlertDispatcher([Notifier("alerts", server_url=server.url)], state_store=state_store, coalesce_seconds=60, max_pending=1)
+    for status_id in ("101", "102"):
+        alert = dict(ALERT, message=f"post-{status_id}", account=status_id)
+        record_alert(state_store, status_id, alert)
+        dispatcher.enqueue(**alert, status_id=status_id)
+    dispatcher.close()
+
+    assert [record["status_id"] for record in state_store.pending_alerts()] == ["102"]
+
+    restarted = AlertDispatcher([Notifier("alerts", server_url=server.url)], state_store=state_store)
+    assert restarted.resend_pending() == 1
+    restarted.close()
+    assert sorted(server.received_at) == ["101", "102"]
+    assert state_store.pending_alerts() == []
+
+def test_failed_delivery_is_retried(ntfy, state_store):
+    server = ntfy(fail_with=[500])
+    dispatcher = AlertDispatcher(
+        [Notifier("alerts", server_url=server.url, max_retries=0)],
+        state_store=state_store,
+        redelivery_seconds=0.2
+    )
+    record_alert(state_store, "101")
+    dispatcher.enqueue(**ALERT, status_id="101")
+
+    wait_for(lambda: state_store.get_status("101")["notified"])
+    dispatcher.close()
+    assert server.requests == 2
+    assert dispatcher.stats()["failed"] == 1
+    assert dispatcher.stats()["resent"] == 1
+
+def test_pending_alerts_are_resent_once_after_restart(ntfy, state_store):
+    server = ntfy()
+    record_alert(state_store, "101")
+    record_alert(state_store, "102")
+    state_store.mark_notified("102")
+
+    dispatcher = AlertDispatcher([Notifier("alerts", server_url=server.url)], state_store=state_store)
+    assert dispatcher.resend_pending() == 1
+    # Already queued in this process
+    assert dispatcher.resend_pending() == 0
+    dispatcher.close()
+
+    assert server.messages == 1
+    assert state_store.get_status("101")["notified"]
+
+def test_cluster_claim_is_released_when_delivery_fails(ntfy, state_store, tmp_path):
+    server = ntfy(fail_with=[500])
+    node_a = ClusterCoordinator(SQLiteClusterStore(str(tmp_path / "cluster")), "a", ["someone"])
+    node_b = ClusterCoordinator(SQLiteClusterStore(str(tmp_path / "cluster")), "b", ["someone"])
+    dispatcher = AlertDispatcher(
+        [Notifier("alerts", server_url=server.url, max_retries=0)],
+        state_store=state_store,
+        cluster=node_a,
+        redelivery_seconds=60
+    )
+    record_alert(state_store, "101")
+    dispatcher.enqueue(**ALERT, status_id="101")
+    # Node b can only claim the alert once node a released it after the failed delivery
+    wait_for(lambda: node_b.claim_notification("101"))
+    node_b.confirm_notification("101")
+    assert not node_a.claim_notification("101")
+    dispatcher.close()
@@ -0,0 +1,46 @@
+"""Quoted status and link card enrichment."""
+from enricher import StatusEnricher
+
+LINK = '<p>Read this <a href="https://example.com/story">example.com/story</a></p>'
+
+def build_enricher(responses):
+    fetched = []
+
+    def fetch_status(status_id):
+        fetched.append(status_id)
+        return responses.pop(0)
+
+    return StatusEnricher(fetch_status, max_workers=1, time_budget_seconds=2), fetched
+
+def test_card_is_fetched_again_until_it_exists():
+    card = {"title": "Tariffs announced", "description": None}
+    enricher, fetched = build_enricher([
+        {"id": "101", "content": LINK, "card": None},
+        {"id": "101", "content": LINK, "card": card},
+    ])
+
+    first = {"id": "101", "content": LINK, "card": None}
+    enricher.enrich([first])
+    assert first["card"] is None
+
+    second = {"id": "101", "content": LINK, "card": None}
+    enricher.enrich([second])
+    assert second["card"] == card
+    assert fetched == ["101", "101"]
+
+    third = {"id": "101", "content": LINK, "card": None}
+    enricher.enrich([third])
+    assert third["card"] == card
+    assert fetched == ["101", "101"]
+    enricher.close()
+
+def test_quoted_status_is_cached():
+    quoted = {"id": "90", "content": "<p>Big news</p>", "card": None}
+    enricher, fetched = build_enricher([quoted])
+
+    for status_id in ("101", "102"):
+        status = {"id": status_id, "content": "<p>Look</p>", "quote_id": "90"}
+        enricher.enrich([status])
+        assert status["quote"] == quoted
+    assert fetched == ["90"]
+    enricher.close()
@@ -0,0 +1,116 @@
+"""Status HTML normalization, SimHash and the near-duplicate filter."""
+import pytest
+
+from normalizer import NearDuplicateFilter, NearDuplicateIndex, collapse_url, hamming_distance, normalize_html, simhash
+
+MARKUP = (
+    '<p>Big news for <span class="h-card"><a href="https://truthsocial.com/@elonmusk" class="u-url mention">'
+    '@<span>elonmusk</span></a></span> &amp; $tsla holders!<br>Read it: '
+    '<a href="https://www.example.com/article?utm_source=x#top" rel="nofollow"><span class="invisible">https://www.</span>'
+    '<span class="ellipsis">example.com/artic</span><span class="invisible">le?utm_source=x#top</span></a></p>'
+    '<p><a href="https://truthsocial.com/tags/MAGA" class="mention hashtag">#<span>MAGA</span></a> '
+    'see www.Foo.org/path. Not $100, but $BRK.B</p>'
+)
+
+STATEMENT = (
+    "I have just signed an executive order imposing a fifty percent tariff on all imports from China, "
+    "effective immediately, because they have been ripping off our great country for many years."
+)
+
+def test_markup_becomes_plain_text():
+    assert normalize_html(MARKUP).text == (
+        "Big news for @elonmusk & $tsla holders!\n"
+        "Read it: https://example.com\n"
+        "\n"
+        "#MAGA see https://foo.org. Not $100, but $BRK.B"
+    )
+
+def test_structured_fields_are_extracted():
+    normalized = normalize_html(MARKUP)
+    assert normalized.mentions == ["elonmusk"]
+    assert normalized.hashtags == ["MAGA"]
+    assert normalized.cashtags == ["TSLA", "BRK.B"]
+    # The original targets are kept, trailing punctuation trimmed
+    assert normalized.urls == ["https://www.example.com/article?utm_source=x#top", "www.Foo.org/path"]
+
+def test_descriptive_link_text_is_kept_and_scripts_are_dropped():
+    normalized = normalize_html('<p>Read <a href="https://example.com/x">the full order</a><script>alert(1)</script></p>')
+    assert normalized.text == "Read the full order"
+    assert normalized.urls == []
+
+@pytest.mark.parametrize("url, collapsed", [
+    ("HTTP://WWW.Example.COM/a?utm_source=x#c", "http://example.com"),
+    ("https://truthsocial.com/@realDonaldTrump/posts/1", "https://truthsocial.com"),
+    ("www.foo.org/x", "https://foo.org"),
+])
+def test_urls_collapse_to_scheme_and_host(url, collapsed):
+    assert collapse_url(url) == collapsed
+
+def test_empty_and_missing_content():
+    assert normalize_html(None).text == ""
+    assert simhash("") == 0
+
+def test_simhash_keeps_similar_texts_closer_than_unrelated_ones():
+    edited = STATEMENT.replace("great", "wonderful")
+    unrelated = "The stock market is rigged and the Fed should cut rates right now, everybody knows it."
+    assert simhash(STATEMENT) == simhash(STATEMENT.upper())
+    assert hamming_distance(simhash(STATEMENT), simhash(edited)) < hamming_distance(simhash(STATEMENT), simhash(unrelated))
+
+def test_index_finds_hashes_within_max_distance_and_evicts_oldest():
+    index = NearDuplicateIndex(max_distance=3, max_size=2)
+    index.add("101", 0b1111 << 60)
+    assert index.find((0b1111 << 60) ^ 0b111) == ("101", 3)
+    assert index.find((0b1111 << 60) ^ 0b1111) is None
+    assert index.find(0b1111 << 60, exclude="101") is None
+
+    index.add("102", 1)
+    index.add("103", 2)
+    assert len(index) == 2
+    assert index.find(0b1111 << 60) is None
+
+def test_repost_with_another_link_is_skipped_in_enforce_mode():
+    duplicates = NearDuplicateFilter("enforce")
+    duplicates.remember(normalize_html(f"<p>{STATEMENT} https://a.com/1</p>"), "101")
+
+    repost = normalize_html(f'<p>{STATEMENT} <a href="https://b.com/x">https://b.com/x</a> #MAGA</p>')
+    assert not duplicates.should_analyze(repost, "102")
+    assert duplicates.should_analyze(normalize_html("<p>Something else entirely.</p>"), "103")
+    assert duplicates.stats() == {"evaluated": 2, "skipped_exact": 1, "unique": 1}
+
+def test_near_duplicate_is_matched_by_simhash():
+    duplicates = NearDuplicateFilter("enforce", max_distance=3)
+    original = normalize_html(f"<p>{STATEMENT}</p>")
+    duplicates.remember(original, "101")
+
+    near = original._replace(fingerprint="edited", simhash=original.simhash ^ 0b101)
+    assert not duplicates.should_analyze(near, "102")
+    assert duplicates.stats()["skipped_near"] == 1
+
+def test_shadow_mode_only_counts_and_off_mode_does_nothing():
+    normalized = normalize_html(f"<p>{STATEMENT}</p>")
+    shadow = NearDuplicateFilter("shadow")
+    shadow.remember(normalized, "101")
+    assert shadow.should_analyze(normalized, "102")
+    assert shadow.stats()["shadow_skipped_exact"] == 1
+
+    off = NearDuplicateFilter("off")
+    off.remember(normalized, "101")
+    assert off.should_analyze(normalized, "102")
+    assert off.stats() == {}
+
+def test_checking_does_not_index_and_a_status_never_matches_itself():
+    duplicates = NearDuplicateFilter("enforce")
+    normalized = normalize_html(f"<p>{STATEMENT}</p>")
+
+    # A status whose analysis failed is checked again on retry; it was never remembered
+    assert duplicates.should_analyze(normalized, "101")
+    assert duplicates.should_analyze(normalized, "101")
+
+    # Once remembered, a recheck of the same ID is not a repost, but another ID is
+    duplicates.remember(normalized, "101")
+    assert duplicates.should_analyze(normalized, "101")
+    assert not duplicates.should_analyze(normalized, "102")
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError, match="Unknown near-duplicate mode"):
+        NearDuplicateFilter("strict")
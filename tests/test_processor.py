@@ -0,0 +1,163 @@
+"""StatusProcessor: cursor tracking, retries of failed statuses and alert hand-off."""
+import pytest
+
+from clients.state_store import SQLiteStateStore, create_state_store
+from processor import CursorTracker, StatusProcessor
+from sentiment_analyzer import AnalysisFailedError, AnalysisResult
+
+SIGNIFICANT = AnalysisResult("negative", True, "Tariffs.", 0.9)
+NEUTRAL = AnalysisResult("neutral", False, "Nothing market related.", 0.9)
+
+class StubClient:
+    target_handle = "someone"
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def get_new_statuses(self, last_known_id=None, handle=None):
+        # pull_statuses yields newest first
+        return iter([status for status in reversed(self.statuses) if int(status["id"]) > int(last_known_id or 0)])
+
+class StubAnalyzer:
+    """Answers from a text -> result map; texts listed in failing raise like an OpenAI outage."""
+    def __init__(self, results=None, failing=()):
+        self.results = results or {}
+        self.failing = set(failing)
+        self.calls = []
+
+    def plan_batches(self, texts):
+        return [[index] for index in range(len(texts))]
+
+    def analyze(self, text):
+        self.calls.append(text)
+        if text in self.failing:
+            raise AnalysisFailedError(f"no answer for {text}")
+        return self.results.get(text, NEUTRAL)
+
+    def analyze_batch(self, texts):
+        return [self.analyze(text) for text in texts]
+
+class StubDispatcher:
+    def __init__(self, on_enqueue=None):
+        self.alerts = []
+        self.on_enqueue = on_enqueue
+
+    def enqueue(self, title, message, priority="default", tags=None, status_id=None, account=None):
+        if self.on_enqueue is not None:
+            self.on_enqueue(status_id)
+        self.alerts.append(status_id)
+        return True
+
+def status(status_id, text=None):
+    return {
+        "id": status_id,
+        "created_at": "2025-04-10T15:00:00.000Z",
+        "account": {"username": "someone"},
+        "content": f"<p>{text or 'post ' + status_id} about the markets</p>",
+    }
+
+@pytest.fixture(params=["sqlite", "file"])
+def state_store(request, tmp_path):
+    store = create_state_store(str(tmp_path / "state"), request.param)
+    yield store
+    store.close()
+
+def build_processor(state_store, statuses, analyzer=None, dispatcher=None):
+    return StatusProcessor(StubClient(statuses), analyzer or StubAnalyzer(), dispatcher or StubDispatcher(), state_store, max_workers=2)
+
+def test_alerts_are_queued_only_after_their_record_commits(tmp_path):
+    path = str(tmp_path / "state.db")
+    state_store = SQLiteStateStore(path)
+    reader = SQLiteStateStore(path)
+    seen = []
+
+    def on_enqueue(status_id):
+        # A second connection only sees committed rows
+        record = reader.get_status(status_id)
+        seen.append((state_store._depth, record["alert"] is not None if record else None))
+
+    dispatcher = StubDispatcher(on_enqueue)
+    analyzer = StubAnalyzer({"post 101 about the markets": SIGNIFICANT})
+    processor = build_processor(state_store, [status("101")], analyzer, dispatcher)
+
+    assert processor.process_statuses(None) == "101"
+    processor.close()
+    reader.close()
+    state_store.close()
+
+    assert dispatcher.alerts == ["101"]
+    assert seen == [(0, True)]
+
+def test_cursor_advances_over_contiguous_completed_run_only():
+    tracker = CursorTracker("100", ["103", "101", "102"])
+
+    assert tracker.complete("102") is None
+    assert tracker.complete("103") is None
+    assert tracker.cursor == "100"
+    assert tracker.complete("101") == "103"
+
+def test_cursor_stops_before_the_oldest_failure():
+    tracker = CursorTracker("100", ["101", "102", "103", "104"])
+    tracker.complete("101")
+    tracker.fail("103")
+    tracker.fail("104")
+
+    assert tracker.complete("102") == "102"
+    assert tracker.complete("103") is None
+    assert tracker.complete("104") is None
+    assert tracker.cursor == "102"
+    assert tracker.failed == "103"
+
+def test_status_id_order_is_numeric():
+    # A shorter ID is older even when it sorts after a longer one as a string
+    tracker = CursorTracker("98", ["100", "99"])
+    assert tracker.complete("99") == "99"
+    assert tracker.complete("100") == "100"
+
+def test_failed_status_holds_the_cursor_and_is_retried_next_poll(state_store):
+    statuses = [status(str(status_id)) for status_id in range(101, 105)]
+    analyzer = StubAnalyzer({"post 104 about the markets": SIGNIFICANT}, failing={"post 102 about the markets"})
+    dispatcher = StubDispatcher()
+    processor = build_processor(state_store, statuses, analyzer, dispatcher)
+
+    assert processor.process_statuses("100") == "101"
+    assert state_store.get_cursor("someone") == "101"
+    assert state_store.get_status("102") is None
+    # Later statuses are recorded, so the retry does not analyze or alert on them again
+    assert state_store.get_status("104")["alert"] is not None
+    assert dispatcher.alerts == ["104"]
+
+    state_store.mark_notified("104")  # delivered, as the dispatcher would record it
+    analyzer.failing.clear()
+    analyzer.calls.clear()
+    assert processor.process_statuses("101") == "104"
+    processor.close()
+
+    assert analyzer.calls == ["post 102 about the markets"]
+    assert state_store.get_cursor("someone") == "104"
+    assert dispatcher.alerts == ["104"]
+
+def test_outage_keeps_the_cursor_and_records_nothing(state_store):
+    statuses = [status("101"), status("102")]
+    analyzer = StubAnalyzer(failing={"post 101 about the markets", "post 102 about the markets"})
+    processor = build_processor(state_store, statuses, analyzer)
+
+    assert processor.process_statuses("100") == "100"
+    processor.close()
+
+    assert state_store.get_cursor("someone") is None
+    assert state_store.get_status("101") is None
+    assert state_store.get_status("102") is None
+
+def test_recorded_but_undelivered_alert_is_queued_again(state_store):
+    alert = {"title": "🚨", "message": "post-101", "priority": "high", "tags": [], "account": "someone"}
+    state_store.record_status("101", "someone", analyzed=True, result=SIGNIFICANT, alert=alert)
+    analyzer = StubAnalyzer()
+    dispatcher = StubDispatcher()
+    processor = build_processor(state_store, [status("101")], analyzer, dispatcher)
+
+    assert processor.process_statuses("100") == "101"
+    processor.close()
+
+    assert analyzer.calls == []
+    assert dispatcher.alerts == ["101"]
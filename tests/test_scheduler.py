@@ -0,0 +1,66 @@
+"""Rate limit handling in the scheduler and the Truth Social client."""
+import datetime
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from clients.truth_social import TruthSocialClient
+from scheduler import RATE_LIMIT_LOW_WATERMARK, MultiHandleScheduler, Scheduler
+
+def build_scheduler(policy, handle=None):
+    # Polling hours cover the whole day so the tests do not depend on the clock
+    return Scheduler(0, 24, 60, "UTC", policy=policy, jitter_ratio=0)
+
+@pytest.mark.parametrize("policy", ["fixed", "adaptive"])
+def test_polls_are_held_before_truthbrush_would_block(policy):
+    scheduler = build_scheduler(policy)
+    reset = time.time() + 600
+
+    scheduler.record_poll(0, rate_limit_remaining=RATE_LIMIT_LOW_WATERMARK, rate_limit_reset=reset)
+
+    assert scheduler.next_interval() > 590
+    assert scheduler.stats()["rate_limited_polls"] == 1
+
+@pytest.mark.parametrize("policy", ["fixed", "adaptive"])
+def test_polls_are_not_held_with_requests_to_spare(policy):
+    scheduler = build_scheduler(policy)
+
+    scheduler.record_poll(0, rate_limit_remaining=RATE_LIMIT_LOW_WATERMARK + 1, rate_limit_reset=time.time() + 600)
+
+    assert scheduler.next_interval() <= 90
+    assert scheduler.stats()["rate_limited_polls"] == 0
+
+def test_reset_in_the_past_does_not_hold_polls():
+    scheduler = build_scheduler("fixed")
+
+    scheduler.record_poll(0, rate_limit_remaining=0, rate_limit_reset=time.time() - 5)
+
+    assert scheduler.next_interval() == 60
+
+def test_nearly_exhausted_limit_holds_every_handle():
+    scheduler = MultiHandleScheduler(["a", "b"], lambda handle: build_scheduler("fixed", handle))
+    reset = time.time() + 600
+
+    scheduler.record_poll("a", 0, rate_limit_remaining=10, rate_limit_reset=reset)
+
+    assert scheduler.next_due["a"] >= reset
+    assert scheduler.next_due["b"] >= reset
+
+def test_naive_reset_time_is_read_as_utc():
+    client = TruthSocialClient("user", "password", "someone")
+    reset = datetime.datetime(2025, 4, 10, 15, 0, 0)
+    client.api_client = SimpleNamespace(ratelimit_remaining="42", ratelimit_reset=reset)
+
+    status = client.rate_limit_status()
+
+    assert status["rate_limit_remaining"] == 42
+    assert status["rate_limit_reset"] == reset.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+def test_handle_polls_count_towards_the_handle_stats():
+    scheduler = MultiHandleScheduler(["a", "b"], lambda handle: build_scheduler("fixed", handle))
+
+    scheduler.record_poll("a", 1)
+
+    assert scheduler.schedulers["a"].stats()["mean_interval_seconds"] == 60
+    assert scheduler.schedulers["b"].stats()["mean_interval_seconds"] is None
@@ -0,0 +1,155 @@
+"""Response validation, retries, failures and batching, against the local OpenAI stand-in."""
+import asyncio
+import json
+
+import pytest
+
+from analysis_cache import AnalysisCache
+from bench.fakes import FakeOpenAIServer
+from sentiment_analyzer import (AnalysisFailedError, AnalysisResult, AsyncSentimentAnalyzer, BATCH_ENVELOPE_VALIDATOR, EMPTY_RESULT,
+                                OPENAI_INVALID_RESPONSES, RESULT_SCHEMA, RESULT_VALIDATOR, SentimentAnalyzer)
+from structured_output import compile_validator
+
+VALID = {"sentiment": "negative", "significant": True, "reasoning": "Tariffs.", "confidence": 0.9}
+SIGNIFICANT = AnalysisResult("negative", True, "Synthetic benchmark answer.", 0.95)
+
+@pytest.fixture
+def openai_server():
+    servers = []
+
+    def start(**kwargs):
+        server = FakeOpenAIServer(latency_seconds=0, **kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+def test_validator_accepts_a_well_formed_result():
+    assert RESULT_VALIDATOR(VALID) == []
+    # Extra keys are tolerated for json_object mode
+    assert RESULT_VALIDATOR(dict(VALID, note="extra")) == []
+
+@pytest.mark.parametrize("value, error", [
+    ({k: v for k, v in VALID.items() if k != "confidence"}, "$: missing required property 'confidence'"),
+    (dict(VALID, sentiment="bullish"), "$.sentiment: 'bullish' is not one of ['positive', 'negative', 'neutral']"),
+    (dict(VALID, significant="yes"), "$.significant: expected boolean, got str"),
+    (dict(VALID, confidence=True), "$.confidence: expected number, got bool"),
+    (["not", "an", "object"], "$: expected object, got list"),
+])
+def test_validator_reports_each_violation(value, error):
+    assert RESULT_VALIDATOR(value) == [error]
+
+def test_strict_schema_rejects_unknown_properties():
+    validator = compile_validator(RESULT_SCHEMA)
+    assert validator(dict(VALID, note="extra")) == ["$: unexpected property 'note'"]
+
+def test_array_items_are_validated_with_their_path():
+    validator = compile_validator({"type": "array", "items": {"type": "integer"}})
+    assert validator([1, "2", True]) == ["$[1]: expected integer, got str", "$[2]: expected integer, got bool"]
+    assert BATCH_ENVELOPE_VALIDATOR({"results": {}}) == ["$.results: expected array, got dict"]
+
+def test_unsupported_schema_type_is_rejected():
+    with pytest.raises(ValueError, match="Unsupported schema type"):
+        compile_validator({"type": "null"})
+
+@pytest.mark.parametrize("invalid", ["not json", json.dumps(dict(VALID, sentiment="bullish"))])
+def test_invalid_response_is_retried_once(openai_server, invalid):
+    server = openai_server(replies=[invalid])
+    analyzer = SentimentAnalyzer("test", base_url=server.base_url)
+    invalid_before = OPENAI_INVALID_RESPONSES.value(kind="single")
+
+    assert analyzer.analyze("I have just signed a tariff order.") == SIGNIFICANT
+    assert server.requests == 2
+    assert OPENAI_INVALID_RESPONSES.value(kind="single") == invalid_before + 1
+
+def test_repeated_invalid_output_fails_and_is_not_cached(openai_server):
+    server = openai_server(replies=["not json", "{}"])
+    analyzer = SentimentAnalyzer("test", cache=AnalysisCache(), base_url=server.base_url)
+
+    with pytest.raises(AnalysisFailedError, match="Invalid response after 2 attempts"):
+        analyzer.analyze("I have just signed a tariff order.")
+    assert server.requests == 2
+
+    # Nothing was cached, so the next call asks the model again instead of answering neutral
+    assert analyzer.analyze("I have just signed a tariff order.") == SIGNIFICANT
+    assert server.requests == 3
+
+def test_api_error_raises_analysis_failed(openai_server):
+    server = openai_server(error_rate=1.0)
+    analyzer = SentimentAnalyzer("test", base_url=server.base_url)
+
+    with pytest.raises(AnalysisFailedError, match="OpenAI API call failed"):
+        analyzer.analyze("I have just signed a tariff order.")
+
+def test_empty_text_is_neutral_without_a_request(openai_server):
+    server = openai_server()
+    analyzer = SentimentAnalyzer("test", base_url=server.base_url)
+
+    assert analyzer.analyze("   ") == EMPTY_RESULT
+    assert server.requests == 0
+
+def test_async_analyzer_retries_invalid_output_and_fails_the_same_way(openai_server):
+    server = openai_server(replies=["not json", "not json", "not json"])
+    analyzer = AsyncSentimentAnalyzer("test", base_url=server.base_url)
+
+    async def run():
+        try:
+            with pytest.raises(AnalysisFailedError, match="Invalid response after 2 attempts"):
+                await analyzer.analyze("I have just signed a tariff order.")
+            return await analyzer.analyze("I have just signed a tariff order.")
+        finally:
+            await analyzer.close()
+
+    assert asyncio.run(run()) == SIGNIFICANT
+    assert server.requests == 4
+
+def test_batches_are_packed_up_to_size_and_token_budget():
+    analyzer = SentimentAnalyzer("test", max_batch_size=3, batch_token_budget=100)
+    # 40 characters is 11 tokens, 200 is 51 and 600 is 151
+    short, medium, long = "x" * 40, "x" * 200, "x" * 600
+
+    assert analyzer.plan_batches([short] * 7) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert analyzer.plan_batches([medium, short, medium, short]) == [[0, 1], [2, 3]]
+    # A text over the budget on its own still gets a batch
+    assert analyzer.plan_batches([short, long, short]) == [[0], [1], [2]]
+
+def batch_reply(*items):
+    return json.dumps({"results": [dict(VALID, id=index, **item) for index, item in items]})
+
+def test_missing_and_malformed_batch_items_fall_back_to_single_requests(openai_server):
+    server = openai_server(replies=[batch_reply((0, {}), (1, {"sentiment": "bullish"}), (1, {}), (7, {}))])
+    analyzer = SentimentAnalyzer("test", cache=AnalysisCache(), base_url=server.base_url)
+    texts = ["first post", "second post", "   ", "third post"]
+
+    results = analyzer.analyze_batch(texts)
+
+    # The empty text is not sent, so "third post" is batch item 2, which is missing; item 7 is out of range.
+    # The malformed item 1 is skipped and the well-formed one after it taken.
+    assert results == [AnalysisResult(**VALID), AnalysisResult(**VALID), EMPTY_RESULT, AnalysisResult("neutral", False, "Synthetic benchmark answer.", 0.9)]
+    assert server.requests == 2
+    # Every answer was cached, so the same batch needs no request at all
+    assert analyzer.analyze_batch(texts) == results
+    assert server.requests == 2
+
+def test_invalid_batch_response_falls_back_to_single_requests(openai_server):
+    server = openai_server(replies=["not json", json.dumps({"items": []})])
+    analyzer = SentimentAnalyzer("test", base_url=server.base_url)
+
+    results = analyzer.analyze_batch(["a tariff order", "a rally"])
+
+    assert [result.significant for result in results] == [True, False]
+    assert server.requests == 4
+
+def test_failed_fallback_fails_the_batch_but_keeps_other_answers_cached(openai_server):
+    server = openai_server(replies=[batch_reply((0, {})), "not json", "not json"])
+    analyzer = SentimentAnalyzer("test", cache=AnalysisCache(), base_url=server.base_url)
+
+    with pytest.raises(AnalysisFailedError):
+        analyzer.analyze_batch(["first post", "second post"])
+    assert server.requests == 3
+
+    # The retry only pays for the text that failed
+    assert analyzer.analyze_batch(["first post", "second post"])[0] == AnalysisResult(**VALID)
+    assert server.requests == 4
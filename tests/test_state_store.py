@@ -0,0 +1,118 @@
+"""State store transactions on both backends, and the import of legacy STORAGE_FILE cursors."""
+from types import SimpleNamespace
+
+import pytest
+
+from clients.state_store import create_state_store
+from main import import_legacy_cursors
+
+RESULT = ("negative", True, "Tariffs.")
+
+@pytest.fixture(params=["sqlite", "file"])
+def open_store(request, tmp_path):
+    """Opens the backend on one path; a second store on the same path sees only committed state."""
+    stores = []
+
+    def open_store():
+        store = create_state_store(str(tmp_path / "state"), request.param)
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+def record_group(store, status_ids, cursor, fail_after=None):
+    """Write an analysis group the way the processor does: results and cursor in one transaction."""
+    with store.transaction():
+        for position, status_id in enumerate(status_ids):
+            if position == fail_after:
+                raise RuntimeError("crash mid-group")
+            store.record_status(status_id, "someone", analyzed=True, result=RESULT)
+        store.set_cursor("someone", cursor)
+
+def test_group_commits_results_and_cursor_together(open_store):
+    store = open_store()
+    record_group(store, ["101", "102"], "102")
+
+    reopened = open_store()
+    assert reopened.get_cursor("someone") == "102"
+    assert reopened.get_status("101")["result"] == RESULT
+    assert reopened.get_status("102")["analyzed"]
+
+def test_failed_group_rolls_back_every_write(open_store):
+    store = open_store()
+    record_group(store, ["101"], "101")
+
+    with pytest.raises(RuntimeError):
+        record_group(store, ["102", "103"], "103", fail_after=1)
+
+    for view in (store, open_store()):
+        assert view.get_cursor("someone") == "101"
+        assert not view.is_handled("102")
+        assert not view.is_handled("103")
+
+def test_nested_transaction_joins_the_outer_one(open_store):
+    store = open_store()
+    with store.transaction():
+        with store.transaction():
+            store.set_cursor("someone", "101")
+        # The inner block committed nothing on its own
+        assert open_store().get_cursor("someone") is None
+        store.record_status("101", "someone", analyzed=False)
+    assert open_store().get_cursor("someone") == "101"
+
+def test_outer_failure_rolls_back_nested_writes(open_store):
+    store = open_store()
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            with store.transaction():
+                store.set_cursor("someone", "101")
+            raise RuntimeError("crash after the inner block")
+
+    assert store.get_cursor("someone") is None
+    assert open_store().get_cursor("someone") is None
+
+def test_notified_flag_survives_rerecording(open_store):
+    store = open_store()
+    store.record_status("101", "someone", analyzed=True, result=RESULT, alert={"title": "t", "message": "m"})
+    store.mark_notified("101")
+    store.record_status("101", "someone", analyzed=True, result=RESULT)
+
+    assert open_store().get_status("101")["notified"]
+
+def test_file_store_keeps_previous_file_on_rollback(tmp_path):
+    path = tmp_path / "state.json"
+    store = create_state_store(str(path), "file")
+    store.set_cursor("someone", "101")
+    committed = path.read_text()
+
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.set_cursor("someone", "102")
+            store.record_status("102", "someone")
+            raise RuntimeError("crash")
+
+    assert path.read_text() == committed
+    assert store.get_cursor("someone") == "101"
+    # The rolled back writes are not flushed by the next commit either
+    store.set_cursor("other", "5")
+    reopened = create_state_store(str(path), "file")
+    assert reopened.get_cursor("someone") == "101"
+    assert not reopened.is_handled("102")
+
+def test_legacy_storage_files_seed_missing_cursors(open_store, tmp_path):
+    storage_file = tmp_path / "last_processed_id.txt"
+    storage_file.write_text("101\n")
+    (tmp_path / "last_processed_id.WhiteHouse.txt").write_text("201\n")
+    (tmp_path / "last_processed_id.Other.txt").write_text("301\n")
+    store = open_store()
+    store.set_cursor("Other", "350")
+    config = SimpleNamespace(storage_file=str(storage_file), target_handles=["realDonaldTrump", "WhiteHouse", "Other", "New"])
+
+    import_legacy_cursors(store, config)
+
+    assert store.get_cursor("realDonaldTrump") == "101"
+    assert store.get_cursor("WhiteHouse") == "201"
+    assert store.get_cursor("Other") == "350"
+    assert store.get_cursor("New") is None
@@ -0,0 +1,173 @@
+"""Streaming ingestion against the local stand-ins: SSE parsing, reconnects and catch-up ordering."""
+import threading
+import time
+
+import pytest
+from truthbrush.api import Api
+
+from bench.fakes import FakeNtfyServer, FakeOpenAIServer, FakeStreamServer
+from clients.notifier import Notifier
+from clients.state_store import create_state_store
+from clients.truth_stream import TruthSocialStream, parse_events
+from dispatcher import AlertDispatcher
+from processor import StatusProcessor
+from sentiment_analyzer import SentimentAnalyzer
+
+class StubClient:
+    """The parts of TruthSocialClient the stream uses, with a token that changes on every login."""
+    target_handle = "realDonaldTrump"
+
+    def __init__(self, statuses=()):
+        self.api_client = Api("user", "password", token="token-1")
+        self.logins = 1
+        self.statuses = list(statuses)
+        self.polls = []
+
+    def get_auth_token(self):
+        return f"token-{self.logins}"
+
+    def refresh_auth_token(self, rejected_token=None):
+        if rejected_token == self.get_auth_token():
+            self.logins += 1
+        return self.get_auth_token()
+
+    def get_new_statuses(self, last_known_id=None, handle=None):
+        self.polls.append(last_known_id)
+        return iter([status for status in reversed(self.statuses) if int(status["id"]) > int(last_known_id or 0)])
+
+def status(status_id, acct="realDonaldTrump", **fields):
+    return dict({
+        "id": status_id,
+        "created_at": "2026-01-20T12:00:00.000Z",
+        "account": {"id": "1", "acct": acct, "username": acct},
+        "content": f"<p>Post post-{status_id}</p>",
+    }, **fields)
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.02)
+
+@pytest.fixture
+def stream_server():
+    servers = []
+
+    def start(connections):
+        server = FakeStreamServer(connections).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+@pytest.fixture
+def run_stream():
+    streams = []
+
+    def start(server, client=None):
+        log = []
+        lock = threading.Lock()
+
+        def record(entry):
+            with lock:
+                log.append(entry)
+
+        stream = TruthSocialStream(
+            client or StubClient(),
+            ["realDonaldTrump"],
+            on_status=lambda handle, pushed: record((handle, pushed["id"])),
+            on_connect=lambda: record("connect"),
+            stream_url=server.url + "/api/v1/streaming/user",
+            initial_backoff_seconds=0.05
+        )
+        stream.start()
+        streams.append((server, stream))
+        return stream, log
+
+    yield start
+    for server, stream in streams:
+        # End held connections first, so the stream sees the close right away
+        server.released.set()
+        stream.stop()
+
+def test_parse_events():
+    lines = [
+        b":thump", b"",
+        b"event: update", b'data: {"id":', b'data: "1"}', b"",
+        "event: delete\r", "data: 2\r", "\r",
+        b"event: update", b"",
+        b"data: orphan", b"",
+    ]
+    assert list(parse_events(lines)) == [("update", '{"id":\n"1"}'), ("delete", "2")]
+
+def test_stream_forwards_only_target_posts(stream_server, run_stream):
+    server = stream_server([{"events": [
+        ("update", status("101", acct="someoneElse")),
+        ("update", status("102", in_reply_to_id="9", in_reply_to_account_id="2")),
+        ("update", status("103", in_reply_to_id="101", in_reply_to_account_id="1")),
+        ("notification", {"id": "5"}),
+        ("update", "{not json"),
+        ("update", status("104", acct="realdonaldtrump")),
+    ], "hold": True}])
+    stream, log = run_stream(server)
+
+    wait_for(lambda: len(log) == 3)
+    assert log == ["connect", ("realDonaldTrump", "103"), ("realDonaldTrump", "104")]
+    assert server.requests[0]["Authorization"] == "Bearer token-1"
+    assert server.requests[0]["Accept"] == "text/event-stream"
+    assert server.requests[0]["User-Agent"].startswith("Mozilla/5.0")
+
+def test_stream_reconnects_with_catch_up_before_new_events(stream_server, run_stream):
+    server = stream_server([
+        {"events": [("update", status("101"))]},
+        {"events": [("update", status("102"))], "hold": True},
+    ])
+    stream, log = run_stream(server)
+
+    wait_for(lambda: len(log) == 4)
+    assert log == ["connect", ("realDonaldTrump", "101"), "connect", ("realDonaldTrump", "102")]
+    assert stream.reconnects == 1
+
+def test_stream_logs_in_again_when_token_is_rejected(stream_server, run_stream):
+    server = stream_server([
+        {"status": 401},
+        {"events": [("update", status("101"))], "hold": True},
+    ])
+    client = StubClient()
+    stream, log = run_stream(server, client)
+
+    wait_for(lambda: len(log) == 2)
+    assert client.logins == 2
+    assert [request["Authorization"] for request in server.requests] == ["Bearer token-1", "Bearer token-2"]
+    assert log == ["connect", ("realDonaldTrump", "101")]
+
+@pytest.fixture
+def processor(tmp_path):
+    openai_server = FakeOpenAIServer(latency_seconds=0.01).start()
+    ntfy_server = FakeNtfyServer().start()
+    state_store = create_state_store(str(tmp_path / "state"))
+    client = StubClient([status(str(status_id)) for status_id in range(101, 106)])
+    notifier = AlertDispatcher([Notifier("alerts", server_url=ntfy_server.url)], state_store=state_store)
+    processor = StatusProcessor(client, SentimentAnalyzer("test", base_url=openai_server.base_url), notifier, state_store)
+    yield processor
+    notifier.close()
+    processor.close()
+    state_store.close()
+    openai_server.stop()
+    ntfy_server.stop()
+
+def test_pushed_status_never_moves_the_cursor(processor):
+    # The catch-up poll before the push failed, so 101-104 were never fetched
+    pushed = processor.api_client.statuses[-1]
+    assert processor.process_statuses("100", "realDonaldTrump", statuses=[pushed]) == "100"
+    assert processor.state_store.get_cursor("realDonaldTrump") is None
+    assert processor.state_store.get_status("105")["analyzed"]
+
+    # The next catch-up fetches the gap, passes 105 as handled and only then advances
+    assert processor.process_statuses("100", "realDonaldTrump") == "105"
+    assert processor.api_client.polls == ["100"]
+    assert processor.state_store.get_cursor("realDonaldTrump") == "105"
+    assert all(processor.state_store.get_status(str(status_id))["analyzed"] for status_id in range(101, 106))
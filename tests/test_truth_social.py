@@ -0,0 +1,70 @@
+"""TruthSocialClient token handling around truthbrush, with a stand-in for truthbrush's Api."""
+import pytest
+
+from clients.token_store import TokenStore
+from clients.truth_social import TruthSocialClient
+
+class StubApi:
+    """
+    Behaves like truthbrush's Api for a revoked token: the account lookup answers with an
+    error body, so pull_statuses fails with a KeyError on its first item.
+    """
+    def __init__(self, valid_token="token-2", statuses=()):
+        self.auth_id = "token-1"
+        self.valid_token = valid_token
+        self.statuses = list(statuses)
+        self.logins = 0
+        self.pulls = []
+
+    def get_auth_id(self, username, password):
+        self.logins += 1
+        return self.valid_token
+
+    def lookup(self, handle):
+        if self.auth_id != self.valid_token:
+            return {"error": "The access token is invalid"}
+        return {"id": "1", "username": handle}
+
+    def _get(self, path):
+        if self.auth_id != self.valid_token:
+            return {"error": "The access token is invalid"}
+        return {"id": path.rsplit("/", 1)[1], "username": "user"}
+
+    def pull_statuses(self, username, since_id=None, created_after=None, replies=False, verbose=False):
+        self.pulls.append({"since_id": since_id, "created_after": created_after})
+        account = self.lookup(username)
+        account["id"]
+        yield from self.statuses
+
+def build_client(api, tmp_path=None):
+    token_store = TokenStore(str(tmp_path / "token.json")) if tmp_path else None
+    client = TruthSocialClient("user", "password", "someone", token_store=token_store)
+    client.api_client = api
+    return client
+
+def test_pull_statuses_logs_in_again_when_the_token_is_rejected(tmp_path):
+    api = StubApi(statuses=[{"id": "102"}, {"id": "101"}])
+    client = build_client(api, tmp_path)
+
+    assert [status["id"] for status in client.pull_statuses(since_id="100", created_after="2025-01-20")] == ["102", "101"]
+    assert api.logins == 1
+    assert api.pulls == [{"since_id": "100", "created_after": "2025-01-20"}] * 2
+    # The new token is saved for the next run
+    assert client.token_store.load("user")["access_token"] == "token-2"
+
+def test_pull_statuses_raises_for_an_unknown_handle():
+    api = StubApi(valid_token="token-1")
+    api.lookup = lambda handle: {"error": "Record not found"}
+    client = build_client(api)
+
+    with pytest.raises(Exception, match="Could not look up @someone"):
+        list(client.pull_statuses())
+    assert api.logins == 0
+
+def test_direct_api_requests_log_in_again_when_the_token_is_rejected(tmp_path):
+    api = StubApi()
+    client = build_client(api, tmp_path)
+
+    assert client.get_status("101")["id"] == "101"
+    assert client.verify_credentials() == "user"
+    assert api.logins == 1
@@ -0,0 +1,76 @@
+import asyncio
+import inspect
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import REGISTRY
+
+WARMUP_SECONDS = REGISTRY.histogram("stonk_warmup_seconds", "Time to preconnect to each service at startup", ("service", "outcome"))
+
+def warm_up(checks, timeout_seconds=30.0):
+    """
+    Run every check in parallel, e.g. to log in and open connection pools while the rest
+    of startup continues, or for --check.
+
+    Args:
+        checks (dict): Service name -> callable that raises or returns False on failure
+        timeout_seconds (float): Longest to wait for all checks
+
+    Returns:
+        dict: Service name -> True if its check passed
+    """
+    executor = ThreadPoolExecutor(max_workers=max(len(checks), 1), thread_name_prefix="warmup")
+    futures = {name: executor.submit(_timed, name, check) for name, check in checks.items()}
+    deadline = time.monotonic() + timeout_seconds
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except Exception:
+            logging.error(f"Warmup of {name} did not finish within {timeout_seconds}s.")
+            results[name] = False
+    # Stragglers keep running in the background; nothing waits on them
+    executor.shutdown(wait=False)
+    return results
+
+async def warm_up_async(checks, timeout_seconds=30.0):
+    """
+    Like warm_up, on the running event loop so async clients keep the connections they
+    open. Coroutine functions are awaited; plain callables run in a thread.
+    """
+    async def run(name, check):
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(check):
+                result = await check()
+            else:
+                result = await asyncio.to_thread(check)
+        except Exception as e:
+            return _record(name, started, e)
+        return _record(name, started, None if result is not False else "check failed")
+
+    names = list(checks)
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*(run(name, checks[name]) for name in names)), timeout_seconds)
+    except asyncio.TimeoutError:
+        logging.error(f"Warmup did not finish within {timeout_seconds}s.")
+        return {name: False for name in names}
+    return dict(zip(names, results))
+
+def _timed(name, check):
+    started = time.perf_counter()
+    try:
+        result = check()
+    except Exception as e:
+        return _record(name, started, e)
+    return _record(name, started, None if result is not False else "check failed")
+
+def _record(name, started, error):
+    elapsed = time.perf_counter() - started
+    WARMUP_SECONDS.observe(elapsed, service=name, outcome="ok" if error is None else "failed")
+    if error is None:
+        logging.info(f"Warmed up {name} in {elapsed:.2f}s.")
+        return True
+    logging.error(f"Warmup of {name} failed after {elapsed:.2f}s: {error}")
+    return False